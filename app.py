@@ -6,18 +6,34 @@ CRITICAL: Must run on port 6000 for testing compatibility
 
 import os
 import json
+import time
 import uuid
 from datetime import datetime
-from flask import Flask, request, jsonify, send_from_directory, render_template
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context
+from markupsafe import escape
 from flask_cors import CORS
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room
 from werkzeug.utils import secure_filename
-from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
 import logging
 
 # Import our database class and music search
 from database import PartyDatabase
 from music_search import MusicSearchService
+from dj_planner import DJPlanner
+from loudness import LoudnessAnalyzer
+from download_jobs import DownloadJobManager, DownloadQueueFull
+from prefetcher import QueuePrefetcher
+from queue_events import QueueEventLog
+from broadcaster import BroadcastDispatcher, ROLES
+from offload import async_mode, cooperative_database, run_blocking
+from message_bus import ClusterBus, socketio_queue_options
+from media_server import MediaServer
+from media_processing import VideoProcessor, PhotoProcessor, HEIF_EXTENSIONS
+from slideshow import SlideshowScheduler, DEFAULT_MANIFEST_SIZE
+from report import ReportPage, DEFAULT_PER_PAGE
+from party_logging import setup_logging
+import metrics
 
 # Initialize Flask app
 app = Flask(__name__, static_folder='static', template_folder='templates')
@@ -27,36 +43,53 @@ app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max file size
 # Enable CORS for all domains (party network access)
 CORS(app, origins="*")
 
-# Initialize SocketIO for real-time updates
-socketio = SocketIO(app, cors_allowed_origins="*", ping_interval=25, ping_timeout=5)
-
-# Configure logging to both file and console
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('party-wall.log'),
-        logging.StreamHandler()  # This prints to console
-    ],
-    force=True  # Override any existing logging configuration
+# Multi-worker mode (serve.py --workers): processes share SQLite in WAL mode and a message queue
+MESSAGE_QUEUE = os.environ.get('PARTY_MESSAGE_QUEUE')
+WORKER_INDEX = int(os.environ.get('PARTY_WORKER_INDEX', 0))
+cluster = ClusterBus(MESSAGE_QUEUE) if MESSAGE_QUEUE else None
+IS_PRIMARY_WORKER = cluster is None or WORKER_INDEX == 0  # Runs the single-instance background stages
+
+# Initialize SocketIO for real-time updates (serve.py selects eventlet/gevent for production)
+socketio = SocketIO(app, cors_allowed_origins="*", ping_interval=25, ping_timeout=5,
+                    async_mode=async_mode(), **socketio_queue_options(MESSAGE_QUEUE))
+socketio.emit = metrics.instrument_emit(socketio.emit)  # Counts and times every emit, handlers included
+metrics.instrument_app(app)
+
+# Upload bursts are coalesced into batched events, rate-capped per client
+broadcaster = BroadcastDispatcher(
+    socketio.emit,
+    window=int(os.environ.get('PARTY_BROADCAST_WINDOW_MS', 150)) / 1000,
+    max_rate=float(os.environ.get('PARTY_BROADCAST_MAX_RATE', 4))
 )
+
+# Log through a queue: request threads enqueue, a background listener writes the rotating file and console
+# (workers each keep their own file; rotating one file from several processes would lose lines)
+setup_logging(log_file=None if WORKER_INDEX == 0 else f'party-wall.worker{WORKER_INDEX}.log')
 logger = logging.getLogger(__name__)
 
-# Also add print statements for immediate visibility
 def log_and_print(message):
-    """Log to file and print to console"""
-    logger.info(message)
-    print(f"🎉 PARTY: {message}")
+    """Log a party event; the listener writes it to the log file and console off the request thread"""
+    logger.info(f"🎉 PARTY: {message}")
 
 # Initialize database and music search service
-db = PartyDatabase()
+# (under eventlet/gevent, queries run on a thread pool instead of blocking the event loop)
+db = cooperative_database(metrics.instrument_database(PartyDatabase()))
 music_search = MusicSearchService(db)
+# The DJ never replaces songs the prefetcher may already have copied
+PREFETCH_LOOKAHEAD = int(os.environ.get('PARTY_PREFETCH_LOOKAHEAD', 3))
+dj_planner = DJPlanner(db, music_search.sampler, music_search.recommender,
+                       locked=max(PREFETCH_LOOKAHEAD, 1))
+loudness_analyzer = LoudnessAnalyzer(db)
 
 # Ensure media directories exist
-MEDIA_DIRS = ['media/photos', 'media/videos', 'media/music']
+MEDIA_DIRS = ['media/photos', 'media/videos', 'media/music', 'media/cache/music']
 for media_dir in MEDIA_DIRS:
     os.makedirs(media_dir, exist_ok=True)
 
+# Media and static bytes go out through nginx/X-Sendfile when PARTY_MEDIA_OFFLOAD says so
+media_server = MediaServer({'media': '/protected-media/', app.static_folder: '/protected-static/'}, store=db)
+slideshow_scheduler = SlideshowScheduler(db)
+
 # Party configuration
 PARTY_CONFIG = {
     'title': "Happy 50th Birthday Valérie!",
@@ -64,7 +97,7 @@ PARTY_CONFIG = {
     'slideshow_duration': 7,
     'weekend_days': 2,
     'max_file_size': 500 * 1024 * 1024,
-    'allowed_photo_types': ['jpg', 'jpeg', 'png', 'gif', 'heic', 'webp'],
+    'allowed_photo_types': ['jpg', 'jpeg', 'png', 'gif', 'heic', 'heif', 'webp'],
     'allowed_video_types': ['mp4', 'mov', 'avi', 'webm', 'm4v', 'mkv'],
     'allowed_music_types': ['mp3', 'm4a', 'wav', 'flac']
 }
@@ -101,27 +134,216 @@ def process_file(file_path, file_type):
     log_and_print(f"Processing {file_type} file: {file_path}")
     return True
 
+def publish_event(event, data, key=None, rooms=None):
+    """Queue a broadcast for this worker's clients and, in multi-worker mode, everyone else's"""
+    broadcaster.publish(event, data, key=key, rooms=rooms)
+    if cluster:
+        cluster.publish('broadcast', event=event, data=data, key=key, rooms=rooms)
+
+def record_selection(**selection):
+    """Teach the recommender about a queued song, in every worker"""
+    music_search.recommender.record_selection(**selection)
+    if cluster:
+        cluster.publish('selection', **selection)
+
+def save_setting(key, value):
+    """Store a setting and drop the copies cached by every worker"""
+    db.set_setting(key, value)
+    apply_setting_change(key)
+    if cluster:
+        cluster.publish('setting', key=key)
+
+def apply_setting_change(key):
+    """Forget the cached value of a changed setting"""
+    if key == 'ollama_model':
+        music_search.selected_model = None  # Re-read from the database on next use
+
 def broadcast_new_upload(upload_data):
     """Broadcast new upload to all connected clients"""
     try:
-        socketio.emit('new_upload', {
-            'type': 'new_upload',
-            'data': upload_data
-        })
+        publish_event('new_upload', upload_data, rooms=('display', 'admin'))
         logger.info(f"Broadcasted new upload: {upload_data['guest_name']} - {upload_data['file_type']}")
     except Exception as e:
         logger.error(f"Failed to broadcast upload: {e}")
 
-def broadcast_music_update(music_data):
-    """Broadcast music queue update to all connected clients"""
+def emit_queue_delta(event, delta):
+    """Send one music queue delta to all connected clients"""
+    publish_event(event, delta, rooms=('display', 'admin'))
+
+def broadcast_queue_change(added_ids=None, played_ids=None):
+    """Re-plan the AI DJ tail, broadcast the queue deltas and wake the background stages"""
+    plan = dj_planner.replan(guest_pick=bool(added_ids))
     try:
-        socketio.emit('music_update', {
-            'type': 'music_update',
-            'data': music_data
-        })
-        logger.info("Broadcasted music queue update")
+        queue_events.played(played_ids)
+        queue_events.added(added_ids)
+        if plan:
+            queue_events.removed(plan['removed_ids'])
+            queue_events.added(plan['added_ids'])
+        logger.info(f"Broadcasted music queue deltas up to seq {queue_events.seq}")
     except Exception as e:
         logger.error(f"Failed to broadcast music update: {e}")
+    notify_queue_changed()
+    return plan
+
+def download_room(job_id):
+    """Room for the guests following one download job"""
+    return f"download:{job_id}"
+
+def broadcast_download_progress(job):
+    """Push download job state/progress to all connected clients"""
+    try:
+        # Keyed by job, so a burst of progress updates collapses to the latest one
+        publish_event('download_progress',
+                      {key: job[key] for key in ('id', 'url', 'status', 'progress', 'title',
+                                                 'artist', 'guest_name', 'queue_id', 'error')},
+                      key=job['id'], rooms=(download_room(job['id']), 'admin'))
+    except Exception as e:
+        logger.error(f"Failed to broadcast download progress: {e}")
+
+def queue_downloaded_music(job, downloaded_file, info):
+    """Add a finished YouTube download to the queue (runs on a download worker)"""
+    actual_title = info.get('title') or job['title']
+    actual_duration = info.get('duration')
+    artist = job['artist']
+    guest_name = job['guest_name']
+    
+    # Create upload record
+    upload_id = db.add_upload(
+        device_id=job['device_id'],
+        guest_name=guest_name,
+        file_path=downloaded_file,
+        file_type='music',
+        original_filename=f"{actual_title}.mp3",
+        file_size=os.path.getsize(downloaded_file)
+    )
+    
+    # Add to music queue
+    queue_id = db.add_to_music_queue(
+        upload_id=upload_id,
+        song_title=actual_title,
+        artist=artist,
+        duration=actual_duration
+    )
+    
+    # Log the selection for learning
+    db.log_music_search(
+        query=job['original_query'] or '',
+        selected_result={
+            'title': actual_title,
+            'artist': artist,
+            'url': job['url'],
+            'source': 'youtube'
+        },
+        source='youtube',
+        guest_name=guest_name,
+        party_energy=dj_planner.measure_party_energy()
+    )
+    
+    # Update patterns for AI learning
+    db.update_music_pattern('artist', artist)
+    record_selection(
+        artist=artist,
+        title=actual_title,
+        guest_name=guest_name
+    )
+    
+    log_and_print(f"Successfully downloaded and queued: {artist} - {actual_title}")
+    
+    # Broadcast music update
+    broadcast_queue_change(added_ids=[queue_id])
+    return queue_id
+
+download_jobs = DownloadJobManager(
+    db,
+    download_dir='media/music',
+    max_workers=int(os.environ.get('PARTY_DOWNLOAD_WORKERS', 2)),
+    on_update=broadcast_download_progress,
+    on_complete=queue_downloaded_music
+)
+if IS_PRIMARY_WORKER:
+    download_jobs.recover()
+
+def broadcast_rendition_progress(rendition):
+    """Push media processing progress to the admin, and finished renditions to the displays"""
+    try:
+        data = {key: rendition[key] for key in ('upload_id', 'kind', 'status', 'progress', 'error')}
+        rooms = ('admin',)
+        if rendition['status'] == 'ready':
+            data['url'] = rendition['url']
+            rooms = ('display', 'admin')
+        publish_event('media_rendition', data, key=f"rendition:{rendition['upload_id']}:{rendition['kind']}",
+                      rooms=rooms)
+    except Exception as e:
+        logger.error(f"Failed to broadcast rendition progress: {e}")
+
+# Videos at least this long are also segmented for HLS; an empty value turns HLS off
+HLS_MIN_SECONDS = os.environ.get('PARTY_HLS_MIN_SECONDS', '60')
+video_processor = VideoProcessor(
+    db,
+    output_dir='media/videos',
+    max_workers=int(os.environ.get('PARTY_TRANSCODE_WORKERS', 0)) or None,  # Default: half the cores
+    on_update=broadcast_rendition_progress,
+    content_hash=media_server.content_hash,
+    hls_min_duration=float(HLS_MIN_SECONDS) if HLS_MIN_SECONDS else None
+)
+photo_processor = PhotoProcessor(
+    db,
+    output_dir='media/photos',
+    on_update=broadcast_rendition_progress,
+    content_hash=media_server.content_hash
+)
+if IS_PRIMARY_WORKER:
+    video_processor.recover()
+    photo_processor.recover()
+
+def process_media(upload_id, file_type, file_path):
+    """Queue the display renditions of an uploaded photo or video"""
+    if not IS_PRIMARY_WORKER:
+        # One CPU-capped pool per stage, on the primary worker
+        cluster.publish('process_media', upload_id=upload_id, file_type=file_type, file_path=file_path)
+        return
+    processor = video_processor if file_type == 'video' else photo_processor
+    processor.submit(upload_id, file_path)
+# Workers share one delta sequence through the database so clients see a single stream
+queue_events = QueueEventLog(db, emit=emit_queue_delta,
+                             shared_epoch=os.environ.get('PARTY_CLUSTER_EPOCH', 'cluster') if cluster else None)
+prefetcher = QueuePrefetcher(
+    db,
+    lookahead=PREFETCH_LOOKAHEAD,
+    max_cache_bytes=int(os.environ.get('PARTY_PREFETCH_CACHE_MB', 2048)) * 1024 * 1024,
+    download_jobs=download_jobs,
+    music_root=os.environ.get('PARTY_MUSIC_ROOT')
+)
+
+# Background queue depths, read only when /metrics is scraped
+metrics.QUEUE_DEPTH.set_function(lambda: download_jobs.stats()['pending'], queue='downloads')
+metrics.QUEUE_DEPTH.set_function(lambda: video_processor.stats()['active'], queue='video_processing')
+metrics.QUEUE_DEPTH.set_function(lambda: photo_processor.stats()['active'], queue='photo_processing')
+metrics.QUEUE_DEPTH.set_function(lambda: broadcaster.stats()['queue_depth'], queue='broadcast')
+metrics.QUEUE_DEPTH.set_function(lambda: broadcaster.stats()['client_backlog'], queue='broadcast_backlog')
+
+def notify_queue_changed():
+    """Wake the background stages that work ahead of the playhead"""
+    if not IS_PRIMARY_WORKER:
+        cluster.publish('queue_changed')  # Only the primary worker runs them
+        return
+    loudness_analyzer.wake()
+    prefetcher.wake()
+
+def apply_remote_selection(selection):
+    """A song was queued through another worker"""
+    music_search.suggest_index.invalidate()
+    music_search.recommender.record_selection(**selection)
+
+if cluster:
+    cluster.subscribe('broadcast', lambda message: broadcaster.publish(
+        message['event'], message['data'], key=message['key'], rooms=message['rooms']))
+    cluster.subscribe('selection', apply_remote_selection)
+    cluster.subscribe('setting', lambda message: apply_setting_change(message['key']))
+    cluster.subscribe('queue_changed', lambda message: notify_queue_changed())
+    cluster.subscribe('process_media', lambda message: process_media(
+        message['upload_id'], message['file_type'], message['file_path']))
+    cluster.start()
 
 # Routes
 
@@ -252,9 +474,8 @@ def upload_files():
                     media_folder = f"media/{detected_type}s"  # photos/videos become plural
                 file_path = os.path.join(media_folder, unique_filename)
                 
-                # Save file
-                file.save(file_path)
-                file_size = os.path.getsize(file_path)
+                # Save file, hashing it as it is written instead of reading up to 500 MB back
+                file_size, content_hash = media_server.save_upload(file.stream, file_path)
                 
                 # Process file
                 process_success = process_file(file_path, detected_type)
@@ -267,13 +488,18 @@ def upload_files():
                     file_type=detected_type,
                     original_filename=file.filename,
                     file_size=file_size,
-                    birthday_note=birthday_note
+                    birthday_note=birthday_note,
+                    content_hash=content_hash
                 )
                 
-                # Mark as processed
-                if process_success:
+                # Mark as processed (HEIC waits for its WebP rendition, the TV can't show it)
+                if process_success and not file_path.lower().endswith(HEIF_EXTENSIONS):
                     db.mark_upload_processed(upload_id)
                 
+                # Web-optimized renditions in the background; the original is shown until they are ready
+                if detected_type in ('photo', 'video'):
+                    process_media(upload_id, detected_type, file_path)
+                
                 # Handle music queue
                 if detected_type == 'music':
                     queue_id = db.add_to_music_queue(
@@ -281,17 +507,14 @@ def upload_files():
                         song_title=song_title if song_title else os.path.splitext(filename)[0],
                         artist=artist
                     )
+                    record_selection(
+                        artist=artist,
+                        title=song_title if song_title else os.path.splitext(filename)[0],
+                        guest_name=guest_name
+                    )
                     
                     # Broadcast music update
-                    music_queue = db.get_music_queue()
-                    broadcast_music_update({
-                        'queue_length': music_queue['unplayed_count'],
-                        'new_song': {
-                            'title': song_title,
-                            'artist': artist,
-                            'guest_name': guest_name
-                        }
-                    })
+                    broadcast_queue_change(added_ids=[queue_id])
                 
                 uploaded_files.append({
                     'upload_id': upload_id,
@@ -341,6 +564,18 @@ def get_media():
         logger.error(f"Error getting media: {e}")
         return jsonify({'error': 'Failed to get media'}), 500
 
+@app.route('/api/slideshow/manifest', methods=['GET'])
+def get_slideshow_manifest():
+    """Next slides in rotation with sizes, dimensions and a suggested preload window"""
+    try:
+        after = request.args.get('after', type=int)
+        count = request.args.get('count', DEFAULT_MANIFEST_SIZE, type=int)
+        return jsonify(slideshow_scheduler.manifest(after=after, count=count))
+        
+    except Exception as e:
+        logger.error(f"Error getting slideshow manifest: {e}")
+        return jsonify({'error': 'Failed to get slideshow manifest'}), 500
+
 @app.route('/api/media/current', methods=['GET'])
 def get_current_media():
     """Get currently displayed media (placeholder)"""
@@ -370,7 +605,7 @@ def next_media():
                 'action': 'next',
                 'timestamp': datetime.now().isoformat()
             }
-        })
+        }, to=['display', 'admin'])
         
         return jsonify({'message': 'Skipped to next media'})
         
@@ -389,6 +624,38 @@ def get_music_queue():
         logger.error(f"Error getting music queue: {e}")
         return jsonify({'error': 'Failed to get music queue'}), 500
 
+@app.route('/api/music/queue/snapshot', methods=['GET'])
+def get_music_queue_snapshot():
+    """Get the unplayed queue window with the delta sequence number it reflects"""
+    try:
+        return jsonify(queue_events.snapshot())
+        
+    except Exception as e:
+        logger.error(f"Error getting music queue snapshot: {e}")
+        return jsonify({'error': 'Failed to get music queue'}), 500
+
+@app.route('/api/music/queue/deltas', methods=['GET'])
+def get_music_queue_deltas():
+    """Replay queue deltas after a sequence number; 410 means take a snapshot"""
+    try:
+        since = request.args.get('since', 0, type=int)
+        if request.args.get('epoch') not in (None, queue_events.epoch):
+            return jsonify({'error': 'Queue epoch changed', 'epoch': queue_events.epoch}), 410
+        
+        deltas = queue_events.since(since)
+        if deltas is None:
+            return jsonify({'error': 'Deltas no longer available', 'seq': queue_events.seq}), 410
+        
+        return jsonify({
+            'epoch': queue_events.epoch,
+            'seq': queue_events.seq,
+            'deltas': deltas
+        })
+        
+    except Exception as e:
+        logger.error(f"Error getting music queue deltas: {e}")
+        return jsonify({'error': 'Failed to get music queue deltas'}), 500
+
 @app.route('/api/music/add', methods=['POST'])
 def add_music():
     """Add music to queue (alternative endpoint)"""
@@ -419,298 +686,27 @@ def get_statistics():
 
 @app.route('/report')
 def birthday_report():
-    """Generate simple HTML report for Valérie's party memories"""
+    """Memory book report for Valérie's party, streamed one page at a time"""
     try:
-        # Get all uploads with notes
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-        SELECT guest_name, file_path, file_type, original_filename, 
-               birthday_note, timestamp
-        FROM uploads
-        WHERE processed = TRUE
-        ORDER BY timestamp ASC
-        ''')
-        
-        uploads = cursor.fetchall()
-        conn.close()
-        
-        # Get music uploads separately
-        music_uploads = [upload for upload in uploads if upload['file_type'] == 'music']
-        media_uploads = [upload for upload in uploads if upload['file_type'] in ('photo', 'video')]
-        
-        # Get party statistics
-        stats = db.get_statistics()
-        unique_contributors = len(set(upload['guest_name'] for upload in uploads if upload['guest_name']))
-        
-        # Generate HTML report with dark theme
-        html = f'''<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Valérie's 50th Birthday Memory Book</title>
-    <style>
-        body {{
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            max-width: 1200px;
-            margin: 0 auto;
-            padding: 20px;
-            line-height: 1.5;
-            background: #f8f9fa;
-            color: #333;
-            min-height: 100vh;
-        }}
-        .container {{
-            background: white;
-            border: 1px solid #ddd;
-            border-radius: 8px;
-            padding: 30px;
-            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-        }}
-        h1 {{
-            text-align: center;
-            background: linear-gradient(45deg, #FFD700, #FFA500);
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            background-clip: text;
-            font-size: 3em;
-            margin-bottom: 15px;
-            font-family: 'Great Vibes', cursive;
-            text-shadow: 2px 2px 4px rgba(255, 215, 0, 0.3);
-        }}
-        .subtitle {{
-            text-align: center;
-            color: #FFD700;
-            font-size: 1.3em;
-            margin-bottom: 50px;
-            font-style: italic;
-        }}
-        .submissions-table {{
-            margin: 30px 0;
-            border: 1px solid #ccc;
-            border-collapse: collapse;
-            width: 100%;
-        }}
-        .table-header {{
-            display: grid;
-            grid-template-columns: 1fr 1.5fr 2fr 1.5fr 3fr;
-            background: #f8f9fa;
-            color: #333;
-            font-weight: bold;
-            padding: 15px 10px;
-            border-bottom: 2px solid #ddd;
-        }}
-        .table-row {{
-            display: grid;
-            grid-template-columns: 1fr 1.5fr 2fr 1.5fr 3fr;
-            padding: 12px 10px;
-            border-bottom: 1px solid #eee;
-            align-items: center;
-        }}
-        .table-row:nth-child(even) {{
-            background: #f9f9f9;
-        }}
-        .table-row:hover {{
-            background: #e9ecef;
-        }}
-        .col-time {{
-            font-size: 0.9em;
-            color: #666;
-        }}
-        .col-person {{
-            font-weight: bold;
-            color: #333;
-        }}
-        .col-photo {{
-            text-align: center;
-            padding: 8px;
-        }}
-        .photo-card {{
-            display: inline-block;
-            background: white;
-            border: 1px solid #ddd;
-            border-radius: 4px;
-            padding: 4px;
-            box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-        }}
-        .thumbnail {{
-            width: 80px;
-            height: 80px;
-            object-fit: cover;
-            border-radius: 2px;
-            display: block;
-        }}
-        .photo-filename {{
-            font-size: 0.7em;
-            color: #666;
-            text-align: center;
-            margin-top: 2px;
-            word-break: break-all;
-            max-width: 80px;
-        }}
-        .col-song {{
-            text-align: center;
-        }}
-        .song-link {{
-            color: #FFD700;
-            text-decoration: none;
-            font-size: 0.9em;
-            padding: 4px 8px;
-            border: 1px solid rgba(255, 215, 0, 0.3);
-            border-radius: 4px;
-            display: inline-block;
-        }}
-        .song-link:hover {{
-            background: rgba(255, 215, 0, 0.1);
-            text-decoration: underline;
-        }}
-        .col-message {{
-            font-style: italic;
-            color: #e0e0e0;
-            font-size: 0.95em;
-            line-height: 1.4;
-        }}
-        .stats {{
-            text-align: center;
-            background: rgba(255, 215, 0, 0.1);
-            border: 2px solid rgba(255, 215, 0, 0.3);
-            padding: 30px;
-            border-radius: 15px;
-            margin: 40px 0;
-        }}
-        .stats-grid {{
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
-            gap: 20px;
-            margin-top: 20px;
-        }}
-        .stat-item {{
-            background: rgba(26, 26, 26, 0.8);
-            padding: 20px;
-            border-radius: 10px;
-            border: 1px solid rgba(255, 215, 0, 0.2);
-        }}
-        .emoji {{
-            font-size: 1.8em;
-            margin: 0 8px;
-        }}
-        h2 {{
-            color: #FFD700;
-            font-size: 2.2em;
-            margin: 40px 0 30px 0;
-            text-align: center;
-            font-family: 'Great Vibes', cursive;
-        }}
-        .footer {{
-            text-align: center;
-            margin-top: 60px;
-            padding: 30px;
-            color: #888;
-            border-top: 1px solid rgba(255, 215, 0, 0.2);
-        }}
-        @media print {{
-            body {{ 
-                background: white; 
-                color: black;
-            }}
-            .container {{
-                border: 2px solid #FFD700;
-                background: white;
-            }}
-        }}
-    </style>
-    <link href="https://fonts.googleapis.com/css2?family=Great+Vibes:wght@400&display=swap" rel="stylesheet">
-</head>
-<body>
-    <div class="container">
-        <h1>Valérie's 50th Birthday Memory Book</h1>
-        <p class="subtitle">A collection of memories from your special celebration</p>
-        
-        <h2>Submissions</h2>
-        
-        <div class="submissions-table">
-            <div class="table-header">
-                <div class="col-time">Time</div>
-                <div class="col-person">Person</div>
-                <div class="col-photo">Photo</div>
-                <div class="col-song">Song</div>
-                <div class="col-message">Message</div>
-            </div>'''
-        
-        # Combine all uploads and sort by timestamp
-        all_uploads = list(uploads)
-        all_uploads.sort(key=lambda x: x['timestamp'])
-        
-        for upload in all_uploads:
-            guest_name = upload['guest_name'] or 'Anonymous'
-            birthday_note = upload['birthday_note'] or ''
-            filename = upload['original_filename'] or 'Unknown file'
-            timestamp = upload['timestamp']
-            file_type = upload['file_type']
-            file_path = upload['file_path']
-            
-            # Format timestamp to be more readable
-            try:
-                from datetime import datetime
-                dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                formatted_time = dt.strftime('%m/%d %H:%M')
-            except:
-                formatted_time = timestamp[:16]
-            
-            html += f'''
-            <div class="table-row">
-                <div class="col-time">{formatted_time}</div>
-                <div class="col-person">{guest_name}</div>
-                <div class="col-photo">'''
-            
-            if file_type in ('photo', 'video'):
-                # Use the actual stored file path
-                stored_filename = os.path.basename(file_path)
-                media_url = f"/media/{file_type}s/{stored_filename}"
-                short_filename = filename[:15] + '...' if len(filename) > 15 else filename
-                if file_type == 'photo':
-                    html += f'''<div class="photo-card">
-                        <img src="{media_url}" class="thumbnail" alt="Photo">
-                        <div class="photo-filename">{short_filename}</div>
-                    </div>'''
-                else:
-                    html += f'''<div class="photo-card">
-                        <video class="thumbnail" muted><source src="{media_url}"></video>
-                        <div class="photo-filename">{short_filename}</div>
-                    </div>'''
-            else:
-                html += '-'
-            
-            html += '</div><div class="col-song">'
-            
-            if file_type == 'music':
-                music_url = f"/media/music/{filename}"
-                html += f'<a href="{music_url}" class="song-link" download>{filename}</a>'
-            else:
-                html += '-'
-                
-            html += f'''</div>
-                <div class="col-message">{birthday_note}</div>
-            </div>'''
-        
-        html += '''
-        </div>
-        
-        <div class="footer">
-            <p><strong>Generated for Valérie's 50th Birthday celebration</strong></p>
-            <p style="font-size: 0.85em; margin-top: 10px;">Generated on {datetime.now().strftime('%B %d, %Y at %I:%M %p')}</p>
-        </div>
-    </div>
-</body>
-</html>'''
-        
-        return html
+        per_page = request.args.get('per_page', DEFAULT_PER_PAGE, type=int)
+        uploads = ReportPage(db, after_id=request.args.get('after', type=int), per_page=per_page)
+        total_uploads = db.count_report_uploads()
+        
+        # The compiled template is cached by Jinja; rows render as they are read from the database
+        stream = app.jinja_env.get_template('report.html').stream(
+            uploads=uploads,
+            page=max(1, request.args.get('page', 1, type=int)),
+            page_count=max(1, -(-total_uploads // uploads.per_page)),
+            per_page=uploads.per_page,
+            total_uploads=total_uploads,
+            generated_at=datetime.now()
+        )
+        stream.enable_buffering(50)
+        return Response(stream_with_context(stream), mimetype='text/html')
         
     except Exception as e:
         logger.error(f"Error generating report: {e}")
-        return f"<h1>Error generating report</h1><p>{str(e)}</p>", 500
+        return f"<h1>Error generating report</h1><p>{escape(str(e))}</p>", 500
 
 # Media serving routes
 @app.route('/media/<path:filename>')
@@ -727,11 +723,21 @@ def serve_media(filename):
         elif filename.startswith('music/'):
             media_dir = 'media/music'
             filename = filename[6:]  # Remove 'music/' prefix
+        elif filename.startswith('cache/music/'):
+            # Prefetched library song, read through from the library on a cache miss
+            file_path = prefetcher.resolve(filename[12:])
+            if not file_path:
+                return jsonify({'error': 'Media not found'}), 404
+            media_dir, filename = os.path.split(os.path.abspath(file_path))
         else:
             return jsonify({'error': 'Invalid media path'}), 404
         
-        return send_from_directory(media_dir, filename)
+        return media_server.send_from_directory(media_dir, filename)
         
+    except HTTPException as e:
+        if e.code == 416:
+            raise  # Seek past the end: the player needs the Content-Range
+        return jsonify({'error': 'Media not found'}), 404
     except Exception as e:
         logger.error(f"Error serving media {filename}: {e}")
         return jsonify({'error': 'Media not found'}), 404
@@ -740,14 +746,19 @@ def serve_media(filename):
 @app.route('/<path:filename>')
 def serve_static(filename):
     """Serve static frontend files"""
-    return send_from_directory(app.static_folder, filename)
+    return media_server.send_from_directory(app.static_folder, filename)
 
 # WebSocket events
 @socketio.on('connect')
-def handle_connect():
-    """Handle client connection"""
+def handle_connect(auth=None):
+    """Handle client connection, joining the room for the client's role"""
     client_id = request.sid
-    logger.info(f"Client connected: {client_id}")
+    role = (auth or {}).get('role')
+    if role not in ROLES:
+        role = 'display'  # Clients that do not say who they are get the TV's events
+    join_room(role)
+    broadcaster.add_client(client_id, rooms=[role])
+    logger.info(f"Client connected: {client_id} ({role})")
     emit('connected', {'message': 'Connected to Party Memory Wall', 'client_id': client_id})
 
 @socketio.on('disconnect')
@@ -755,6 +766,17 @@ def handle_disconnect():
     """Handle client disconnection"""
     client_id = request.sid
     logger.info(f"Client disconnected: {client_id}")
+    broadcaster.remove_client(client_id)
+
+@socketio.on('watch_download')
+def handle_watch_download(data):
+    """Follow progress events for one download job"""
+    job_id = (data or {}).get('job_id')
+    if not job_id:
+        return
+    room = download_room(job_id)
+    join_room(room)
+    broadcaster.join(request.sid, room)
 
 @socketio.on('ping')
 def handle_ping():
@@ -801,6 +823,28 @@ def search_music():
         logger.error(f"Error searching music: {e}")
         return jsonify({'error': 'Music search failed'}), 500
 
+@app.route('/api/music/suggest', methods=['GET'])
+def suggest_music():
+    """Search-as-you-type suggestions (committed searches go to /api/music/search)"""
+    try:
+        query = request.args.get('q', '').strip()
+        limit = min(request.args.get('limit', 8, type=int), 20)
+        
+        started = time.perf_counter()
+        suggestions = music_search.suggest(query, limit) if query else []
+        took_ms = (time.perf_counter() - started) * 1000
+        
+        return jsonify({
+            'query': query,
+            'suggestions': suggestions,
+            'count': len(suggestions),
+            'took_ms': round(took_ms, 3)
+        })
+        
+    except Exception as e:
+        logger.error(f"Error getting music suggestions: {e}")
+        return jsonify({'error': 'Failed to get suggestions'}), 500
+
 @app.route('/api/music/recommendations', methods=['GET'])
 def get_music_recommendations():
     """Get AI-powered music recommendations based on party patterns"""
@@ -836,6 +880,8 @@ def add_music_to_queue():
             
             if not file_path:
                 return jsonify({'error': 'file_path is required for local music'}), 400
+            if not prefetcher.is_library_path(file_path):
+                return jsonify({'error': 'file_path is not in the music library'}), 400
             
             # Create upload record first
             upload_id = db.add_upload(
@@ -864,13 +910,21 @@ def add_music_to_queue():
                     'source': 'local'
                 },
                 source='local',
-                guest_name=guest_name
+                guest_name=guest_name,
+                party_energy=dj_planner.measure_party_energy()
             )
             
             # Update patterns for AI learning
             db.update_music_pattern('artist', artist)
             if data.get('genre'):
                 db.update_music_pattern('genre', data.get('genre'))
+            music_search.suggest_index.invalidate()
+            record_selection(
+                artist=artist,
+                title=title,
+                genre=data.get('genre'),
+                guest_name=guest_name
+            )
             
             log_and_print(f"Added local music to queue: {artist} - {title}")
             
@@ -885,8 +939,7 @@ def add_music_to_queue():
             return jsonify({'error': 'source must be "local" or "youtube"'}), 400
         
         # Broadcast music update
-        music_queue = db.get_music_queue()
-        broadcast_music_update(music_queue)
+        broadcast_queue_change(added_ids=[queue_id])
         
         return jsonify({
             'message': 'Music added to queue',
@@ -927,18 +980,65 @@ def get_ai_dj_status():
             'total_searches': search_count,
             'threshold': ai_dj_threshold,
             'ready_for_ai_dj': search_count >= ai_dj_threshold,
-            'searches_remaining': max(0, ai_dj_threshold - search_count)
+            'searches_remaining': max(0, ai_dj_threshold - search_count),
+            'enabled': dj_planner.is_enabled(),
+            'party_energy': dj_planner.measure_party_energy(),
+            'last_plan': dj_planner.last_plan
         })
         
     except Exception as e:
         logger.error(f"Error checking AI DJ status: {e}")
         return jsonify({'error': 'Failed to check AI DJ status'}), 500
 
+@app.route('/api/music/dj', methods=['POST'])
+def set_ai_dj_mode():
+    """Turn AI DJ mode on or off"""
+    try:
+        data = request.get_json() or {}
+        enabled = bool(data.get('enabled'))
+        dj_planner.set_enabled(enabled)
+        
+        plan = broadcast_queue_change() if enabled else None
+        
+        log_and_print(f"AI DJ {'enabled' if enabled else 'disabled'}")
+        return jsonify({
+            'enabled': enabled,
+            'plan': plan
+        })
+        
+    except Exception as e:
+        logger.error(f"Error setting AI DJ mode: {e}")
+        return jsonify({'error': 'Failed to set AI DJ mode'}), 500
+
+@app.route('/api/music/played', methods=['POST'])
+def mark_music_played():
+    """Mark a queue entry as played and let the AI DJ re-plan ahead of it"""
+    try:
+        data = request.get_json() or {}
+        queue_id = data.get('queue_id')
+        if not queue_id:
+            return jsonify({'error': 'queue_id is required'}), 400
+        
+        if not db.mark_music_played(queue_id):
+            return jsonify({'error': 'Queue entry not found'}), 404
+        
+        plan = broadcast_queue_change(played_ids=[queue_id])
+        
+        return jsonify({
+            'message': 'Marked as played',
+            'queue_id': queue_id,
+            'plan': plan
+        })
+        
+    except Exception as e:
+        logger.error(f"Error marking music played: {e}")
+        return jsonify({'error': 'Failed to mark music played'}), 500
+
 @app.route('/api/music/download', methods=['POST'])
 def download_youtube_music():
-    """Download music from YouTube and add to queue"""
+    """Queue a YouTube download; returns a job id right away"""
     try:
-        data = request.get_json()
+        data = request.get_json() or {}
         
         youtube_url = data.get('url')
         guest_name = data.get('guest_name', 'Anonymous')
@@ -948,117 +1048,60 @@ def download_youtube_music():
         if not youtube_url:
             return jsonify({'error': 'YouTube URL is required'}), 400
         
-        log_and_print(f"Downloading YouTube music: {artist} - {title}")
-        
-        # Import yt-dlp here to avoid startup delays
-        import yt_dlp
-        
-        # Create download directory
-        download_dir = 'media/music'
-        os.makedirs(download_dir, exist_ok=True)
-        
-        # Configure yt-dlp
-        ydl_opts = {
-            'format': 'bestaudio/best',
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '192',
-            }],
-            'outtmpl': f'{download_dir}/%(title)s.%(ext)s',
-            'quiet': True,
-            'no_warnings': True,
-            'noplaylist': True,
-        }
-        
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                # Extract info first to get the actual title
-                info = ydl.extract_info(youtube_url, download=False)
-                actual_title = info.get('title', title)
-                actual_duration = info.get('duration')
-                
-                # Download the audio
-                ydl.download([youtube_url])
-                
-                # Find the downloaded file
-                safe_title = "".join(c for c in actual_title if c.isalnum() or c in (' ', '-', '_')).rstrip()
-                downloaded_file = f"{download_dir}/{safe_title}.mp3"
-                
-                # Try to find the actual downloaded file
-                import glob
-                possible_files = glob.glob(f"{download_dir}/*.mp3")
-                if possible_files:
-                    # Get the most recently created file
-                    downloaded_file = max(possible_files, key=os.path.getctime)
-                
-                if not os.path.exists(downloaded_file):
-                    return jsonify({'error': 'Download completed but file not found'}), 500
-                
-                # Create upload record
-                upload_id = db.add_upload(
-                    device_id=get_device_id(),
-                    guest_name=guest_name,
-                    file_path=downloaded_file,
-                    file_type='music',
-                    original_filename=f"{actual_title}.mp3",
-                    file_size=os.path.getsize(downloaded_file)
-                )
-                
-                # Add to music queue
-                queue_id = db.add_to_music_queue(
-                    upload_id=upload_id,
-                    song_title=actual_title,
-                    artist=artist,
-                    duration=actual_duration
-                )
-                
-                # Log the selection for learning
-                db.log_music_search(
-                    query=data.get('original_query', ''),
-                    selected_result={
-                        'title': actual_title,
-                        'artist': artist,
-                        'url': youtube_url,
-                        'source': 'youtube'
-                    },
-                    source='youtube',
-                    guest_name=guest_name
-                )
-                
-                # Update patterns for AI learning
-                db.update_music_pattern('artist', artist)
-                
-                log_and_print(f"Successfully downloaded and queued: {artist} - {actual_title}")
-                
-                # Broadcast music update
-                music_queue = db.get_music_queue()
-                broadcast_music_update(music_queue)
-                
-                return jsonify({
-                    'message': 'Music downloaded and added to queue',
-                    'title': actual_title,
-                    'artist': artist,
-                    'duration': actual_duration,
-                    'queue_id': queue_id,
-                    'upload_id': upload_id,
-                    'file_path': downloaded_file
-                })
-                
-        except Exception as download_error:
-            logger.error(f"yt-dlp download error: {download_error}")
-            return jsonify({'error': f'Download failed: {str(download_error)}'}), 500
-            
+            job, created = download_jobs.submit(
+                youtube_url,
+                guest_name=guest_name,
+                device_id=get_device_id(),
+                title=title,
+                artist=artist,
+                original_query=data.get('original_query', '')
+            )
+        except DownloadQueueFull as e:
+            logger.warning(f"Rejected YouTube download: {e}")
+            return jsonify({'error': 'Too many downloads in progress, try again shortly'}), 503
+        
+        if job['status'] == 'completed':
+            message = 'Added to queue from download cache'
+        elif created:
+            message = 'Download queued'
+            log_and_print(f"Queued YouTube download: {artist} - {title}")
+        else:
+            message = 'Download already in progress'
+        
+        return jsonify({
+            'message': message,
+            'job_id': job['id'],
+            'status': job['status'],
+            'progress': job['progress'],
+            'deduplicated': not created,
+            'status_url': f"/api/music/download/{job['id']}"
+        }), 200 if job['status'] == 'completed' else 202
+        
     except Exception as e:
-        logger.error(f"Error downloading YouTube music: {e}")
+        logger.error(f"Error queueing YouTube download: {e}")
         return jsonify({'error': 'YouTube download failed'}), 500
 
+@app.route('/api/music/download/<job_id>', methods=['GET'])
+def get_download_job_status(job_id):
+    """Get the state and progress of a YouTube download job"""
+    try:
+        job = download_jobs.get_job(job_id)
+        if not job:
+            return jsonify({'error': 'Download job not found'}), 404
+        return jsonify(job)
+        
+    except Exception as e:
+        logger.error(f"Error getting download job {job_id}: {e}")
+        return jsonify({'error': 'Failed to get download job'}), 500
+
 @app.route('/api/ollama/models', methods=['GET'])
 def get_available_models():
     """Get available Ollama models"""
     try:
         import requests
-        response = requests.get('http://127.0.0.1:11434/api/tags', timeout=5)
+        with metrics.external_call('ollama'):
+            response = run_blocking(requests.get, 'http://127.0.0.1:11434/api/tags', timeout=5)
         
         if response.status_code == 200:
             data = response.json()
@@ -1111,7 +1154,8 @@ def select_ollama_model():
         
         # Verify the model exists
         import requests
-        response = requests.get('http://127.0.0.1:11434/api/tags', timeout=5)
+        with metrics.external_call('ollama'):
+            response = run_blocking(requests.get, 'http://127.0.0.1:11434/api/tags', timeout=5)
         
         if response.status_code == 200:
             available_models = [m['name'] for m in response.json().get('models', [])]
@@ -1119,12 +1163,8 @@ def select_ollama_model():
             if model_name not in available_models:
                 return jsonify({'error': f'Model {model_name} is not available'}), 400
             
-            # Save the selected model
-            db.update_setting('ollama_model', model_name)
-            
-            # Update the music search service to use the new model
-            global music_search_service
-            music_search_service.selected_model = model_name
+            # Save the selected model; every worker's music search picks it up
+            save_setting('ollama_model', model_name)
             
             logger.info(f"Ollama model changed to: {model_name}")
             
@@ -1144,20 +1184,35 @@ def select_ollama_model():
 def health_check():
     """Health check endpoint"""
     try:
-        # Test database connection
-        stats = db.get_statistics()
+        # Probes run often: a trivial query proves the database answers; party totals are on /api/statistics
+        db.ping()
         
         return jsonify({
             'status': 'healthy',
             'party': PARTY_CONFIG['title'],
             'uptime': datetime.now().isoformat(),
-            'stats': stats
+            'broadcast': broadcaster.stats(),
+            'video_processing': video_processor.stats(),
+            'photo_processing': photo_processor.stats(),
+            'worker': WORKER_INDEX
         })
         
     except Exception as e:
         logger.error(f"Health check failed: {e}")
         return jsonify({'status': 'unhealthy', 'error': str(e)}), 500
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Request, emit, database and external call metrics in the Prometheus text format"""
+    return Response(metrics.REGISTRY.render({'worker': WORKER_INDEX}), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/api/query-stats')
+def query_stats():
+    """Top SQLite statements and recent slow ones with their plans, when PARTY_SLOW_QUERY_MS is set"""
+    if db.query_log is None:
+        return jsonify({'error': 'Query logging is off; set PARTY_SLOW_QUERY_MS to enable it'}), 404
+    return jsonify(dict(db.query_log.report(), worker=WORKER_INDEX))
+
 if __name__ == '__main__':
     print("🎉 Starting Party Memory Wall Backend")
     print(f"🎂 {PARTY_CONFIG['title']}")
@@ -1166,6 +1221,7 @@ if __name__ == '__main__':
     print("Frontend URL: http://localhost:8000")
     print("Upload URL: http://localhost:8000/upload")
     print("API Docs: http://localhost:8000/health")
+    print("Development server - for the party use: python serve.py --async-mode eventlet")
     print("=" * 50)
     
     # Run Flask-SocketIO app
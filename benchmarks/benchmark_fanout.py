@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Music Queue Fan-out Benchmark
+Broadcasts queue changes to simulated Socket.IO clients as the queue history grows,
+comparing the old full-queue payload against sequenced deltas
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import tempfile
+import time
+from flask import Flask
+from flask_socketio import SocketIO
+from database import PartyDatabase
+from queue_events import QueueEventLog
+
+
+def build_queue(db: PartyDatabase, songs: int):
+    """Queue `songs` guest tracks and mark all but the last ten played"""
+    ids = []
+    for i in range(songs):
+        upload_id = db.add_upload(device_id='bench', guest_name=f"Guest {i % 25}",
+                                  file_path=f"media/music/song_{i}.mp3", file_type='music')
+        ids.append(db.add_to_music_queue(upload_id=upload_id, song_title=f"Song {i}",
+                                         artist=f"Artist {i % 40}", duration=210))
+    for queue_id in ids[:-10]:
+        db.mark_music_played(queue_id)
+
+
+def fanout(socketio: SocketIO, clients, event: str, payload) -> float:
+    """Emit one payload to every client; returns milliseconds until all have received it"""
+    started = time.perf_counter()
+    socketio.emit(event, payload)
+    for client in clients:
+        client.get_received()
+    return (time.perf_counter() - started) * 1000
+
+
+def run(client_count: int = 200, sizes=(50, 500, 2000)):
+    """Measure payload size and fan-out time for each queue history size"""
+    app = Flask(__name__)
+    socketio = SocketIO(app, async_mode='threading')
+    clients = [socketio.test_client(app) for _ in range(client_count)]
+
+    print(f"📡 Fan-out to {client_count} clients")
+    print("-" * 72)
+    print(f"{'history':>8} {'full bytes':>12} {'full ms':>10} {'delta bytes':>12} {'delta ms':>10}")
+
+    results = []
+    for size in sizes:
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as temp_db:
+            temp_db_path = temp_db.name
+        try:
+            db = PartyDatabase(temp_db_path)
+            build_queue(db, size)
+            events = QueueEventLog(db, emit=lambda event, delta: None)
+
+            upload_id = db.add_upload(device_id='bench', guest_name='Late Guest',
+                                      file_path='media/music/late.mp3', file_type='music')
+            queue_id = db.add_to_music_queue(upload_id=upload_id, song_title='Late Song')
+
+            full = {'type': 'music_update', 'data': db.get_music_queue()}
+            delta = {'type': 'music_delta', 'data': events.added([queue_id])}
+            full_bytes = len(json.dumps(full))
+            delta_bytes = len(json.dumps(delta))
+            full_ms = fanout(socketio, clients, 'music_update', full)
+            delta_ms = fanout(socketio, clients, 'music_delta', delta)
+        finally:
+            os.unlink(temp_db_path)
+
+        print(f"{size:>8} {full_bytes:>12,} {full_ms:>10.1f} {delta_bytes:>12,} {delta_ms:>10.1f}")
+        results.append({'history': size, 'full_bytes': full_bytes, 'full_ms': full_ms,
+                        'delta_bytes': delta_bytes, 'delta_ms': delta_ms})
+
+    for client in clients:
+        client.disconnect()
+    return results
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Benchmark music queue broadcasts to many clients")
+    parser.add_argument("--clients", type=int, default=200, help="Simulated Socket.IO clients")
+    parser.add_argument("--sizes", type=int, nargs='+', default=[50, 500, 2000],
+                        help="Queue history sizes to measure")
+    args = parser.parse_args()
+
+    run(client_count=args.clients, sizes=args.sizes)
+
+
+if __name__ == "__main__":
+    main()
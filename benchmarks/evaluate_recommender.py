@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Offline Recommender Evaluation
+Replays logged queue selections in order and measures how often the
+recommender predicted the next pick, against a random baseline
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import random
+import statistics
+import time
+from database import PartyDatabase
+from music_recommender import MusicRecommender, _artist_key, _track_key
+
+
+def percentile(values, pct):
+    """Simple nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def evaluate(db_path: str, top_n: int = 10, warmup: int = 5, seed: int = 50):
+    """Replay history through a fresh recommender and score each prediction"""
+    random.seed(seed)
+    db = PartyDatabase(db_path)
+    history = db.get_queue_history()
+
+    recommender = MusicRecommender(db)
+    recommender.build(include_history=False)
+    library_ids = list(recommender._tracks.keys())
+
+    if not history or not library_ids:
+        print("❌ Need queue history and an indexed library to evaluate")
+        return None
+
+    stats = {
+        'events': 0, 'track_hits': 0, 'artist_hits': 0, 'reciprocal_rank': 0.0,
+        'random_track_hits': 0, 'random_artist_hits': 0
+    }
+    recommend_ms = []
+    record_ms = []
+
+    for i, item in enumerate(history):
+        target_track = _track_key(item['artist'], item['song_title'])
+        target_artist = _artist_key(item['artist'])
+
+        if i >= warmup:
+            started = time.perf_counter()
+            recommendations = recommender.recommend(top_n)
+            recommend_ms.append((time.perf_counter() - started) * 1000)
+
+            tracks = [_track_key(r['artist'], r['title']) for r in recommendations]
+            artists = {_artist_key(r['artist']) for r in recommendations}
+            stats['events'] += 1
+            if target_track in tracks:
+                stats['track_hits'] += 1
+                stats['reciprocal_rank'] += 1 / (tracks.index(target_track) + 1)
+            if target_artist in artists:
+                stats['artist_hits'] += 1
+
+            baseline = random.sample(library_ids, min(top_n, len(library_ids)))
+            if any(recommender._tracks[b][2] == target_track for b in baseline):
+                stats['random_track_hits'] += 1
+            if any(recommender._tracks[b][0] == target_artist for b in baseline):
+                stats['random_artist_hits'] += 1
+
+        started = time.perf_counter()
+        recommender.record_selection(artist=item['artist'], title=item['song_title'],
+                                     genre=item['genre'], guest_name=item['guest_name'],
+                                     library_id=item['library_id'])
+        record_ms.append((time.perf_counter() - started) * 1000)
+
+    events = max(stats['events'], 1)
+    print(f"🎵 Replayed {len(history)} selections ({stats['events']} scored, top-{top_n})")
+    print("-" * 50)
+    print(f"Track hit rate:   {stats['track_hits'] / events:.3f} (random {stats['random_track_hits'] / events:.3f})")
+    print(f"Artist hit rate:  {stats['artist_hits'] / events:.3f} (random {stats['random_artist_hits'] / events:.3f})")
+    print(f"Track MRR:        {stats['reciprocal_rank'] / events:.3f}")
+    if recommend_ms:
+        print(f"recommend():      {statistics.mean(recommend_ms):.3f} ms avg, {percentile(recommend_ms, 95):.3f} ms p95")
+    print(f"record_selection: {statistics.mean(record_ms):.3f} ms avg, {percentile(record_ms, 95):.3f} ms p95")
+    return stats
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Evaluate the party music recommender offline")
+    parser.add_argument("--db", default="database/party.db", help="Party database to replay")
+    parser.add_argument("--top", type=int, default=10, help="Recommendations per prediction")
+    parser.add_argument("--warmup", type=int, default=5, help="Selections to learn before scoring")
+    parser.add_argument("--seed", type=int, default=50, help="Random seed for the baseline")
+    args = parser.parse_args()
+
+    evaluate(args.db, top_n=args.top, warmup=args.warmup, seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Server Load Test
+Starts serve.py in each async mode, holds many Socket.IO connections open like guest phones
+and the TV do, and measures HTTP latency while they are connected
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import importlib.util
+import statistics
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import socketio
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, pct):
+    """Simple nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def start_server(async_mode: str, port: int, workdir: str) -> subprocess.Popen:
+    """Run serve.py in a scratch directory and wait until /health answers"""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(REPO_DIR, 'serve.py'), '--async-mode', async_mode,
+         '--host', '127.0.0.1', '--port', str(port)],
+        cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/health", timeout=1).ok:
+                return process
+        except requests.RequestException:
+            time.sleep(0.5)
+    process.kill()
+    raise RuntimeError(f"Server in {async_mode} mode did not start")
+
+
+def connect_client(url: str, role: str):
+    """Open one Socket.IO connection; returns (client, seconds) or (None, seconds)"""
+    client = socketio.Client(reconnection=False)
+    started = time.perf_counter()
+    try:
+        client.connect(url, transports=['polling'], auth={'role': role}, wait_timeout=15)
+        return client, time.perf_counter() - started
+    except Exception:
+        return None, time.perf_counter() - started
+
+
+def timed_get(url: str):
+    """One GET; returns (milliseconds, ok)"""
+    started = time.perf_counter()
+    try:
+        ok = requests.get(url, timeout=15).ok
+    except requests.RequestException:
+        ok = False
+    return (time.perf_counter() - started) * 1000, ok
+
+
+def run(async_mode: str, connections: int, request_count: int, concurrency: int, port: int):
+    """Measure one async mode; returns a result row"""
+    with tempfile.TemporaryDirectory() as workdir:
+        process = start_server(async_mode, port, workdir)
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            roles = ['display' if i == 0 else 'uploader' for i in range(connections)]
+            with ThreadPoolExecutor(max_workers=50) as pool:
+                opened = list(pool.map(lambda role: connect_client(base_url, role), roles))
+            clients = [client for client, _ in opened if client]
+            connect_times = [seconds for client, seconds in opened if client]
+
+            url = f"{base_url}/api/music/queue/snapshot"
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                results = list(pool.map(lambda _: timed_get(url), range(request_count)))
+            elapsed = time.perf_counter() - started
+
+            for client in clients:
+                client.disconnect()
+        finally:
+            process.terminate()
+            process.wait(10)
+
+    latencies = [ms for ms, ok in results if ok]
+    return {
+        'mode': async_mode,
+        'connected': len(clients),
+        'connect_p95_ms': percentile(connect_times, 95) * 1000,
+        'request_p50_ms': statistics.median(latencies) if latencies else 0.0,
+        'request_p95_ms': percentile(latencies, 95),
+        'errors': len(results) - len(latencies),
+        'requests_per_second': len(results) / elapsed,
+    }
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Compare connection capacity of the server async modes")
+    parser.add_argument("--modes", nargs='+', default=['threading', 'eventlet', 'gevent'],
+                        help="Async modes to test (uninstalled ones are skipped)")
+    parser.add_argument("--connections", type=int, default=200, help="Socket.IO clients held open")
+    parser.add_argument("--requests", type=int, default=1000, help="HTTP requests while connected")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent HTTP requests")
+    parser.add_argument("--port", type=int, default=8765, help="Port for the test server")
+    args = parser.parse_args()
+
+    rows = []
+    for mode in args.modes:
+        if mode != 'threading' and importlib.util.find_spec(mode) is None:
+            print(f"⚠️  Skipping {mode}: not installed")
+            continue
+        print(f"🚀 Testing {mode} with {args.connections} connections...")
+        rows.append(run(mode, args.connections, args.requests, args.concurrency, args.port))
+
+    print("-" * 86)
+    print(f"{'mode':<10} {'connected':>10} {'connect p95':>12} {'req p50':>10} {'req p95':>10} "
+          f"{'errors':>8} {'req/s':>10}")
+    for row in rows:
+        print(f"{row['mode']:<10} {row['connected']:>6}/{args.connections:<3} {row['connect_p95_ms']:>10.0f}ms "
+              f"{row['request_p50_ms']:>8.1f}ms {row['request_p95_ms']:>8.1f}ms {row['errors']:>8} "
+              f"{row['requests_per_second']:>10.1f}")
+    return rows
+
+
+if __name__ == "__main__":
+    main()
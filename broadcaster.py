@@ -0,0 +1,165 @@
+"""
+Broadcast Dispatcher
+Coalesces Socket.IO broadcasts into short timed batches and fans them out off the request thread,
+only to the rooms that need them, with a per-client send rate cap so slow clients fall behind
+instead of holding up uploads
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Any, Iterable, List, Optional, Tuple
+
+BATCH_EVENT = 'batch'
+
+# Client roles, each also a room: the TV slideshow, guest phones, and status/admin tools
+ROLES = ('display', 'uploader', 'admin')
+
+Event = Tuple[str, Any, Any, Optional[frozenset]]  # (event, key, data, rooms)
+
+
+class BroadcastDispatcher:
+    """Batches events per window; each client gets at most max_rate batches per second"""
+
+    def __init__(self, emit: Callable, window: float = 0.15, max_rate: float = 4.0, burst: int = 4,
+                 max_client_backlog: int = 200, max_pending: int = 5000):
+        self.emit = emit  # socketio.emit-compatible: emit(event, payload, to=sid)
+        self.window = window
+        self.max_rate = max_rate
+        self.burst = burst
+        self.max_client_backlog = max_client_backlog
+        self.max_pending = max_pending
+        self._pending: List[Event] = []
+        self._clients: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.counters = {'events': 0, 'batches': 0, 'sends': 0, 'merged': 0, 'dropped': 0}
+
+    def add_client(self, sid: str, rooms: Iterable[str] = ()):
+        """Start delivering batches to a connected client in the given rooms"""
+        with self._lock:
+            self._clients[sid] = {'tokens': float(self.burst), 'refilled': time.monotonic(), 'backlog': [],
+                                  'rooms': set(rooms)}
+
+    def join(self, sid: str, room: str):
+        """Add a connected client to another room"""
+        with self._lock:
+            if sid in self._clients:
+                self._clients[sid]['rooms'].add(room)
+
+    def leave(self, sid: str, room: str):
+        """Remove a client from a room"""
+        with self._lock:
+            if sid in self._clients:
+                self._clients[sid]['rooms'].discard(room)
+
+    def remove_client(self, sid: str):
+        """Forget a disconnected client and its backlog"""
+        with self._lock:
+            self._clients.pop(sid, None)
+
+    def publish(self, event: str, data: Any, key: Any = None, rooms: Optional[Iterable[str]] = None):
+        """Queue an event for the next batch to the given rooms (everyone when None);
+        events with the same key replace each other"""
+        with self._lock:
+            self.counters['events'] += 1
+            self._merge(self._pending, [(event, key, data, frozenset(rooms) if rooms is not None else None)])
+            overflow = len(self._pending) - self.max_pending
+            if overflow > 0:
+                del self._pending[:overflow]
+                self.counters['dropped'] += overflow
+        self._start()
+        self._wake.set()
+
+    def _merge(self, backlog: List[Event], events: List[Event]):
+        """Append events to a backlog, replacing older ones with the same event and key"""
+        for item in events:
+            event, key = item[0], item[1]
+            if key is not None:
+                for i, queued in enumerate(backlog):
+                    if queued[0] == event and queued[1] == key:
+                        del backlog[i]
+                        self.counters['merged'] += 1
+                        break
+            backlog.append(item)
+
+    def flush(self) -> int:
+        """Send the pending batch to every client allowed to receive one; returns emits made"""
+        with self._lock:
+            batch, self._pending = self._pending, []
+            if batch:
+                self.counters['batches'] += 1
+            now = time.monotonic()
+            groups: Dict[Tuple[int, ...], Tuple[List[str], List[Event]]] = {}
+            for sid, client in self._clients.items():
+                client['tokens'] = min(self.burst, client['tokens'] + (now - client['refilled']) * self.max_rate)
+                client['refilled'] = now
+                self._merge(client['backlog'], [item for item in batch
+                                                if item[3] is None or item[3] & client['rooms']])
+
+                if client['backlog'] and client['tokens'] >= 1:
+                    client['tokens'] -= 1
+                    # Clients due the same events share one emit
+                    sids, events = groups.setdefault(tuple(map(id, client['backlog'])), ([], client['backlog']))
+                    sids.append(sid)
+                    client['backlog'] = []
+                else:
+                    overflow = len(client['backlog']) - self.max_client_backlog
+                    if overflow > 0:
+                        # Too far behind: drop its oldest events (queue deltas resync from a snapshot)
+                        del client['backlog'][:overflow]
+                        self.counters['dropped'] += overflow
+
+        for sids, events in groups.values():
+            self._send(sids, events)
+        self.counters['sends'] += len(groups)
+        return len(groups)
+
+    def _send(self, sids: List[str], events: List[Event]):
+        """Emit one batch event to a group of clients"""
+        payload = {
+            'type': BATCH_EVENT,
+            'data': {'events': [{'type': item[0], 'data': item[2]} for item in events]}
+        }
+        try:
+            self.emit(BATCH_EVENT, payload, to=sids if len(sids) > 1 else sids[0])
+        except Exception as e:
+            print(f"⚠️  Broadcast to {len(sids)} clients failed: {e}")
+
+    def _behind(self) -> bool:
+        """Whether any client still has undelivered events"""
+        with self._lock:
+            return any(client['backlog'] for client in self._clients.values())
+
+    def _run(self):
+        """Worker loop: collect events for one window, then flush"""
+        while not self._stop.is_set():
+            # Rate-limited clients are retried once a token has refilled
+            self._wake.wait(1.0 / self.max_rate if self._behind() else None)
+            self._wake.clear()
+            if self._stop.wait(self.window):
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ Broadcast dispatcher error: {e}")
+
+    def _start(self):
+        """Start the worker on first use"""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='broadcast-dispatcher', daemon=True)
+                    self._thread.start()
+
+    def stats(self) -> Dict[str, int]:
+        """Queue depth and delivery counters for status endpoints"""
+        with self._lock:
+            return dict(self.counters, queue_depth=len(self._pending), clients=len(self._clients),
+                        client_backlog=sum(len(client['backlog']) for client in self._clients.values()))
+
+    def stop(self):
+        """Stop the worker thread"""
+        self._stop.set()
+        self._wake.set()
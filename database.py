@@ -5,34 +5,74 @@ SQLite database handling for Valérie's 50th Birthday celebration
 
 import sqlite3
 import os
+import hashlib
 from datetime import datetime
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
 import json
 
+from query_log import QueryLog, ProfiledConnection
+
+
+def is_party_media(file_path: str, media_dir: str = 'media') -> bool:
+    """True for files stored under the party's own media directory"""
+    media_root = os.path.abspath(media_dir)
+    return os.path.abspath(file_path).startswith(media_root + os.sep)
+
+
+def is_under_root(file_path: str, root: str) -> bool:
+    """True when file_path, with symlinks resolved, lies inside root"""
+    return os.path.realpath(file_path).startswith(os.path.realpath(root) + os.sep)
+
+
+def cached_media_name(file_path: str) -> str:
+    """Stable cache file name for a library file outside the media directory"""
+    digest = hashlib.sha1(file_path.encode('utf-8')).hexdigest()[:20]
+    return digest + os.path.splitext(file_path)[1].lower()
+
+
+def rendition_url(upload_id: int, file_path: str, content_hash: str = None, folder: str = 'videos') -> str:
+    """URL of a rendition stored under media/<folder>/<upload id>/"""
+    url = f"/media/{folder}/{upload_id}/{os.path.basename(file_path)}"
+    return f"{url}?v={content_hash}" if content_hash else url
+
 
 class PartyDatabase:
     """Database operations for Party Memory Wall"""
     
-    def __init__(self, db_path: str = 'database/party.db'):
+    def __init__(self, db_path: str = 'database/party.db', query_log: QueryLog = None):
         """Initialize database connection and create tables if needed"""
         self.db_path = db_path
+        # Statement profiling is opt-in (PARTY_SLOW_QUERY_MS); plain connections otherwise
+        self.query_log = query_log if query_log is not None else QueryLog.from_env()
         
         # Ensure database directory exists
         db_dir = os.path.dirname(db_path)
         if db_dir and not os.path.exists(db_dir):
             os.makedirs(db_dir, exist_ok=True)
         
+        self._enable_wal()
         self._create_tables()
         self._create_indexes()
         self._initialize_settings()
     
     def get_connection(self) -> sqlite3.Connection:
         """Get database connection with proper configuration"""
-        conn = sqlite3.connect(self.db_path)
+        # Wait for other writers (threads or worker processes) instead of failing with "database is locked"
+        factory = ProfiledConnection if self.query_log is not None else sqlite3.Connection
+        conn = sqlite3.connect(self.db_path, timeout=10, factory=factory)
         conn.row_factory = sqlite3.Row  # Enable column access by name
         conn.execute("PRAGMA foreign_keys = ON")  # Enable foreign key constraints
+        conn.execute("PRAGMA synchronous = NORMAL")  # Safe with WAL, far fewer fsyncs
+        if self.query_log is not None:
+            conn.query_log = self.query_log  # Attached after the pragmas, which are not worth recording
         return conn
     
+    def _enable_wal(self):
+        """Switch to write-ahead logging so readers never block the writer (persists in the file)"""
+        conn = self.get_connection()
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.close()
+    
     def _create_tables(self):
         """Create all required database tables"""
         conn = self.get_connection()
@@ -51,7 +91,8 @@ class PartyDatabase:
             duration INTEGER,
             timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
             processed BOOLEAN DEFAULT FALSE,
-            birthday_note TEXT
+            birthday_note TEXT,
+            content_hash TEXT  -- Versions the media URL for immutable caching
         )
         ''')
         
@@ -68,6 +109,8 @@ class PartyDatabase:
             played BOOLEAN DEFAULT FALSE,
             queue_position INTEGER,
             timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            library_id INTEGER,  -- Set for songs planned by the AI DJ
+            dj_planned BOOLEAN DEFAULT FALSE,
             FOREIGN KEY (upload_id) REFERENCES uploads(id)
         )
         ''')
@@ -105,7 +148,12 @@ class PartyDatabase:
             duration INTEGER,
             file_size INTEGER,
             embedding TEXT,  -- JSON-encoded Ollama embedding vector
-            indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            bpm REAL,
+            loudness_db REAL,
+            energy REAL,
+            danceability REAL,
+            features_at TIMESTAMP
         )
         ''')
         
@@ -134,6 +182,93 @@ class PartyDatabase:
         )
         ''')
         
+        # Track loudness table - measured once per file for playback gain
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS track_loudness (
+            file_path TEXT PRIMARY KEY,
+            integrated_lufs REAL,
+            true_peak_db REAL,
+            gain_db REAL,  -- NULL when the file could not be measured
+            measured_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        
+        # Download jobs table - background YouTube downloads
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS download_jobs (
+            id TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued'
+                CHECK(status IN ('queued', 'downloading', 'processing', 'completed', 'failed')),
+            progress REAL DEFAULT 0,  -- Percent 0..100
+            guest_name TEXT,
+            device_id TEXT,
+            title TEXT,
+            artist TEXT,
+            original_query TEXT,
+            file_path TEXT,
+            queue_id INTEGER,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        
+        # Queue events table - music queue deltas shared by all app workers
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS queue_events (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            epoch TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        
+        # Download cache table - finished YouTube downloads keyed by video id
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS download_cache (
+            video_id TEXT PRIMARY KEY,
+            file_path TEXT NOT NULL,
+            title TEXT,
+            duration INTEGER,
+            downloaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        
+        # Media validators table - content hashes for ETags, shared by workers and restarts
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS media_validators (
+            file_path TEXT PRIMARY KEY,
+            mtime_ns INTEGER NOT NULL,
+            file_size INTEGER NOT NULL,
+            content_hash TEXT NOT NULL,
+            computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        
+        # Media renditions table - web-optimized versions of uploads made by the processing stage
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS media_renditions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            upload_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,  -- 'video' (faststart H.264/AAC MP4), 'poster' (JPEG frame), 'hls' (playlist)
+                                 -- 'display' (upright WebP of a photo) or 'thumb' (small still of either)
+            status TEXT NOT NULL DEFAULT 'queued'
+                CHECK(status IN ('queued', 'processing', 'ready', 'failed')),
+            progress REAL DEFAULT 0,  -- Percent 0..100
+            file_path TEXT,
+            width INTEGER,
+            height INTEGER,
+            file_size INTEGER,
+            content_hash TEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(upload_id, kind),
+            FOREIGN KEY (upload_id) REFERENCES uploads (id)
+        )
+        ''')
+        
         # Create FTS5 virtual table for music search
         cursor.execute('''
         CREATE VIRTUAL TABLE IF NOT EXISTS music_search USING fts5(
@@ -161,6 +296,38 @@ class PartyDatabase:
             cursor.execute('ALTER TABLE uploads ADD COLUMN birthday_note TEXT')
             print("✅ Added birthday_note column to uploads table")
         
+        if 'content_hash' not in columns:
+            cursor.execute('ALTER TABLE uploads ADD COLUMN content_hash TEXT')
+            print("✅ Added content_hash column to uploads table")
+        
+        # Audio feature columns filled by the indexer's feature stage
+        cursor.execute("PRAGMA table_info(music_library)")
+        library_columns = [column[1] for column in cursor.fetchall()]
+        
+        feature_columns = {
+            'bpm': 'REAL',
+            'loudness_db': 'REAL',  # RMS loudness of the analysis window, dBFS
+            'energy': 'REAL',  # 0..1
+            'danceability': 'REAL',  # 0..1
+            'features_at': 'TIMESTAMP'
+        }
+        for column, column_type in feature_columns.items():
+            if column not in library_columns:
+                cursor.execute(f'ALTER TABLE music_library ADD COLUMN {column} {column_type}')
+                print(f"✅ Added {column} column to music_library table")
+        
+        # AI DJ planner columns on the queue
+        cursor.execute("PRAGMA table_info(music_queue)")
+        queue_columns = [column[1] for column in cursor.fetchall()]
+        
+        if 'library_id' not in queue_columns:
+            cursor.execute('ALTER TABLE music_queue ADD COLUMN library_id INTEGER')
+            print("✅ Added library_id column to music_queue table")
+        
+        if 'dj_planned' not in queue_columns:
+            cursor.execute('ALTER TABLE music_queue ADD COLUMN dj_planned BOOLEAN DEFAULT FALSE')
+            print("✅ Added dj_planned column to music_queue table")
+        
         conn.commit()
         conn.close()
     
@@ -174,15 +341,22 @@ class PartyDatabase:
             'CREATE INDEX IF NOT EXISTS idx_uploads_timestamp ON uploads(timestamp)',
             'CREATE INDEX IF NOT EXISTS idx_uploads_type ON uploads(file_type)',
             'CREATE INDEX IF NOT EXISTS idx_uploads_device ON uploads(device_id)',
+            # Slideshow and report pages walk processed uploads in time order without sorting
+            'CREATE INDEX IF NOT EXISTS idx_uploads_processed ON uploads(processed, timestamp)',
+            'CREATE INDEX IF NOT EXISTS idx_uploads_guest ON uploads(guest_name)',
             'CREATE INDEX IF NOT EXISTS idx_queue_position ON music_queue(queue_position)',
             'CREATE INDEX IF NOT EXISTS idx_queue_played ON music_queue(played)',
+            'CREATE INDEX IF NOT EXISTS idx_queue_unplayed ON music_queue(played, queue_position)',
             'CREATE INDEX IF NOT EXISTS idx_devices_last_seen ON devices(last_seen)',
             'CREATE INDEX IF NOT EXISTS idx_library_artist ON music_library(artist)',
             'CREATE INDEX IF NOT EXISTS idx_library_album ON music_library(album)',
             'CREATE INDEX IF NOT EXISTS idx_library_title ON music_library(title)',
+            'CREATE INDEX IF NOT EXISTS idx_library_features ON music_library(features_at)',
             'CREATE INDEX IF NOT EXISTS idx_searches_timestamp ON music_searches(timestamp)',
             'CREATE INDEX IF NOT EXISTS idx_searches_source ON music_searches(source)',
-            'CREATE INDEX IF NOT EXISTS idx_patterns_type ON music_patterns(pattern_type)'
+            'CREATE INDEX IF NOT EXISTS idx_patterns_type ON music_patterns(pattern_type)',
+            'CREATE INDEX IF NOT EXISTS idx_download_jobs_url ON download_jobs(url, status)',
+            'CREATE INDEX IF NOT EXISTS idx_queue_events_epoch ON queue_events(epoch, seq)'
         ]
         
         for index_sql in indexes:
@@ -203,6 +377,7 @@ class PartyDatabase:
             'allowed_video_types': json.dumps(['mp4', 'mov', 'avi', 'webm', 'm4v', 'mkv']),
             'allowed_music_types': json.dumps(['mp3', 'm4a', 'wav', 'flac']),
             'weekend_days': '2',
+            'ai_dj_enabled': 'false',
             'ollama_model': 'deepseek-coder:6.7b'  # Best for Raspberry Pi
         }
         
@@ -220,7 +395,7 @@ class PartyDatabase:
     def add_upload(self, device_id: str, guest_name: str, file_path: str, 
                   file_type: str, original_filename: str = None, 
                   file_size: int = None, duration: int = None, 
-                  birthday_note: str = None) -> int:
+                  birthday_note: str = None, content_hash: str = None) -> int:
         """Add new upload record and update device tracking"""
         if not device_id or not file_path or not file_type:
             raise ValueError("device_id, file_path, and file_type are required")
@@ -232,10 +407,10 @@ class PartyDatabase:
             # Insert upload record
             cursor.execute('''
             INSERT INTO uploads (device_id, guest_name, file_path, file_type, 
-                               original_filename, file_size, duration, birthday_note)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                               original_filename, file_size, duration, birthday_note, content_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (device_id, guest_name, file_path, file_type, 
-                  original_filename, file_size, duration, birthday_note))
+                  original_filename, file_size, duration, birthday_note, content_hash))
             
             upload_id = cursor.lastrowid
             
@@ -270,19 +445,33 @@ class PartyDatabase:
             return dict(row)
         return None
     
-    def get_slideshow_media(self, limit: int = 100) -> List[Dict[str, Any]]:
-        """Get media items for slideshow (photos and videos only)"""
+    def get_slideshow_media(self, limit: int = 100, after_id: int = None) -> List[Dict[str, Any]]:
+        """Get media items for slideshow (photos and videos only), preferring ready renditions"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('''
-        SELECT id, device_id, guest_name, file_path, file_type, 
-               original_filename, file_size, duration, timestamp, birthday_note
-        FROM uploads
-        WHERE file_type IN ('photo', 'video') AND processed = TRUE
-        ORDER BY timestamp DESC
+        # Keyset cursor: the items that follow after_id in slideshow order
+        after_clause = ''
+        params = []
+        if after_id is not None:
+            after_clause = '''AND (u.timestamp, u.id) < (SELECT timestamp, id FROM uploads WHERE id = ?)'''
+            params.append(after_id)
+        
+        cursor.execute(f'''
+        SELECT u.id, u.device_id, u.guest_name, u.file_path, u.file_type, 
+               u.original_filename, u.file_size, u.duration, u.timestamp, u.birthday_note, u.content_hash,
+               v.file_path AS rendition_path, v.content_hash AS rendition_hash,
+               v.width, v.height, v.file_size AS rendition_size,
+               p.file_path AS poster_path, p.content_hash AS poster_hash,
+               h.file_path AS hls_path, h.content_hash AS hls_hash
+        FROM uploads u
+        LEFT JOIN media_renditions v ON v.upload_id = u.id AND v.kind IN ('video', 'display') AND v.status = 'ready'
+        LEFT JOIN media_renditions p ON p.upload_id = u.id AND p.kind = 'poster' AND p.status = 'ready'
+        LEFT JOIN media_renditions h ON h.upload_id = u.id AND h.kind = 'hls' AND h.status = 'ready'
+        WHERE u.file_type IN ('photo', 'video') AND u.processed = TRUE {after_clause}
+        ORDER BY u.timestamp DESC, u.id DESC
         LIMIT ?
-        ''', (limit,))
+        ''', params + [limit])
         
         rows = cursor.fetchall()
         conn.close()
@@ -290,13 +479,98 @@ class PartyDatabase:
         media_items = []
         for row in rows:
             item = dict(row)
+            rendition_path, rendition_hash = item.pop('rendition_path'), item.pop('rendition_hash')
+            poster_path, poster_hash = item.pop('poster_path'), item.pop('poster_hash')
+            hls_path, hls_hash = item.pop('hls_path'), item.pop('hls_hash')
+            item['bytes'] = item.pop('rendition_size') or item['file_size']  # What the display downloads
             # Add URL for frontend access
             item['url'] = f"/media/{item['file_type']}s/{os.path.basename(item['file_path'])}"
+            if item['content_hash']:
+                item['url'] += f"?v={item['content_hash']}"  # Immutable, cached by the browser and proxy
+            item['original_url'] = item['url']
+            if rendition_path:
+                item['url'] = rendition_url(item['id'], rendition_path, rendition_hash, f"{item['file_type']}s")
+            if poster_path:
+                item['poster'] = rendition_url(item['id'], poster_path, poster_hash)
+            if hls_path:
+                item['hls_url'] = rendition_url(item['id'], hls_path, hls_hash)  # Playlist for long videos
             item['type'] = item['file_type']  # Standardize field name
+            item['upload_id'] = item['id']  # The display keys slides by upload
             media_items.append(item)
         
         return media_items
     
+    def get_report_uploads(self, after_id: int = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """One batch of processed uploads in party order for the memory book, with rendition paths and URLs"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        # Keyset cursor: the uploads that follow after_id in report order
+        after_clause = ''
+        params = []
+        if after_id is not None:
+            after_clause = '''AND (u.timestamp, u.id) > (SELECT timestamp, id FROM uploads WHERE id = ?)'''
+            params.append(after_id)
+        
+        cursor.execute(f'''
+        SELECT u.id, u.guest_name, u.file_path, u.file_type, u.original_filename, u.birthday_note,
+               u.content_hash, strftime('%m/%d %H:%M', u.timestamp) AS formatted_time,
+               COALESCE(t.file_path, p.file_path, CASE WHEN v.kind = 'display' THEN v.file_path END) AS thumb_path,
+               COALESCE(t.content_hash, p.content_hash, CASE WHEN v.kind = 'display' THEN v.content_hash END)
+                   AS thumb_hash,
+               v.file_path AS rendition_path, v.content_hash AS rendition_hash
+        FROM uploads u
+        LEFT JOIN media_renditions t ON t.upload_id = u.id AND t.kind = 'thumb' AND t.status = 'ready'
+        LEFT JOIN media_renditions p ON p.upload_id = u.id AND p.kind = 'poster' AND p.status = 'ready'
+        LEFT JOIN media_renditions v ON v.upload_id = u.id AND v.kind IN ('video', 'display') AND v.status = 'ready'
+        WHERE u.processed = TRUE {after_clause}
+        ORDER BY u.timestamp ASC, u.id ASC
+        LIMIT ?
+        ''', params + [limit])
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        uploads = []
+        for row in rows:
+            item = dict(row)
+            thumb_path, thumb_hash = item['thumb_path'], item.pop('thumb_hash')
+            folder = 'music' if item['file_type'] == 'music' else f"{item['file_type']}s"
+            item['url'] = f"/media/{folder}/{os.path.basename(item['file_path'])}"
+            if item['content_hash']:
+                item['url'] += f"?v={item['content_hash']}"
+            item['thumbnail_url'] = None
+            if thumb_path:
+                item['thumbnail_url'] = rendition_url(item['id'], thumb_path, thumb_hash, folder)
+            uploads.append(item)
+        
+        return uploads
+    
+    def count_report_uploads(self) -> int:
+        """Number of processed uploads listed in the memory book report"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT COUNT(*) FROM uploads WHERE processed = TRUE')
+        
+        count = cursor.fetchone()[0]
+        conn.close()
+        return count
+    
+    def count_slideshow_media(self) -> int:
+        """Number of photos and videos in the slideshow rotation"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+        SELECT COUNT(*) FROM uploads
+        WHERE file_type IN ('photo', 'video') AND processed = TRUE
+        ''')
+        
+        count = cursor.fetchone()[0]
+        conn.close()
+        return count
+    
     def add_to_music_queue(self, upload_id: int, song_title: str = None, 
                           artist: str = None, duration: int = None) -> int:
         """Add song to music queue"""
@@ -338,15 +612,40 @@ class PartyDatabase:
     
     def get_music_queue(self) -> Dict[str, Any]:
         """Get current music queue"""
+        songs = self.get_queue_songs()
+        
+        return {
+            'songs': songs,
+            'total_count': len(songs),
+            'unplayed_count': len([s for s in songs if not s['played']])
+        }
+    
+    def get_queue_songs(self, queue_ids: List[int] = None, unplayed_only: bool = False) -> List[Dict[str, Any]]:
+        """Queue songs in play order with URL and gain, optionally by ID or unplayed only"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('''
-        SELECT id, guest_name, song_path, song_title, artist, 
-               duration, played, queue_position, timestamp
-        FROM music_queue
-        ORDER BY queue_position ASC
-        ''')
+        conditions = []
+        params = []
+        if queue_ids is not None:
+            if not queue_ids:
+                conn.close()
+                return []
+            conditions.append(f"mq.id IN ({','.join('?' * len(queue_ids))})")
+            params.extend(queue_ids)
+        if unplayed_only:
+            conditions.append('mq.played = FALSE')
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        
+        cursor.execute(f'''
+        SELECT mq.id, mq.guest_name, mq.song_path, mq.song_title, mq.artist, 
+               mq.duration, mq.played, mq.queue_position, mq.timestamp, mq.dj_planned,
+               tl.gain_db
+        FROM music_queue mq
+        LEFT JOIN track_loudness tl ON tl.file_path = mq.song_path
+        {where}
+        ORDER BY mq.queue_position ASC
+        ''', params)
         
         rows = cursor.fetchall()
         conn.close()
@@ -355,14 +654,52 @@ class PartyDatabase:
         for row in rows:
             song = dict(row)
             # Add URL for frontend access
-            song['url'] = f"/media/music/{os.path.basename(song['song_path'])}"
+            if is_party_media(song['song_path']):
+                song['url'] = f"/media/music/{os.path.basename(song['song_path'])}"
+            else:
+                # Library songs are served from the prefetch cache (or read through on a miss)
+                song['url'] = f"/media/cache/music/{cached_media_name(song['song_path'])}"
+            # Linear volume factor for the player; 1.0 until the track is measured
+            song['gain'] = round(10 ** (song['gain_db'] / 20), 4) if song['gain_db'] is not None else 1.0
             songs.append(song)
         
-        return {
-            'songs': songs,
-            'total_count': len(songs),
-            'unplayed_count': len([s for s in songs if not s['played']])
-        }
+        return songs
+    
+    def get_upcoming_queue(self, limit: int = None) -> List[Dict[str, Any]]:
+        """Next unplayed songs in play order"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+        SELECT id, song_path, song_title, artist
+        FROM music_queue
+        WHERE played = FALSE
+        ORDER BY queue_position ASC
+        LIMIT ?
+        ''', (limit if limit else -1,))
+        
+        songs = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return songs
+    
+    def find_queue_song_by_cache_name(self, name: str) -> Optional[str]:
+        """Library path of an unplayed or the currently playing queue song with this cache name"""
+        conn = self.get_connection()
+        conn.create_function('cached_media_name', 1, cached_media_name, deterministic=True)
+        cursor = conn.cursor()
+        
+        # The playing song is already marked played, but players still seek and reload it
+        cursor.execute('''
+        SELECT song_path FROM music_queue
+        WHERE cached_media_name(song_path) = ?
+          AND (played = FALSE OR id = (SELECT id FROM music_queue WHERE played = TRUE
+                                       ORDER BY queue_position DESC LIMIT 1))
+        LIMIT 1
+        ''', (name,))
+        
+        row = cursor.fetchone()
+        conn.close()
+        return row['song_path'] if row else None
     
     def mark_music_played(self, queue_id: int) -> bool:
         """Mark song as played in queue"""
@@ -379,6 +716,138 @@ class PartyDatabase:
         
         return success
     
+    def apply_dj_plan(self, removed_ids: List[int], tracks: List[Dict[str, Any]],
+                      lookahead: int) -> Tuple[List[int], List[Dict[str, Any]]]:
+        """Remove unplayed DJ entries and queue DJ tracks up to lookahead unplayed songs, atomically"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            # Worker processes plan concurrently; the write lock plus counting the queue again
+            # here keeps any of them from filling it past lookahead
+            cursor.execute('BEGIN IMMEDIATE')
+            removed = []
+            if removed_ids:
+                placeholders = ','.join('?' * len(removed_ids))
+                cursor.execute(f'''
+                SELECT id FROM music_queue
+                WHERE played = FALSE AND dj_planned = TRUE AND id IN ({placeholders})
+                ''', list(removed_ids))
+                removed = [row['id'] for row in cursor.fetchall()]
+            if removed:
+                placeholders = ','.join('?' * len(removed))
+                cursor.execute(f'DELETE FROM music_queue WHERE id IN ({placeholders})', removed)
+        
+            cursor.execute('SELECT library_id FROM music_queue WHERE played = FALSE')
+            upcoming = [row['library_id'] for row in cursor.fetchall()]
+            queued_ids = set(upcoming)
+            cursor.execute('SELECT COALESCE(MAX(queue_position), 0) FROM music_queue')
+            position = cursor.fetchone()[0]
+        
+            added = []
+            for track in tracks:
+                if len(upcoming) + len(added) >= lookahead:
+                    break
+                if track['id'] in queued_ids:
+                    continue  # Queued by another worker meanwhile
+                position += 1
+                cursor.execute('''
+                INSERT INTO music_queue (guest_name, song_path, song_title, artist, duration,
+                                         queue_position, library_id, dj_planned)
+                VALUES ('AI DJ', ?, ?, ?, ?, ?, ?, TRUE)
+                ''', (track['file_path'], track['title'], track['artist'], track['duration'],
+                      position, track['id']))
+                queued_ids.add(track['id'])
+                added.append(dict(track, queue_id=cursor.lastrowid))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        return removed, added
+    
+    def get_queue_window(self, history: int = 50) -> List[Dict[str, Any]]:
+        """Get the last played songs plus everything unplayed, with library features"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+        SELECT * FROM (
+            SELECT mq.id, mq.song_path, mq.song_title, mq.artist, mq.played, mq.dj_planned,
+                   mq.queue_position, COALESCE(mq.library_id, ml.id) AS library_id,
+                   ml.bpm, ml.energy
+            FROM music_queue mq
+            LEFT JOIN music_library ml ON ml.file_path = mq.song_path
+            WHERE mq.played = TRUE
+            ORDER BY mq.queue_position DESC
+            LIMIT ?
+        )
+        UNION ALL
+        SELECT mq.id, mq.song_path, mq.song_title, mq.artist, mq.played, mq.dj_planned,
+               mq.queue_position, COALESCE(mq.library_id, ml.id) AS library_id,
+               ml.bpm, ml.energy
+        FROM music_queue mq
+        LEFT JOIN music_library ml ON ml.file_path = mq.song_path
+        WHERE mq.played = FALSE
+        ORDER BY queue_position ASC
+        ''', (history,))
+        
+        window = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return window
+    
+    def set_track_loudness(self, file_path: str, integrated_lufs: float = None,
+                           true_peak_db: float = None, gain_db: float = None):
+        """Store the loudness measurement of a track"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+        INSERT OR REPLACE INTO track_loudness (file_path, integrated_lufs, true_peak_db, gain_db, measured_at)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ''', (file_path, integrated_lufs, true_peak_db, gain_db))
+        
+        conn.commit()
+        conn.close()
+    
+    def get_unmeasured_queue_paths(self, limit: int = 20) -> List[str]:
+        """Unplayed queue songs without a loudness measurement, next to play first"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+        SELECT mq.song_path
+        FROM music_queue mq
+        LEFT JOIN track_loudness tl ON tl.file_path = mq.song_path
+        WHERE mq.played = FALSE AND tl.file_path IS NULL
+        GROUP BY mq.song_path
+        ORDER BY MIN(mq.queue_position)
+        LIMIT ?
+        ''', (limit,))
+        
+        paths = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        return paths
+    
+    def get_unmeasured_library_paths(self, limit: int = None) -> List[str]:
+        """Library tracks without a loudness measurement"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+        SELECT ml.file_path
+        FROM music_library ml
+        LEFT JOIN track_loudness tl ON tl.file_path = ml.file_path
+        WHERE tl.file_path IS NULL
+        ORDER BY ml.id
+        LIMIT ?
+        ''', (limit if limit else -1,))
+        
+        paths = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        return paths
+    
     def get_queue_item(self, queue_id: int) -> Optional[Dict[str, Any]]:
         """Get specific queue item by ID"""
         conn = self.get_connection()
@@ -392,6 +861,250 @@ class PartyDatabase:
             return dict(row)
         return None
     
+    def create_download_job(self, job_id: str, url: str, guest_name: str = None,
+                            device_id: str = None, title: str = None, artist: str = None,
+                            original_query: str = None) -> Dict[str, Any]:
+        """Record a queued YouTube download job"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+        INSERT INTO download_jobs (id, url, guest_name, device_id, title, artist, original_query)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (job_id, url, guest_name, device_id, title, artist, original_query))
+        
+        conn.commit()
+        conn.close()
+        return self.get_download_job(job_id)
+    
+    def update_download_job(self, job_id: str, **fields) -> bool:
+        """Update status, progress or result columns of a download job"""
+        allowed = {'status', 'progress', 'title', 'file_path', 'queue_id', 'error'}
+        fields = {key: value for key, value in fields.items() if key in allowed}
+        if not fields:
+            return False
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        assignments = ', '.join(f'{key} = ?' for key in fields)
+        cursor.execute(f'''
+        UPDATE download_jobs SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE id = ?
+        ''', list(fields.values()) + [job_id])
+        
+        success = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        return success
+    
+    def get_download_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a download job by ID"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT * FROM download_jobs WHERE id = ?', (job_id,))
+        row = cursor.fetchone()
+        conn.close()
+        
+        if row:
+            return dict(row)
+        return None
+    
+    def get_active_download_jobs(self, url: str = None) -> List[Dict[str, Any]]:
+        """Jobs not yet completed or failed, optionally for one URL"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        query = '''
+        SELECT * FROM download_jobs
+        WHERE status IN ('queued', 'downloading', 'processing')
+        '''
+        params = []
+        if url:
+            query += ' AND url = ?'
+            params.append(url)
+        query += ' ORDER BY created_at ASC'
+        
+        cursor.execute(query, params)
+        jobs = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return jobs
+    
+    def get_cached_download(self, video_id: str) -> Optional[Dict[str, Any]]:
+        """Get the downloaded file for a YouTube video id"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT * FROM download_cache WHERE video_id = ?', (video_id,))
+        row = cursor.fetchone()
+        conn.close()
+        
+        if row:
+            return dict(row)
+        return None
+    
+    def cache_download(self, video_id: str, file_path: str, title: str = None, duration: int = None):
+        """Remember the file a YouTube video was downloaded to"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+        INSERT OR REPLACE INTO download_cache (video_id, file_path, title, duration)
+        VALUES (?, ?, ?, ?)
+        ''', (video_id, file_path, title, duration))
+        
+        conn.commit()
+        conn.close()
+    
+    def remove_cached_download(self, video_id: str):
+        """Forget a cached download whose file is gone"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('DELETE FROM download_cache WHERE video_id = ?', (video_id,))
+        
+        conn.commit()
+        conn.close()
+    
+    def append_queue_event(self, epoch: str, payload: str) -> int:
+        """Store a queue delta and return its cluster-wide sequence number"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('INSERT INTO queue_events (epoch, payload) VALUES (?, ?)', (epoch, payload))
+        seq = cursor.lastrowid
+        
+        conn.commit()
+        conn.close()
+        return seq
+    
+    def get_queue_events_since(self, epoch: str, seq: int, limit: int) -> List[Dict[str, Any]]:
+        """Queue deltas of an epoch after a sequence number, oldest first"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+        SELECT seq, payload FROM queue_events
+        WHERE epoch = ? AND seq > ?
+        ORDER BY seq ASC
+        LIMIT ?
+        ''', (epoch, seq, limit))
+        
+        events = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return events
+    
+    def prune_queue_events(self, before_seq: int):
+        """Drop queue deltas too old to replay"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('DELETE FROM queue_events WHERE seq < ?', (before_seq,))
+        
+        conn.commit()
+        conn.close()
+    
+    def get_queue_event_bounds(self, epoch: str) -> Tuple[int, int]:
+        """(first seq stored for an epoch or 0, last seq handed out overall)"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+        SELECT (SELECT MIN(seq) FROM queue_events WHERE epoch = ?),
+               (SELECT seq FROM sqlite_sequence WHERE name = 'queue_events')
+        ''', (epoch,))
+        first, last = cursor.fetchone()
+        conn.close()
+        return first or 0, last or 0
+    
+    def get_media_validator(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """Stored content hash of a media file with the mtime and size it was computed for"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+        SELECT mtime_ns, file_size, content_hash FROM media_validators WHERE file_path = ?
+        ''', (file_path,))
+        row = cursor.fetchone()
+        conn.close()
+        
+        return dict(row) if row else None
+    
+    def save_media_validator(self, file_path: str, mtime_ns: int, file_size: int, content_hash: str):
+        """Store the content hash of a media file"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+        INSERT OR REPLACE INTO media_validators (file_path, mtime_ns, file_size, content_hash, computed_at)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ''', (file_path, mtime_ns, file_size, content_hash))
+        
+        conn.commit()
+        conn.close()
+    
+    def create_media_rendition(self, upload_id: int, kind: str) -> Dict[str, Any]:
+        """Queue a rendition of an upload, resetting a failed or stale one"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+        INSERT INTO media_renditions (upload_id, kind) VALUES (?, ?)
+        ON CONFLICT(upload_id, kind) DO UPDATE SET
+            status = 'queued', progress = 0, error = NULL, updated_at = CURRENT_TIMESTAMP
+        ''', (upload_id, kind))
+        
+        conn.commit()
+        conn.close()
+        return self.get_media_renditions(upload_id)[kind]
+    
+    def update_media_rendition(self, upload_id: int, kind: str, **fields) -> bool:
+        """Update status, progress or result columns of a rendition"""
+        allowed = {'status', 'progress', 'file_path', 'width', 'height', 'file_size', 'content_hash', 'error'}
+        fields = {key: value for key, value in fields.items() if key in allowed}
+        if not fields:
+            return False
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        assignments = ', '.join(f'{key} = ?' for key in fields)
+        cursor.execute(f'''
+        UPDATE media_renditions SET {assignments}, updated_at = CURRENT_TIMESTAMP
+        WHERE upload_id = ? AND kind = ?
+        ''', list(fields.values()) + [upload_id, kind])
+        
+        success = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        return success
+    
+    def get_media_renditions(self, upload_id: int) -> Dict[str, Dict[str, Any]]:
+        """Renditions of an upload keyed by kind"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT * FROM media_renditions WHERE upload_id = ?', (upload_id,))
+        renditions = {row['kind']: dict(row) for row in cursor.fetchall()}
+        conn.close()
+        return renditions
+    
+    def get_unfinished_renditions(self, kinds: Tuple[str, ...]) -> List[Dict[str, Any]]:
+        """Renditions of the given kinds left queued or processing, with the upload's source path"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute(f'''
+        SELECT r.*, u.file_path AS source_path
+        FROM media_renditions r
+        JOIN uploads u ON u.id = r.upload_id
+        WHERE r.status IN ('queued', 'processing') AND r.kind IN ({','.join('?' * len(kinds))})
+        ORDER BY r.created_at ASC
+        ''', kinds)
+        renditions = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return renditions
+    
     def get_device_info(self, device_id: str) -> Optional[Dict[str, Any]]:
         """Get device information for attribution"""
         conn = self.get_connection()
@@ -486,6 +1199,41 @@ class PartyDatabase:
         finally:
             conn.close()
     
+    def get_tracks_missing_features(self, limit: int = None) -> List[Dict[str, Any]]:
+        """Get library tracks the feature stage has not analyzed yet"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+        SELECT id, file_path, duration
+        FROM music_library
+        WHERE features_at IS NULL
+        ORDER BY id
+        LIMIT ?
+        ''', (limit if limit else -1,))
+        
+        tracks = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return tracks
+    
+    def update_music_features(self, library_id: int, bpm: float = None, loudness_db: float = None,
+                              energy: float = None, danceability: float = None) -> bool:
+        """Store audio features for a library track"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+        UPDATE music_library
+        SET bpm = ?, loudness_db = ?, energy = ?, danceability = ?, features_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+        ''', (bpm, loudness_db, energy, danceability, library_id))
+        
+        success = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        
+        return success
+    
     def search_music_library(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Search music library using FTS5 and semantic similarity"""
         conn = self.get_connection()
@@ -512,6 +1260,137 @@ class PartyDatabase:
         conn.close()
         return results
     
+    def get_library_features(self, library_ids: List[int]) -> List[Dict[str, Any]]:
+        """Get artist and audio features for library tracks"""
+        if not library_ids:
+            return []
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        placeholders = ','.join('?' * len(library_ids))
+        cursor.execute(f'''
+        SELECT id, file_path, artist, title, duration, bpm, energy, danceability
+        FROM music_library
+        WHERE id IN ({placeholders})
+        ''', list(library_ids))
+        
+        features = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return features
+    
+    def get_library_tracks_by_ids(self, library_ids: List[int]) -> List[Dict[str, Any]]:
+        """Get library tracks by ID, preserving the requested order"""
+        if not library_ids:
+            return []
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        placeholders = ','.join('?' * len(library_ids))
+        cursor.execute(f'''
+        SELECT id, file_path, artist, album, title, year, genre, duration
+        FROM music_library
+        WHERE id IN ({placeholders})
+        ''', list(library_ids))
+        
+        rows = {row['id']: dict(row) for row in cursor.fetchall()}
+        conn.close()
+        
+        results = []
+        for library_id in library_ids:
+            song = rows.get(library_id)
+            if song:
+                song['source'] = 'local'
+                song['url'] = f"/media/music/{os.path.basename(song['file_path'])}"
+                results.append(song)
+        
+        return results
+    
+    def is_library_track(self, file_path: str) -> bool:
+        """True when file_path is an indexed music_library track"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT 1 FROM music_library WHERE file_path = ?', (file_path,))
+        found = cursor.fetchone() is not None
+        conn.close()
+        return found
+    
+    def get_library_signature(self) -> Tuple[int, Optional[int]]:
+        """COUNT/MAX(id) of music_library, which change whenever tracks are added or removed"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*), MAX(id) FROM music_library')
+        signature = tuple(cursor.fetchone())
+        conn.close()
+        return signature
+    
+    def get_library_index(self) -> List[Tuple]:
+        """(id, artist, album, title, genre, year) of every library track, for in-memory indexes"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT id, artist, album, title, genre, year FROM music_library ORDER BY id')
+        rows = [tuple(row) for row in cursor.fetchall()]
+        conn.close()
+        return rows
+    
+    def get_library_songs(self) -> List[Dict[str, Any]]:
+        """Every library track with its tags, in ID order"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+        SELECT id, file_path, artist, album, title, year, genre, duration, file_size
+        FROM music_library
+        ORDER BY id
+        ''')
+        
+        songs = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return songs
+    
+    def get_queue_history(self) -> List[Dict[str, Any]]:
+        """Get every guest-queued song in play order, with library genre when known"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+        SELECT mq.id, mq.guest_name, mq.song_path, mq.song_title, mq.artist,
+               mq.played, ml.id AS library_id, ml.genre
+        FROM music_queue mq
+        LEFT JOIN music_library ml ON ml.file_path = mq.song_path
+        WHERE mq.dj_planned = FALSE
+        ORDER BY mq.queue_position ASC
+        ''')
+        
+        history = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return history
+    
+    def get_selected_searches(self) -> List[Dict[str, Any]]:
+        """Get searches that ended with a selection, oldest first"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+        SELECT query, selected_result, source, guest_name, timestamp
+        FROM music_searches
+        WHERE selected_result IS NOT NULL
+        ORDER BY id ASC
+        ''')
+        
+        searches = []
+        for row in cursor.fetchall():
+            search = dict(row)
+            try:
+                search['selected_result'] = json.loads(search['selected_result'])
+            except (TypeError, ValueError):
+                continue
+            searches.append(search)
+        
+        conn.close()
+        return searches
+    
     def log_music_search(self, query: str, selected_result: Dict[str, Any] = None, 
                         source: str = None, guest_name: str = None, 
                         party_energy: float = None) -> int:
@@ -576,6 +1455,37 @@ class PartyDatabase:
         conn.close()
         return patterns
     
+    def get_pattern_signature(self) -> Tuple[int, Optional[int]]:
+        """COUNT/SUM(frequency) of music_patterns, which change with every recorded selection"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*), SUM(frequency) FROM music_patterns')
+        signature = tuple(cursor.fetchone())
+        conn.close()
+        return signature
+    
+    def get_pattern_frequencies(self) -> List[Tuple[str, str, int]]:
+        """(pattern_type, pattern_value, frequency) of every music pattern"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT pattern_type, pattern_value, frequency FROM music_patterns')
+        rows = [tuple(row) for row in cursor.fetchall()]
+        conn.close()
+        return rows
+    
+    def get_upload_rate(self, minutes: int = 15) -> float:
+        """Uploads per minute over the last few minutes"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+        SELECT COUNT(*) FROM uploads WHERE timestamp >= datetime('now', ?)
+        ''', (f'-{int(minutes)} minutes',))
+        
+        count = cursor.fetchone()[0]
+        conn.close()
+        return count / max(minutes, 1)
+    
     def get_search_count(self) -> int:
         """Get total number of music searches for AI trigger"""
         conn = self.get_connection()
@@ -587,6 +1497,13 @@ class PartyDatabase:
         
         return count
     
+    def ping(self) -> bool:
+        """Cheap round trip proving the database answers, for health probes"""
+        conn = self.get_connection()
+        conn.execute('SELECT 1').fetchone()
+        conn.close()
+        return True
+    
     def get_statistics(self) -> Dict[str, Any]:
         """Get party statistics"""
         conn = self.get_connection()
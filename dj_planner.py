@@ -0,0 +1,179 @@
+"""
+AI DJ Queue Planner
+Keeps the music queue filled ahead of the playhead with tracks matched to the party's energy
+"""
+
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from database import PartyDatabase
+from music_sampler import LibrarySampler
+from music_suggest import normalize_text
+
+ENERGY_FLOOR = 0.3  # target energy of an empty room
+UPLOAD_RATE_SCALE = 1.5  # uploads/minute that push the target most of the way to 1.0
+MAX_ENERGY_STEP = 0.15  # largest energy change between consecutive tracks
+UNKNOWN_ENERGY = 0.5  # assumed for tracks the feature stage has not analyzed
+
+
+def tempo_fit(candidate_bpm: np.ndarray, previous_bpm: Optional[float]) -> np.ndarray:
+    """How well each candidate tempo follows the previous track (half/double time allowed)"""
+    if not previous_bpm:
+        return np.full(len(candidate_bpm), 0.5)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        octave = np.log2(candidate_bpm / previous_bpm)
+    distance = np.minimum(np.abs(octave), np.minimum(np.abs(octave - 1), np.abs(octave + 1)) + 0.1)
+    fit = np.exp(-0.5 * (distance / 0.1) ** 2)
+    return np.where(np.isnan(fit), 0.5, fit)
+
+
+class DJPlanner:
+    """Plans DJ tracks after the guests' picks, keeping planned songs until a guest pick arrives"""
+
+    def __init__(self, db: PartyDatabase, sampler: LibrarySampler, recommender=None,
+                 lookahead: int = 5, locked: int = 3, candidates: int = 200,
+                 artist_spacing: int = 4, history: int = 100):
+        self.db = db
+        self.sampler = sampler
+        self.recommender = recommender
+        self.lookahead = lookahead  # unplayed songs to keep queued
+        self.locked = locked  # upcoming DJ songs never replaced; at least the prefetch lookahead
+        self.candidates = candidates
+        self.artist_spacing = artist_spacing  # songs between two plays of one artist
+        self.history = history  # played songs that count as "recently played"
+        self._lock = threading.Lock()
+        self.last_plan: Dict[str, Any] = {}
+
+    def is_enabled(self) -> bool:
+        """AI DJ mode is switched on in settings"""
+        return self.db.get_setting('ai_dj_enabled', 'false') == 'true'
+
+    def set_enabled(self, enabled: bool):
+        """Switch AI DJ mode on or off"""
+        self.db.set_setting('ai_dj_enabled', 'true' if enabled else 'false')
+
+    def measure_party_energy(self, minutes: int = 15) -> float:
+        """Party energy from the recent upload rate, 0..1"""
+        rate = self.db.get_upload_rate(minutes)
+        return round(ENERGY_FLOOR + (1 - ENERGY_FLOOR) * (1 - np.exp(-rate / UPLOAD_RATE_SCALE)), 3)
+
+    def target_energy(self, window: List[Dict[str, Any]]) -> float:
+        """Blend measured party energy with the energy of the guests' latest picks"""
+        party_energy = self.measure_party_energy()
+        picks = [item['energy'] for item in window
+                 if not item['dj_planned'] and item['energy'] is not None][-3:]
+        if not picks:
+            return party_energy
+        return round(0.6 * party_energy + 0.4 * float(np.mean(picks)), 3)
+
+    def _load_candidates(self, exclude_ids: set) -> Dict[str, np.ndarray]:
+        """Candidate tracks from the recommender plus a random library sample, as arrays"""
+        affinity: Dict[int, float] = {}
+        if self.recommender is not None:
+            for song in self.recommender.recommend(limit=50):
+                affinity[song['id']] = song.get('score', 0.0)
+
+        ids = [library_id for library_id in affinity if library_id not in exclude_ids]
+        ids += self.sampler.sample_ids(self.candidates, exclude_ids=exclude_ids | set(ids))
+        rows = self.db.get_library_features(ids)
+
+        top_affinity = max(affinity.values(), default=0.0) or 1.0
+        return {
+            'rows': rows,
+            'artists': np.array([normalize_text(row['artist']).strip() for row in rows], dtype=object),
+            'bpm': np.array([row['bpm'] or np.nan for row in rows], dtype=float),
+            'energy': np.array([UNKNOWN_ENERGY if row['energy'] is None else row['energy'] for row in rows]),
+            'danceability': np.array([row['danceability'] or 0.0 for row in rows]),
+            'analyzed': np.array([row['energy'] is not None for row in rows]),
+            'affinity': np.array([affinity.get(row['id'], 0.0) / top_affinity for row in rows]),
+        }
+
+    def score(self, candidates: Dict[str, np.ndarray], target: float,
+              previous_bpm: Optional[float]) -> np.ndarray:
+        """Score every candidate for one slot in a single vectorized pass"""
+        energy_fit = 1 - np.abs(candidates['energy'] - target)
+        return (0.45 * energy_fit
+                + 0.2 * tempo_fit(candidates['bpm'], previous_bpm)
+                + 0.15 * candidates['danceability'] * target
+                + 0.2 * candidates['affinity']
+                - 0.1 * ~candidates['analyzed'])
+
+    def plan(self, replan_tail: bool = False) -> Dict[str, Any]:
+        """Fill the queue up to lookahead unplayed songs; returns planning stats"""
+        started = time.perf_counter()
+        with self._lock:
+            window = self.db.get_queue_window(self.history)
+            upcoming = [item for item in window if not item['played']]
+
+            # Planned songs stay so the prefetch and loudness stages keep their work. After a guest
+            # pick, the unlocked DJ songs ahead of it are dropped and planned again after it
+            removed = []
+            guest_positions = [index for index, item in enumerate(upcoming) if not item['dj_planned']]
+            if replan_tail and guest_positions:
+                dj_ahead = [item for item in upcoming[:guest_positions[-1]] if item['dj_planned']]
+                removed = [item['id'] for item in dj_ahead[self.locked:]]
+                upcoming = [item for item in upcoming if item['id'] not in removed]
+            kept = [item for item in window if item['played']] + upcoming
+
+            slots = self.lookahead - len(upcoming)
+            target = self.target_energy(kept)
+            picks = self._fill(kept, slots, target) if slots > 0 else []
+            added = []
+            if removed or picks:
+                # The lock above only covers this process; the database re-checks across workers
+                removed, added = self.db.apply_dj_plan(removed, picks, self.lookahead)
+
+            self.last_plan = {
+                'target_energy': target,
+                'kept': len(upcoming),
+                'removed': len(removed),
+                'added': len(added),
+                'took_ms': round((time.perf_counter() - started) * 1000, 2)
+            }
+            return dict(self.last_plan, tracks=added, removed_ids=removed,
+                        added_ids=[track['queue_id'] for track in added])
+
+    def _fill(self, kept: List[Dict[str, Any]], slots: int, target: float) -> List[Dict[str, Any]]:
+        """Greedily pick library rows for the open slots, ramping energy toward the target"""
+        used_ids = {item['library_id'] for item in kept if item['library_id']}
+        candidates = self._load_candidates(used_ids)
+        rows = candidates['rows']
+        if not rows:
+            return []
+
+        recent_artists = [normalize_text(item['artist']).strip() for item in kept][-self.artist_spacing:]
+        recent_artists = [artist for artist in recent_artists if artist]
+        last = kept[-1] if kept else {}
+        previous_bpm = last.get('bpm')
+        previous_energy = last.get('energy') if last.get('energy') is not None else target
+        available = np.ones(len(rows), dtype=bool)
+
+        picks = []
+        for _ in range(slots):
+            slot_target = previous_energy + np.clip(target - previous_energy, -MAX_ENERGY_STEP, MAX_ENERGY_STEP)
+            allowed = available & ~np.isin(candidates['artists'], recent_artists)
+            if not allowed.any():
+                allowed = available  # Small library: relax artist spacing rather than stall
+            if not allowed.any():
+                break
+
+            scores = np.where(allowed, self.score(candidates, slot_target, previous_bpm), -np.inf)
+            best = int(np.argmax(scores))
+            row = rows[best]
+            available[best] = False
+            picks.append(row)
+
+            recent_artists = (recent_artists + [candidates['artists'][best]])[-self.artist_spacing:]
+            previous_bpm = row['bpm'] or previous_bpm
+            previous_energy = float(candidates['energy'][best])
+
+        return picks
+
+    def replan(self, guest_pick: bool = False) -> Optional[Dict[str, Any]]:
+        """Top up after the playhead moved, re-plan after a guest queued a song (no-op when disabled)"""
+        if not self.is_enabled():
+            return None
+        return self.plan(replan_tail=guest_pick)
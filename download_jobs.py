@@ -0,0 +1,267 @@
+"""
+YouTube Download Jobs
+Bounded background worker pool for yt-dlp downloads with persisted job state and progress callbacks
+"""
+
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+from database import PartyDatabase
+from offload import run_blocking, run_blocking_with_progress
+from metrics import external_call
+
+_VIDEO_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+
+
+def parse_video_id(url: str) -> Optional[str]:
+    """YouTube video id from watch, youtu.be, shorts, embed and music URLs (no network)"""
+    try:
+        parsed = urlparse(url.strip())
+    except (AttributeError, ValueError):
+        return None
+    host = (parsed.hostname or '').lower()
+    candidate = None
+
+    if host == 'youtu.be' or host.endswith('.youtu.be'):
+        candidate = parsed.path.lstrip('/').split('/')[0]
+    elif host == 'youtube.com' or host.endswith('.youtube.com') or host == 'youtube-nocookie.com' \
+            or host.endswith('.youtube-nocookie.com'):
+        if parsed.path == '/watch':
+            candidate = parse_qs(parsed.query).get('v', [None])[0]
+        else:
+            parts = parsed.path.strip('/').split('/')
+            if len(parts) >= 2 and parts[0] in ('shorts', 'embed', 'live', 'v'):
+                candidate = parts[1]
+
+    if candidate and _VIDEO_ID_RE.match(candidate):
+        return candidate
+    return None
+
+
+def canonical_url(video_id: str) -> str:
+    """One URL per video, so different links to the same song share a job"""
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+class DownloadQueueFull(Exception):
+    """Raised when too many downloads are already pending"""
+
+
+def download_audio(url: str, download_dir: str,
+                   progress: Callable[[str, float], None]) -> Tuple[str, Dict[str, Any]]:
+    """Download and transcode one URL to mp3 with yt-dlp; returns (file_path, info)"""
+    # Import yt-dlp here to avoid startup delays
+    import yt_dlp
+
+    def progress_hook(status):
+        if status.get('status') == 'downloading':
+            total = status.get('total_bytes') or status.get('total_bytes_estimate')
+            if total:
+                progress('downloading', 100.0 * status.get('downloaded_bytes', 0) / total)
+        elif status.get('status') == 'finished':
+            progress('processing', 100.0)
+
+    ydl_opts = {
+        'format': 'bestaudio/best',
+        'postprocessors': [{
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': 'mp3',
+            'preferredquality': '192',
+        }],
+        # Output is keyed by video id, so the final path is known up front
+        'outtmpl': f'{download_dir}/%(id)s.%(ext)s',
+        'quiet': True,
+        'no_warnings': True,
+        'noplaylist': True,
+        'progress_hooks': [progress_hook],
+    }
+
+    with external_call('yt-dlp'), yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=True)
+    return os.path.join(download_dir, f"{info['id']}.mp3"), info
+
+
+class DownloadJobManager:
+    """Runs downloads on a small thread pool, deduplicated by video and served from the download cache"""
+
+    def __init__(self, db: PartyDatabase, download_dir: str = 'media/music',
+                 max_workers: int = 2, max_pending: int = 20,
+                 on_update: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 on_complete: Optional[Callable[[Dict[str, Any], str, Dict[str, Any]], Optional[int]]] = None,
+                 downloader: Callable = download_audio, progress_interval: float = 0.5):
+        self.db = db
+        self.download_dir = download_dir
+        self.max_pending = max_pending
+        self.on_update = on_update  # called with the job row on every state/progress change
+        self.on_complete = on_complete  # queues the file; returns the music_queue id
+        self.downloader = downloader
+        self.progress_interval = progress_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='download')
+        self._lock = threading.Lock()
+        self._active: Dict[str, str] = {}  # url -> job id
+        self._prefetching = set()  # urls re-downloaded for the prefetcher
+
+    def submit(self, url: str, guest_name: str = None, device_id: str = None, title: str = None,
+               artist: str = None, original_query: str = None) -> Tuple[Dict[str, Any], bool]:
+        """Queue a download; returns (job, created), created is False for a duplicate URL"""
+        video_id = parse_video_id(url)
+        if video_id:
+            url = canonical_url(video_id)
+
+        with self._lock:
+            job_id = self._active.get(url)
+            if job_id is None:
+                existing = self.db.get_active_download_jobs(url)
+                job_id = existing[0]['id'] if existing else None
+            if job_id is not None:
+                return self.db.get_download_job(job_id), False
+
+            cached = self._cached_file(video_id)
+            if cached is None and len(self._active) >= self.max_pending:
+                raise DownloadQueueFull(f"{len(self._active)} downloads already pending")
+
+            job_id = uuid.uuid4().hex
+            job = self.db.create_download_job(job_id, url, guest_name=guest_name, device_id=device_id,
+                                              title=title, artist=artist, original_query=original_query)
+            if cached is None:
+                self._active[url] = job_id
+
+        if cached is not None:
+            # Already downloaded: queue the file now, no network or ffmpeg work
+            try:
+                self._finish(job_id, cached['file_path'],
+                             {'id': video_id, 'title': cached['title'], 'duration': cached['duration']})
+            except Exception as e:
+                self._update(job_id, status='failed', error=str(e))
+                raise
+            return self.db.get_download_job(job_id), True
+
+        self._executor.submit(self._run, job_id)
+        self._notify(job)
+        return job, True
+
+    def _cached_file(self, video_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Cache entry for a video whose file still exists"""
+        if not video_id:
+            return None
+        cached = self.db.get_cached_download(video_id)
+        if cached and not os.path.exists(cached['file_path']):
+            self.db.remove_cached_download(video_id)
+            return None
+        return cached
+
+    def prefetch(self, video_id: str) -> bool:
+        """Re-download a video in the background without queueing it again"""
+        url = canonical_url(video_id)
+        with self._lock:
+            if url in self._active or url in self._prefetching:
+                return False
+            self._prefetching.add(url)
+        self._executor.submit(self._run_prefetch, url)
+        return True
+
+    def _run_prefetch(self, url: str):
+        """Worker: download for the cache only"""
+        try:
+            file_path, info = run_blocking(self.downloader, url, self.download_dir, lambda status, percent: None)
+            info = info or {}
+            video_id = info.get('id') or parse_video_id(url)
+            if video_id and os.path.exists(file_path):
+                self.db.cache_download(video_id, file_path, title=info.get('title'),
+                                       duration=info.get('duration'))
+        except Exception as e:
+            print(f"❌ Prefetch download of {url} failed: {e}")
+        finally:
+            with self._lock:
+                self._prefetching.discard(url)
+
+    def recover(self) -> int:
+        """Re-queue jobs left active by a previous server run"""
+        recovered = 0
+        for job in self.db.get_active_download_jobs():
+            with self._lock:
+                if job['url'] in self._active:
+                    continue
+                self._active[job['url']] = job['id']
+            self.db.update_download_job(job['id'], status='queued', progress=0)
+            self._executor.submit(self._run, job['id'])
+            recovered += 1
+        return recovered
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Current state of a job"""
+        return self.db.get_download_job(job_id)
+
+    def stats(self) -> Dict[str, int]:
+        """Pending job count for status endpoints"""
+        with self._lock:
+            return {'pending': len(self._active), 'max_pending': self.max_pending}
+
+    def _notify(self, job: Optional[Dict[str, Any]]):
+        """Forward a job change to the update callback"""
+        if job and self.on_update:
+            try:
+                self.on_update(job)
+            except Exception as e:
+                print(f"⚠️  Download update callback failed: {e}")
+
+    def _update(self, job_id: str, **fields):
+        """Persist a job change and notify listeners"""
+        self.db.update_download_job(job_id, **fields)
+        self._notify(self.db.get_download_job(job_id))
+
+    def _run(self, job_id: str):
+        """Worker: download, hand the file to on_complete, record the outcome"""
+        job = self.db.get_download_job(job_id)
+        last_report = {'status': None, 'progress': -1.0, 'at': 0.0}
+
+        def progress(status: str, percent: float):
+            # Throttle progress writes/events; state changes always go through
+            now = time.monotonic()
+            percent = round(min(percent, 100.0), 1)
+            if status == last_report['status'] and (now - last_report['at'] < self.progress_interval
+                                                     or percent - last_report['progress'] < 1):
+                return
+            last_report.update(status=status, progress=percent, at=now)
+            self._update(job_id, status=status, progress=percent)
+
+        try:
+            os.makedirs(self.download_dir, exist_ok=True)
+            self._update(job_id, status='downloading', progress=0)
+            file_path, info = run_blocking_with_progress(self.downloader, progress, job['url'], self.download_dir)
+            if not file_path or not os.path.exists(file_path):
+                raise FileNotFoundError('Download completed but file not found')
+
+            info = info or {}
+            video_id = info.get('id') or parse_video_id(job['url'])
+            if video_id:
+                self.db.cache_download(video_id, file_path, title=info.get('title'),
+                                       duration=info.get('duration'))
+            self._finish(job_id, file_path, info)
+        except Exception as e:
+            print(f"❌ Download job {job_id} failed: {e}")
+            self._update(job_id, status='failed', error=str(e))
+        finally:
+            with self._lock:
+                if self._active.get(job['url']) == job_id:
+                    del self._active[job['url']]
+
+    def _finish(self, job_id: str, file_path: str, info: Dict[str, Any]):
+        """Hand the file to on_complete and mark the job completed"""
+        job = self.db.get_download_job(job_id)
+        queue_id = None
+        if self.on_complete:
+            queue_id = self.on_complete(job, file_path, info)
+        self._update(job_id, status='completed', progress=100,
+                     title=info.get('title') or job['title'],
+                     file_path=file_path, queue_id=queue_id)
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting work and optionally wait for running downloads"""
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,126 @@
+"""
+Loudness Normalization
+Measures integrated loudness once per track with ffmpeg's EBU R128 filter and stores a playback gain
+"""
+
+import re
+import subprocess
+import threading
+from typing import Callable, Dict, Optional
+
+from database import PartyDatabase
+from audio_features import ffmpeg_available
+
+REFERENCE_LUFS = -18.0  # ReplayGain 2.0 reference level
+MAX_GAIN_DB = 6.0
+MIN_GAIN_DB = -15.0
+PEAK_CEILING_DB = -1.0  # keep true peaks below this after gain
+
+_INTEGRATED_RE = re.compile(r'I:\s+(-?[\d.]+|-inf)\s+LUFS')
+_PEAK_RE = re.compile(r'Peak:\s+(-?[\d.]+|-inf)\s+dBFS')
+
+
+def _parse_value(matches) -> Optional[float]:
+    """Last summary value of an ebur128 field; -inf means silence"""
+    if not matches:
+        return None
+    value = matches[-1]
+    return None if value == '-inf' else float(value)
+
+
+def parse_ebur128(output: str) -> Dict[str, Optional[float]]:
+    """Extract integrated loudness and true peak from ebur128 summary output"""
+    return {
+        'integrated_lufs': _parse_value(_INTEGRATED_RE.findall(output)),
+        'true_peak_db': _parse_value(_PEAK_RE.findall(output))
+    }
+
+
+def compute_gain(integrated_lufs: Optional[float], true_peak_db: Optional[float] = None) -> Optional[float]:
+    """Gain in dB to reach the reference level without pushing peaks past the ceiling"""
+    if integrated_lufs is None:
+        return None
+    gain = REFERENCE_LUFS - integrated_lufs
+    if true_peak_db is not None:
+        gain = min(gain, PEAK_CEILING_DB - true_peak_db)
+    return round(max(MIN_GAIN_DB, min(MAX_GAIN_DB, gain)), 2)
+
+
+def measure_loudness(file_path: str, ffmpeg: str = 'ffmpeg') -> Optional[Dict[str, Optional[float]]]:
+    """Decode the whole track once through ebur128; returns None if ffmpeg fails"""
+    command = [
+        ffmpeg, '-nostdin', '-hide_banner', '-nostats',
+        '-i', file_path, '-vn',
+        '-af', 'ebur128=peak=true:framelog=quiet',
+        '-f', 'null', '-'
+    ]
+    try:
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                timeout=300, check=True)
+    except (subprocess.SubprocessError, OSError) as e:
+        print(f"⚠️  Loudness measurement failed for {file_path}: {e}")
+        return None
+
+    measurement = parse_ebur128(result.stderr.decode('utf-8', errors='replace'))
+    measurement['gain_db'] = compute_gain(measurement['integrated_lufs'], measurement['true_peak_db'])
+    return measurement
+
+
+class LoudnessAnalyzer:
+    """Background thread that measures queued tracks that have no loudness yet"""
+
+    def __init__(self, db: PartyDatabase, poll_interval: float = 30.0,
+                 measure: Callable[[str], Optional[Dict[str, Optional[float]]]] = measure_loudness):
+        self.db = db
+        self.poll_interval = poll_interval
+        self.measure = measure
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.measured = 0
+        self.failed = 0
+
+    def measure_pending(self, limit: int = 20) -> int:
+        """Measure unplayed queue tracks without a stored loudness; returns how many were processed"""
+        file_paths = self.db.get_unmeasured_queue_paths(limit)
+        for file_path in file_paths:
+            measurement = self.measure(file_path)
+            if measurement is None:
+                # Store an empty row so a broken file is not retried on every pass
+                self.db.set_track_loudness(file_path)
+                self.failed += 1
+                continue
+            self.db.set_track_loudness(file_path, **measurement)
+            self.measured += 1
+        return len(file_paths)
+
+    def _run(self):
+        """Worker loop: measure on wake-up or every poll_interval"""
+        while not self._stop.is_set():
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            try:
+                while self.measure_pending():
+                    pass
+            except Exception as e:
+                print(f"❌ Loudness analyzer error: {e}")
+
+    def wake(self):
+        """Measure new queue entries soon; starts the worker on first use"""
+        with self._lock:  # Concurrent queue changes must not start a second worker
+            if self._thread is None:
+                if self.measure is measure_loudness and not ffmpeg_available():
+                    return
+                self._thread = threading.Thread(target=self._run, name='loudness-analyzer', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self, wait: bool = False):
+        """Stop the worker thread, optionally waiting for its current pass to finish"""
+        self._stop.set()
+        self._wake.set()
+        with self._lock:
+            thread = self._thread
+        if wait and thread is not None:
+            thread.join()
@@ -0,0 +1,450 @@
+"""
+Media Processing
+Background stages that turn uploads into display renditions: ffmpeg transcodes videos to faststart
+H.264/AAC MP4 with a poster frame and, for long videos, HLS segments; photos (HEIC included) are
+rotated upright, stripped of bulky metadata and re-encoded as WebP, each with a small thumbnail.
+Concurrency is capped by CPU count
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+from database import PartyDatabase, rendition_url
+from audio_features import ffmpeg_available
+from offload import run_blocking, run_blocking_with_progress
+
+try:
+    # Optional HEIC/HEIF plugin for Pillow; without it heif-convert or ImageMagick is used
+    from pillow_heif import register_heif_opener
+    register_heif_opener()
+    HEIF_PLUGIN = True
+except ImportError:
+    HEIF_PLUGIN = False
+
+DISPLAY_WIDTH, DISPLAY_HEIGHT = 1920, 1080
+# Fit inside the TV without upscaling small clips; H.264 needs even dimensions
+SCALE_FILTER = (f"scale=w='min({DISPLAY_WIDTH},iw)':h='min({DISPLAY_HEIGHT},ih)'"
+                ":force_original_aspect_ratio=decrease:force_divisible_by=2")
+HLS_SEGMENT_SECONDS = 4
+HEIF_EXTENSIONS = ('.heic', '.heif')  # TV browsers can't show these at all
+MAX_ICC_PROFILE_BYTES = 64 * 1024  # Keep colour profiles, drop the odd oversized one
+THUMB_SIZE = 320  # Longest side of list thumbnails (memory book report)
+
+
+def default_transcode_workers() -> int:
+    """Concurrent transcodes: x264 already spreads one encode over several cores"""
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+def probe_video(file_path: str, ffprobe: str = 'ffprobe') -> Optional[Dict[str, Any]]:
+    """Duration and size of a video's first stream; returns None if ffprobe fails"""
+    command = [
+        ffprobe, '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'format=duration:stream=width,height',
+        '-of', 'json', file_path
+    ]
+    try:
+        result = subprocess.run(command, capture_output=True, timeout=60, check=True)
+        info = json.loads(result.stdout)
+    except (subprocess.SubprocessError, OSError, ValueError) as e:
+        print(f"⚠️  Probing {file_path} failed: {e}")
+        return None
+
+    stream = (info.get('streams') or [{}])[0]
+    duration = info.get('format', {}).get('duration')
+    return {
+        'duration': float(duration) if duration else None,
+        'width': stream.get('width'),
+        'height': stream.get('height')
+    }
+
+
+def transcode_video(source: str, target: str, duration: Optional[float], threads: int,
+                    progress: Callable[[float], None], ffmpeg: str = 'ffmpeg'):
+    """Encode a faststart H.264/AAC MP4 that fits the display; progress(percent) as it runs"""
+    command = [
+        ffmpeg, '-nostdin', '-hide_banner', '-v', 'error', '-y',
+        '-i', source,
+        '-map', '0:v:0', '-map', '0:a:0?',
+        '-vf', SCALE_FILTER,
+        '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '23',
+        '-profile:v', 'high', '-pix_fmt', 'yuv420p',
+        # Keyframes on the HLS segment grid, so the MP4 can be segmented without re-encoding
+        '-force_key_frames', f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
+        '-c:a', 'aac', '-b:a', '128k',
+        '-movflags', '+faststart',  # moov atom first, so playback starts before the download ends
+        '-threads', str(threads),
+        '-progress', 'pipe:1', '-nostats',
+        '-f', 'mp4', target
+    ]
+    with tempfile.TemporaryFile() as errors:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=errors)
+        for line in process.stdout:
+            key, _, value = line.decode('utf-8', errors='replace').strip().partition('=')
+            # out_time_ms is in microseconds too, and older builds only print that one
+            if key in ('out_time_us', 'out_time_ms') and duration and value.isdigit():
+                progress(min(99.0, int(value) / 1e6 / duration * 100))
+        if process.wait() != 0:
+            errors.seek(0)
+            message = errors.read().decode('utf-8', errors='replace').strip()
+            raise RuntimeError(f"ffmpeg exited with {process.returncode}: {message[-500:]}")
+
+
+def extract_poster(source: str, target: str, at: float = 1.0, ffmpeg: str = 'ffmpeg'):
+    """Save one frame as a display-sized JPEG"""
+    command = [
+        ffmpeg, '-nostdin', '-hide_banner', '-v', 'error', '-y',
+        '-ss', f"{max(0.0, at):.2f}", '-i', source,
+        '-frames:v', '1', '-vf', SCALE_FILTER, '-q:v', '3',
+        '-f', 'image2', target
+    ]
+    subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=120, check=True)
+
+
+def package_hls(source: str, playlist: str, segment_seconds: int = HLS_SEGMENT_SECONDS,
+                ffmpeg: str = 'ffmpeg'):
+    """Split an H.264/AAC MP4 into MPEG-TS segments and a VOD playlist without re-encoding"""
+    directory = os.path.dirname(playlist)
+    run_id = uuid.uuid4().hex[:8]  # Fresh segment names per run, so proxies may cache them forever
+    command = [
+        ffmpeg, '-nostdin', '-hide_banner', '-v', 'error', '-y',
+        '-i', source, '-c', 'copy',
+        '-f', 'hls', '-hls_time', str(segment_seconds), '-hls_playlist_type', 'vod',
+        '-hls_segment_filename', os.path.join(directory, f'seg_{run_id}_%05d.ts'),
+        playlist
+    ]
+    subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=600, check=True)
+
+    for name in os.listdir(directory):
+        if name.startswith('seg_') and not name.startswith(f'seg_{run_id}_'):
+            os.unlink(os.path.join(directory, name))  # Left by an earlier run
+
+
+def heif_converter() -> Optional[List[str]]:
+    """Command prefix of an installed HEIC-to-JPEG converter, or None"""
+    if shutil.which('heif-convert'):
+        return ['heif-convert', '-q', '95']
+    for magick in ('magick', 'convert'):
+        if shutil.which(magick):
+            return [magick]
+    return None
+
+
+def open_photo(source: str) -> Image.Image:
+    """Decode a photo with Pillow, going through an external converter for HEIC without the plugin"""
+    try:
+        image = Image.open(source)
+        image.load()
+        return image
+    except UnidentifiedImageError:
+        converter = heif_converter() if source.lower().endswith(HEIF_EXTENSIONS) else None
+        if converter is None:
+            raise
+
+    with tempfile.TemporaryDirectory() as directory:
+        converted = os.path.join(directory, 'converted.jpg')
+        subprocess.run(converter + [source, converted], stdout=subprocess.DEVNULL,
+                       stderr=subprocess.PIPE, timeout=120, check=True)
+        image = Image.open(converted)
+        image.load()
+        return image
+
+
+def normalize_photo(source: str, target: str) -> Dict[str, Any]:
+    """Write an upright, display-sized WebP (JPEG if Pillow lacks WebP) without EXIF; returns its size"""
+    image = open_photo(source)
+    icc_profile = image.info.get('icc_profile')
+    image = ImageOps.exif_transpose(image)  # Phones store portrait shots sideways plus a rotation tag
+    image.thumbnail((DISPLAY_WIDTH, DISPLAY_HEIGHT), Image.Resampling.LANCZOS)
+
+    options = {}
+    if icc_profile and len(icc_profile) <= MAX_ICC_PROFILE_BYTES:
+        options['icc_profile'] = icc_profile
+    return save_web_image(image, target, **options)
+
+
+def make_thumbnail(source: str, target: str) -> Dict[str, Any]:
+    """Write a small thumbnail of an already upright still (display rendition or poster); returns its size"""
+    with Image.open(source) as image:
+        image.thumbnail((THUMB_SIZE, THUMB_SIZE), Image.Resampling.LANCZOS)
+        return save_web_image(image, target, quality=75)
+
+
+def save_web_image(image: Image.Image, target: str, quality: int = 82, **options) -> Dict[str, Any]:
+    """Save as WebP, or progressive JPEG if Pillow lacks WebP; returns the saved size"""
+    if features.check('webp'):
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        image.save(target, 'WEBP', quality=quality, method=4, **options)
+    else:
+        image.convert('RGB').save(target, 'JPEG', quality=quality + 3, progressive=True, optimize=True, **options)
+    return {'width': image.width, 'height': image.height}
+
+
+def display_extension() -> str:
+    """File extension normalize_photo writes"""
+    return '.webp' if features.check('webp') else '.jpg'
+
+
+class RenditionWorker(ABC):
+    """Thread pool producing renditions of uploads with persisted state and progress callbacks"""
+
+    KINDS: Tuple[str, ...] = ()  # Renditions queued by submit()
+    URL_FOLDER = 'videos'  # Rendition URLs live under /media/<folder>/<upload id>/
+    THREAD_PREFIX = 'rendition'
+
+    def __init__(self, db: PartyDatabase, output_dir: str, max_workers: int = None,
+                 on_update: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 content_hash: Optional[Callable[[str], str]] = None, progress_interval: float = 1.0):
+        self.db = db
+        self.output_dir = output_dir
+        self.max_workers = max_workers or default_transcode_workers()
+        self.on_update = on_update  # called with the rendition row on every state/progress change
+        self.content_hash = content_hash  # versions rendition URLs, optional
+        self.progress_interval = progress_interval
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.THREAD_PREFIX)
+        self._lock = threading.Lock()
+        self._active = set()  # upload ids
+        self.completed = 0
+        self.failed = 0
+
+    def available(self) -> bool:
+        """Whether the tools this stage needs are installed"""
+        return True
+
+    def submit(self, upload_id: int, source: str) -> bool:
+        """Queue the renditions of an upload; False if already processing or the tools are missing"""
+        if not self.available():
+            return False  # The original keeps being shown
+        with self._lock:
+            if upload_id in self._active:
+                return False
+            self._active.add(upload_id)
+        for kind in self.KINDS:
+            self._notify(self.db.create_media_rendition(upload_id, kind))
+        self._executor.submit(self._work, upload_id, source)
+        return True
+
+    def recover(self) -> int:
+        """Re-queue uploads left unfinished by a previous server run"""
+        sources = {rendition['upload_id']: rendition['source_path']
+                   for rendition in self.db.get_unfinished_renditions(self.recovered_kinds())}
+        return sum(self.submit(upload_id, source) for upload_id, source in sources.items())
+
+    def recovered_kinds(self) -> Tuple[str, ...]:
+        """Rendition kinds recover() picks up"""
+        return self.KINDS
+
+    def _work(self, upload_id: int, source: str):
+        """Worker: run one upload and release it"""
+        try:
+            if self._run(upload_id, source):
+                self.completed += 1
+            else:
+                self.failed += 1
+        finally:
+            with self._lock:
+                self._active.discard(upload_id)
+
+    @abstractmethod
+    def _run(self, upload_id: int, source: str) -> bool:
+        """Produce the renditions of one upload; True on success"""
+
+    def _update(self, upload_id: int, kind: str, **fields):
+        """Persist a rendition change and report it"""
+        self.db.update_media_rendition(upload_id, kind, **fields)
+        self._notify(self.db.get_media_renditions(upload_id).get(kind))
+
+    def _ready(self, upload_id: int, kind: str, path: str, partial: str, **fields):
+        """Move a finished rendition into place and mark it ready"""
+        os.replace(partial, path)
+        self._publish(upload_id, kind, path, **fields)
+
+    def _publish(self, upload_id: int, kind: str, path: str, **fields):
+        """Mark a rendition already in place ready and report it"""
+        content_hash = self.content_hash(path) if self.content_hash else None
+        self._update(upload_id, kind, status='ready', progress=100, file_path=path,
+                     file_size=os.path.getsize(path), content_hash=content_hash, error=None, **fields)
+
+    def _thumbnail(self, upload_id: int, image_path: str):
+        """Small still next to the renditions; a failure only costs the thumbnail"""
+        self.db.create_media_rendition(upload_id, 'thumb')
+        target_dir = os.path.dirname(image_path)
+        extension = display_extension()
+        try:
+            partial = os.path.join(target_dir, f'thumb.part{extension}')
+            size = run_blocking(make_thumbnail, image_path, partial)
+            self._ready(upload_id, 'thumb', os.path.join(target_dir, f'thumb{extension}'), partial,
+                        width=size['width'], height=size['height'])
+        except Exception as e:
+            print(f"⚠️  Thumbnail for upload {upload_id} failed: {e}")
+            self._update(upload_id, 'thumb', status='failed', error=str(e))
+
+    def stats(self) -> Dict[str, int]:
+        """Rendition counts for status endpoints"""
+        with self._lock:
+            active = len(self._active)
+        return {'active': active, 'max_workers': self.max_workers,
+                'completed': self.completed, 'failed': self.failed}
+
+    def _notify(self, rendition: Optional[Dict[str, Any]]):
+        """Forward a rendition change, with its URL once ready, to the update callback"""
+        if rendition and self.on_update:
+            if rendition['status'] == 'ready':
+                rendition = dict(rendition, url=rendition_url(rendition['upload_id'], rendition['file_path'],
+                                                              rendition['content_hash'], self.URL_FOLDER))
+            try:
+                self.on_update(rendition)
+            except Exception as e:
+                print(f"⚠️  Rendition update callback failed: {e}")
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting work and optionally wait for running jobs"""
+        self._executor.shutdown(wait=wait)
+
+
+class VideoProcessor(RenditionWorker):
+    """Transcodes uploaded videos on a CPU-capped thread pool"""
+
+    KINDS = ('poster', 'video')
+    URL_FOLDER = 'videos'
+    THREAD_PREFIX = 'transcode'
+
+    def __init__(self, db: PartyDatabase, output_dir: str = 'media/videos', max_workers: int = None,
+                 on_update: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 content_hash: Optional[Callable[[str], str]] = None,
+                 probe: Callable = probe_video, transcoder: Callable = transcode_video,
+                 poster: Callable = extract_poster, packager: Callable = package_hls,
+                 hls_min_duration: Optional[float] = None, progress_interval: float = 1.0):
+        super().__init__(db, output_dir, max_workers=max_workers, on_update=on_update,
+                         content_hash=content_hash, progress_interval=progress_interval)
+        # ffmpeg threads per transcode, so all running encodes together use every core once
+        self.threads = max(1, (os.cpu_count() or 1) // self.max_workers)
+        self.probe = probe
+        self.transcoder = transcoder
+        self.poster = poster
+        self.packager = packager
+        self.hls_min_duration = hls_min_duration  # Seconds; None packages no HLS
+
+    def available(self) -> bool:
+        """ffmpeg is needed unless a transcoder was injected"""
+        return self.transcoder is not transcode_video or ffmpeg_available()
+
+    def recovered_kinds(self) -> Tuple[str, ...]:
+        """HLS packaging is recovered by transcoding again"""
+        return self.KINDS + ('hls',)
+
+    def _run(self, upload_id: int, source: str) -> bool:
+        """Poster frame first (quick), then the transcode, then HLS for long videos"""
+        target_dir = os.path.join(self.output_dir, str(upload_id))
+        try:
+            if not os.path.exists(source):
+                raise FileNotFoundError(f"Upload file missing: {source}")
+            os.makedirs(target_dir, exist_ok=True)
+            info = run_blocking(self.probe, source) or {}
+            duration = info.get('duration')
+
+            self._update(upload_id, 'poster', status='processing')
+            poster_path = os.path.join(target_dir, 'poster.jpg')
+            try:
+                partial = os.path.join(target_dir, 'poster.part.jpg')
+                run_blocking(self.poster, source, partial, min(1.0, (duration or 2.0) / 2))
+                self._ready(upload_id, 'poster', poster_path, partial)
+                self._thumbnail(upload_id, poster_path)
+            except Exception as e:
+                print(f"⚠️  Poster frame for upload {upload_id} failed: {e}")
+                self._update(upload_id, 'poster', status='failed', error=str(e))
+
+            last_report = {'progress': 0.0, 'at': 0.0}
+
+            def progress(percent: float):
+                now = time.time()
+                if now - last_report['at'] < self.progress_interval or percent - last_report['progress'] < 1:
+                    return
+                last_report.update(progress=percent, at=now)
+                self._update(upload_id, 'video', progress=round(percent, 1))
+
+            self._update(upload_id, 'video', status='processing', progress=0)
+            video_path = os.path.join(target_dir, 'web.mp4')
+            partial = os.path.join(target_dir, 'web.part.mp4')
+            run_blocking_with_progress(self.transcoder, progress, source, partial, duration, self.threads)
+            output = run_blocking(self.probe, partial) or {}
+            self._ready(upload_id, 'video', video_path, partial,
+                        width=output.get('width'), height=output.get('height'))
+        except Exception as e:
+            print(f"❌ Transcoding upload {upload_id} failed: {e}")
+            self._update(upload_id, 'video', status='failed', error=str(e))
+            return False
+
+        if self.hls_min_duration is not None and duration and duration >= self.hls_min_duration:
+            self._package(upload_id, video_path, output)
+        return True
+
+    def _package(self, upload_id: int, video_path: str, output: Dict[str, Any]):
+        """Segment the finished MP4 for HLS; the MP4 stays the fallback if this fails"""
+        self.db.create_media_rendition(upload_id, 'hls')
+        self._update(upload_id, 'hls', status='processing')
+        target_dir = os.path.dirname(video_path)
+        try:
+            partial = os.path.join(target_dir, 'index.part.m3u8')
+            run_blocking(self.packager, video_path, partial)
+            self._ready(upload_id, 'hls', os.path.join(target_dir, 'index.m3u8'), partial,
+                        width=output.get('width'), height=output.get('height'))
+        except Exception as e:
+            print(f"⚠️  HLS packaging for upload {upload_id} failed: {e}")
+            self._update(upload_id, 'hls', status='failed', error=str(e))
+
+
+class PhotoProcessor(RenditionWorker):
+    """Converts uploaded photos, HEIC included, to upright display-sized WebP renditions"""
+
+    KINDS = ('display',)
+    URL_FOLDER = 'photos'
+    THREAD_PREFIX = 'photo'
+
+    def __init__(self, db: PartyDatabase, output_dir: str = 'media/photos', max_workers: int = None,
+                 on_update: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 content_hash: Optional[Callable[[str], str]] = None,
+                 normalizer: Callable = normalize_photo):
+        super().__init__(db, output_dir, max_workers=max_workers, on_update=on_update, content_hash=content_hash)
+        self.normalizer = normalizer
+
+    def _run(self, upload_id: int, source: str) -> bool:
+        """Decode, rotate, shrink and re-encode; the original stays untouched for the memory book"""
+        target_dir = os.path.join(self.output_dir, str(upload_id))
+        extension = display_extension()
+        try:
+            if not os.path.exists(source):
+                raise FileNotFoundError(f"Upload file missing: {source}")
+            os.makedirs(target_dir, exist_ok=True)
+            self._update(upload_id, 'display', status='processing')
+            partial = os.path.join(target_dir, f'display.part{extension}')
+            size = run_blocking(self.normalizer, source, partial) or {}
+            display_path = os.path.join(target_dir, f'display{extension}')
+            os.replace(partial, display_path)
+            # HEIC uploads stay off the slideshow until there is something the TV can show; marked
+            # before the ready event so clients refetching on it find the photo in the slideshow
+            self.db.mark_upload_processed(upload_id)
+            self._publish(upload_id, 'display', display_path,
+                          width=size.get('width'), height=size.get('height'))
+            self._thumbnail(upload_id, display_path)
+            return True
+        except Exception as e:
+            print(f"❌ Converting photo {upload_id} failed: {e}")
+            self._update(upload_id, 'display', status='failed', error=str(e))
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        """Rendition counts plus whether HEIC photos can be decoded"""
+        return dict(super().stats(), heic=HEIF_PLUGIN or heif_converter() is not None)
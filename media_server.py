@@ -0,0 +1,178 @@
+"""
+Media File Serving
+Sends /media and static files without the Python worker moving the bytes: nginx X-Accel-Redirect,
+Apache/lighttpd X-Sendfile, or the WSGI server's zero-copy file wrapper, with content-hash ETags
+"""
+
+import hashlib
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote
+
+from flask import request
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+
+from offload import run_blocking
+
+# python: stream through wsgi.file_wrapper (sendfile under servers that support it)
+# nginx: X-Accel-Redirect to an internal location; sendfile: X-Sendfile for Apache/lighttpd
+OFFLOAD_MODES = ('python', 'nginx', 'sendfile')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# HLS segments get new names whenever a video is re-packaged, so they never change in place
+IMMUTABLE_SUFFIXES = ('.ts',)
+
+mimetypes.add_type('application/vnd.apple.mpegurl', '.m3u8')
+mimetypes.add_type('video/mp2t', '.ts')  # Not .ts translation files
+
+
+class MediaServer:
+    """Builds file responses with strong content-hash ETags, offloading the body when configured"""
+
+    def __init__(self, locations: Dict[str, str], mode: str = None, store=None, max_hashes: int = 4096):
+        # Real directory -> internal nginx location serving the same files
+        self.locations = {os.path.realpath(root): prefix.rstrip('/') + '/' for root, prefix in locations.items()}
+        self.mode = mode or os.environ.get('PARTY_MEDIA_OFFLOAD', 'python')
+        if self.mode not in OFFLOAD_MODES:
+            raise ValueError(f"Unknown media offload mode {self.mode!r}, expected one of {', '.join(OFFLOAD_MODES)}")
+        self.store = store  # PartyDatabase keeping hashes across workers and restarts, optional
+        self.max_hashes = max_hashes
+        self._hashes = OrderedDict()  # real path -> (mtime_ns, size, digest)
+        self._pending: Dict[str, threading.Event] = {}  # Paths being hashed right now
+        self._lock = threading.Lock()
+        self.hashes_computed = 0
+
+    def content_hash(self, path: str) -> str:
+        """Hash of the file's bytes, computed once per (path, mtime, size)"""
+        path = os.path.realpath(path)
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._hashes.get(path)
+            if cached and cached[:2] == version:
+                self._hashes.move_to_end(path)
+                return cached[2]
+            pending = self._pending.get(path)
+            if pending is None:
+                self._pending[path] = threading.Event()
+
+        if pending is not None:
+            # A video's first seeks arrive together; wait for the one hash instead of reading it again
+            pending.wait()
+            return self.content_hash(path)
+
+        try:
+            digest = self._stored_hash(path, version)
+            if digest is None:
+                digest = run_blocking(self._hash_file, path)
+                self.hashes_computed += 1
+                if self.store is not None:
+                    self.store.save_media_validator(path, stat.st_mtime_ns, stat.st_size, digest)
+            with self._lock:
+                self._hashes[path] = version + (digest,)
+                while len(self._hashes) > self.max_hashes:
+                    self._hashes.popitem(last=False)
+            return digest
+        finally:
+            with self._lock:
+                self._pending.pop(path).set()
+
+    def save_upload(self, stream, path: str, chunk_size: int = 1024 * 1024) -> Tuple[int, str]:
+        """Write an upload stream to path, hashing it on the way; returns (size, content hash)"""
+        sha1 = hashlib.sha1()
+        size = 0
+        with open(path, 'wb') as f:
+            for chunk in iter(lambda: stream.read(chunk_size), b''):
+                sha1.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        digest = sha1.hexdigest()[:20]
+        self.remember_hash(path, digest)
+        return size, digest
+
+    def remember_hash(self, path: str, digest: str):
+        """Record a hash computed while the file was written, so serving it never reads it again"""
+        path = os.path.realpath(path)
+        stat = os.stat(path)
+        with self._lock:
+            self._hashes[path] = (stat.st_mtime_ns, stat.st_size, digest)
+            while len(self._hashes) > self.max_hashes:
+                self._hashes.popitem(last=False)
+        if self.store is not None:
+            self.store.save_media_validator(path, stat.st_mtime_ns, stat.st_size, digest)
+
+    def _stored_hash(self, path: str, version: Tuple[int, int]) -> Optional[str]:
+        """Hash another worker or an earlier run computed for this file version"""
+        if self.store is None:
+            return None
+        stored = self.store.get_media_validator(path)
+        if stored and (stored['mtime_ns'], stored['file_size']) == version:
+            return stored['content_hash']
+        return None
+
+    @staticmethod
+    def _hash_file(path: str) -> str:
+        """SHA-1 of a file, read in 1 MB chunks"""
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha1.update(chunk)
+        return sha1.hexdigest()[:20]
+
+    def versioned_url(self, url: str, path: str) -> str:
+        """URL carrying the content hash, cacheable forever by browsers and the proxy"""
+        try:
+            return f"{url}?v={self.content_hash(path)}"
+        except OSError:
+            return url
+
+    def _accel_uri(self, path: str) -> Optional[str]:
+        """Internal nginx URI for a file, or None when it lives outside the mapped directories"""
+        for root, prefix in self.locations.items():
+            if path.startswith(root + os.sep):
+                return prefix + quote(os.path.relpath(path, root).replace(os.sep, '/'))
+        return None
+
+    def send_from_directory(self, directory: str, filename: str):
+        """send() for a path inside directory, refusing traversal outside it"""
+        path = safe_join(directory, filename)
+        if path is None:
+            raise NotFound()
+        return self.send(path)
+
+    def send(self, path: str):
+        """Response for a file: 304, an offload header, or the file body"""
+        path = os.path.realpath(path)
+        if not os.path.isfile(path):
+            raise NotFound()
+
+        etag = self.content_hash(path)
+        accel_uri = self._accel_uri(path) if self.mode == 'nginx' else None
+        offloaded = accel_uri is not None or self.mode == 'sendfile'
+
+        # Range, If-Range, If-None-Match and If-Modified-Since are answered against the cached hash;
+        # offloaded bodies get Range handling from the proxy, so only 304s are answered here
+        response = send_file(path, request.environ, etag=etag, use_x_sendfile=offloaded,
+                             conditional=not offloaded,
+                             mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        if offloaded:
+            response = response.make_conditional(request.environ)
+            if response.status_code == 304:
+                response.headers.pop('X-Sendfile', None)
+            elif accel_uri:
+                response.headers.pop('X-Sendfile', None)
+                response.headers['X-Accel-Redirect'] = accel_uri
+
+        if request.args.get('v') == etag or path.endswith(IMMUTABLE_SUFFIXES):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+            response.expires = None
+        else:
+            response.cache_control.public = True  # Revalidated with the ETag on every use
+        return response
@@ -0,0 +1,276 @@
+"""
+Memory Book Export
+Builds a self-contained static copy of the memory book (HTML pages, thumbnail and display images,
+videos and music files) that opens without the party server, re-rendering only uploads that changed,
+and streams it into a ZIP
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, List, Union
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from werkzeug.utils import secure_filename
+
+from database import PartyDatabase
+from media_processing import normalize_photo, make_thumbnail, display_extension
+from report import DEFAULT_PER_PAGE, REPORT_BATCH_SIZE
+
+EXPORT_VERSION = 1  # Bump when the rendered files change, so every upload is rendered again
+MANIFEST_NAME = 'manifest.json'
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+# Already compressed; deflating them again only costs time
+STORED_SUFFIXES = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.mp4', '.mov', '.m4a', '.mp3', '.ogg', '.aac')
+
+
+def page_name(page: int) -> str:
+    """File name of a memory book page"""
+    return 'index.html' if page == 1 else f'page-{page}.html'
+
+
+def render_upload(upload: Dict[str, Any], output_dir: str) -> Dict[str, str]:
+    """Copy or render one upload's files into the book; returns their paths relative to the book"""
+    upload_id, file_type = upload['id'], upload['file_type']
+    files = {}
+
+    if file_type == 'photo':
+        # The display rendition when there is one, otherwise rendered from the original now
+        extension = os.path.splitext(upload['rendition_path'] or '')[1] or display_extension()
+        display = f"images/{upload_id}/display{extension}"
+        os.makedirs(os.path.join(output_dir, 'images', str(upload_id)), exist_ok=True)
+        if upload['rendition_path']:
+            shutil.copyfile(upload['rendition_path'], os.path.join(output_dir, display))
+        else:
+            normalize_photo(upload['file_path'], os.path.join(output_dir, display))
+        files['media'] = display
+    elif file_type == 'video':
+        source = upload['rendition_path'] or upload['file_path']
+        media = f"videos/{upload_id}{os.path.splitext(source)[1].lower()}"
+        os.makedirs(os.path.join(output_dir, 'videos'), exist_ok=True)
+        shutil.copyfile(source, os.path.join(output_dir, media))
+        files['media'] = media
+    elif file_type == 'music':
+        name = secure_filename(upload['original_filename'] or '') or os.path.basename(upload['file_path'])
+        media = f"music/{upload_id}-{name}"
+        os.makedirs(os.path.join(output_dir, 'music'), exist_ok=True)
+        shutil.copyfile(upload['file_path'], os.path.join(output_dir, media))
+        files['media'] = media
+
+    if file_type in ('photo', 'video'):
+        thumb_source = upload['thumb_path']
+        if not thumb_source and file_type == 'photo':
+            thumb_source = os.path.join(output_dir, files['media'])
+        if thumb_source:
+            thumb = f"images/{upload_id}/thumb{display_extension()}"
+            os.makedirs(os.path.join(output_dir, 'images', str(upload_id)), exist_ok=True)
+            make_thumbnail(thumb_source, os.path.join(output_dir, thumb))
+            files['thumb'] = thumb
+    return files
+
+
+class MemoryBookExporter:
+    """Keeps a static memory book directory in step with the database"""
+
+    def __init__(self, db: PartyDatabase, output_dir: str = 'exports/memory-book', workers: int = None,
+                 per_page: int = DEFAULT_PER_PAGE):
+        self.db = db
+        self.output_dir = output_dir
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.per_page = per_page
+        self.templates = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=select_autoescape())
+        self.templates.globals['page_name'] = page_name
+
+    @staticmethod
+    def upload_key(upload: Dict[str, Any]) -> str:
+        """Fingerprint of everything an upload's exported files are made from"""
+        source = upload['content_hash']
+        if not source:
+            try:
+                stat = os.stat(upload['file_path'])
+                source = f"{stat.st_mtime_ns}:{stat.st_size}"
+            except OSError:
+                source = 'missing'
+        parts = [EXPORT_VERSION, source, upload['rendition_path'], upload['rendition_hash'],
+                 upload['thumbnail_url'], upload['original_filename']]
+        return hashlib.sha1(json.dumps(parts).encode()).hexdigest()
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        """Keys and files of the previous export, or an empty manifest"""
+        try:
+            with open(os.path.join(self.output_dir, MANIFEST_NAME)) as f:
+                manifest = json.load(f)
+            if manifest.get('version') == EXPORT_VERSION:
+                return manifest
+        except (OSError, ValueError):
+            pass
+        return {'version': EXPORT_VERSION, 'uploads': {}, 'pages': {}}
+
+    def _save_manifest(self, manifest: Dict[str, Any]):
+        """Write the manifest atomically, so an interrupted export is picked up next time"""
+        path = os.path.join(self.output_dir, MANIFEST_NAME)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(path + '.tmp', path)
+
+    def _pages(self):
+        """Uploads in party order, one page-sized list at a time"""
+        page, after_id = [], None
+        while True:
+            batch = self.db.get_report_uploads(after_id, REPORT_BATCH_SIZE)
+            for upload in batch:
+                page.append(upload)
+                if len(page) == self.per_page:
+                    yield page
+                    page = []
+            if len(batch) < REPORT_BATCH_SIZE:
+                break
+            after_id = batch[-1]['id']
+        if page:
+            yield page
+
+    def build(self) -> Dict[str, int]:
+        """Bring the book up to date; returns counts of rendered, unchanged and failed uploads and pages"""
+        print(f"📖 Exporting memory book to {self.output_dir}")
+        os.makedirs(self.output_dir, exist_ok=True)
+        manifest = self._load_manifest()
+        previous = manifest['uploads']
+        current: Dict[str, Any] = {}
+        stats = {'rendered': 0, 'unchanged': 0, 'failed': 0, 'pages_written': 0, 'pages': 0}
+
+        total_uploads = self.db.count_report_uploads()
+        page_count = max(1, -(-total_uploads // self.per_page))
+        generated_at = datetime.now()
+
+        # Images render in worker processes; only the main process reads SQLite and writes the manifest
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for number, uploads in enumerate(self._pages(), 1):
+                futures = {}
+                for upload in uploads:
+                    key = self.upload_key(upload)
+                    entry = previous.get(str(upload['id']))
+                    if entry and entry['key'] == key and self._files_exist(entry['files']):
+                        current[str(upload['id'])] = entry
+                        stats['unchanged'] += 1
+                    else:
+                        futures[executor.submit(render_upload, upload, self.output_dir)] = (upload, key)
+
+                for future in as_completed(futures):
+                    upload, key = futures[future]
+                    try:
+                        current[str(upload['id'])] = {'key': key, 'files': future.result()}
+                        stats['rendered'] += 1
+                    except Exception as e:
+                        print(f"❌ Exporting upload {upload['id']} failed: {e}")
+                        stats['failed'] += 1
+
+                for upload in uploads:
+                    upload['files'] = current.get(str(upload['id']), {}).get('files', {})
+                if self._write_page(manifest, number, page_count, total_uploads, uploads, generated_at):
+                    stats['pages_written'] += 1
+                stats['pages'] = number
+
+        if stats['pages'] == 0:  # Nothing uploaded yet: still an index page
+            stats['pages_written'] += self._write_page(manifest, 1, 1, 0, [], generated_at)
+            stats['pages'] = 1
+        self._remove_stale(previous, current, manifest, stats['pages'])
+        manifest['uploads'] = current
+        self._save_manifest(manifest)
+
+        print(f"✅ Memory book ready: {stats['rendered']} rendered, {stats['unchanged']} unchanged, "
+              f"{stats['failed']} failed, {stats['pages_written']}/{stats['pages']} pages written")
+        return stats
+
+    def _files_exist(self, files: Dict[str, str]) -> bool:
+        """Whether an earlier export's files are still on disk"""
+        return all(os.path.exists(os.path.join(self.output_dir, path)) for path in files.values())
+
+    def _write_page(self, manifest: Dict[str, Any], number: int, page_count: int, total_uploads: int,
+                    uploads: List[Dict[str, Any]], generated_at: datetime) -> bool:
+        """Render one page unless its uploads and position are unchanged; True if written"""
+        name = page_name(number)
+        parts = [EXPORT_VERSION, page_count, total_uploads] + [(u['id'], self.upload_key(u), u['files'],
+                                                               u['guest_name'], u['birthday_note']) for u in uploads]
+        key = hashlib.sha1(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+        path = os.path.join(self.output_dir, name)
+        if manifest['pages'].get(name) == key and os.path.exists(path):
+            return False
+
+        template = self.templates.get_template('memory_book.html')
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            for chunk in template.generate(uploads=uploads, page=number, page_count=page_count,
+                                           total_uploads=total_uploads, generated_at=generated_at):
+                f.write(chunk)
+        os.replace(path + '.tmp', path)
+        manifest['pages'][name] = key
+        return True
+
+    def _remove_stale(self, previous: Dict[str, Any], current: Dict[str, Any], manifest: Dict[str, Any],
+                      page_count: int):
+        """Delete files of uploads that were removed and pages past the new end"""
+        for upload_id, entry in previous.items():
+            stale = set(entry['files'].values()) - set(current.get(upload_id, {}).get('files', {}).values())
+            for path in stale:
+                try:
+                    os.remove(os.path.join(self.output_dir, path))
+                except OSError:
+                    pass
+        for name in list(manifest['pages']):
+            if name != 'index.html' and int(name[5:-5]) > page_count:
+                del manifest['pages'][name]
+                try:
+                    os.remove(os.path.join(self.output_dir, name))
+                except OSError:
+                    pass
+
+
+def write_zip(source_dir: str, target: Union[str, BinaryIO]) -> int:
+    """Stream a directory into a ZIP file or writable stream, one file at a time; returns the file count"""
+    count = 0
+    with zipfile.ZipFile(target, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+        for root, directories, files in os.walk(source_dir):
+            directories.sort()
+            for name in sorted(files):
+                if name == MANIFEST_NAME or name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                arcname = os.path.join('memory-book', os.path.relpath(path, source_dir))
+                compression = zipfile.ZIP_STORED if name.lower().endswith(STORED_SUFFIXES) else zipfile.ZIP_DEFLATED
+                # ZipFile.write copies in chunks, so large videos never sit in memory
+                archive.write(path, arcname, compress_type=compression)
+                count += 1
+    return count
+
+
+def main():
+    """Export the memory book from the command line"""
+    import argparse
+    from contextlib import redirect_stdout
+
+    parser = argparse.ArgumentParser(description="Export the Party Memory Wall memory book as a static site")
+    parser.add_argument("--db", default="database/party.db", help="Party database path")
+    parser.add_argument("--output", default="exports/memory-book", help="Static site directory (kept between runs)")
+    parser.add_argument("--zip", help="Also write a ZIP archive to this path ('-' for stdout)")
+    parser.add_argument("--workers", type=int, help="Image rendering processes")
+    parser.add_argument("--per-page", type=int, default=DEFAULT_PER_PAGE, help="Submissions per page")
+
+    args = parser.parse_args()
+
+    exporter = MemoryBookExporter(PartyDatabase(args.db), output_dir=args.output,
+                                  workers=args.workers, per_page=args.per_page)
+    with redirect_stdout(sys.stderr if args.zip == '-' else sys.stdout):  # Keep a piped ZIP clean
+        exporter.build()
+
+    if args.zip:
+        target = sys.stdout.buffer if args.zip == '-' else args.zip
+        count = write_zip(args.output, target)
+        print(f"📦 Wrote {count} files to {'stdout' if args.zip == '-' else args.zip}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Worker Message Bus
+Pub/sub between app worker processes: Socket.IO fan-out through a client manager plus app-level
+topics (broadcasts, settings and cache invalidations), over a local Unix-socket broker or Redis
+"""
+
+import os
+import pickle
+import socket
+import socketserver
+import struct
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Any, Iterator, Optional, Tuple
+
+from socketio import PubSubManager
+
+LOCAL_SCHEME = 'local://'
+_HEADER = struct.Struct('>I')
+# First frame on a broker connection: publishers only send, subscribers only receive
+_PUBLISHER, _SUBSCRIBER = b'PUB', b'SUB'
+
+
+def _socket_path(url: str) -> str:
+    """Unix socket path from a local:///path/to/bus.sock URL"""
+    return url[len(LOCAL_SCHEME):]
+
+
+def _send_frame(sock: socket.socket, payload: bytes):
+    """Write one length-prefixed frame"""
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> Optional[bytes]:
+    """Read exactly size bytes, or None when the peer closed"""
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def _recv_frame(sock: socket.socket) -> Optional[bytes]:
+    """Read one length-prefixed frame, or None when the peer closed"""
+    header = _recv_exactly(sock, _HEADER.size)
+    if header is None:
+        return None
+    return _recv_exactly(sock, _HEADER.unpack(header)[0])
+
+
+class LocalBroker:
+    """Unix-socket broker that forwards every published frame to every subscriber"""
+
+    def __init__(self, url: str):
+        self.path = _socket_path(url)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._server = None
+
+    def start(self):
+        """Listen in a background thread"""
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # Left over from a previous run
+        broker = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                role = _recv_frame(self.request)
+                if role == _SUBSCRIBER:
+                    with broker._lock:
+                        broker._subscribers.add(self.request)
+                try:
+                    while True:
+                        frame = _recv_frame(self.request)
+                        if frame is None:
+                            break
+                        if role == _PUBLISHER:
+                            broker._forward(frame)
+                finally:
+                    with broker._lock:
+                        broker._subscribers.discard(self.request)
+
+        self._server = socketserver.ThreadingUnixStreamServer(self.path, Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='message-broker', daemon=True).start()
+
+    def _forward(self, frame: bytes):
+        """Send a frame to all subscribers, dropping ones that went away"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                _send_frame(subscriber, frame)
+            except OSError:
+                with self._lock:
+                    self._subscribers.discard(subscriber)
+
+    def stop(self):
+        """Stop listening and remove the socket file"""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class BusConnection:
+    """One worker's connection to the broker: publish (channel, payload) and iterate what arrives"""
+
+    def __init__(self, url: str, retry_interval: float = 1.0):
+        self.url = url
+        self.retry_interval = retry_interval
+        self._sock = None
+        self._redis = None
+        self._lock = threading.Lock()
+
+    def _connect(self, role: bytes) -> socket.socket:
+        """Open a publisher or subscriber socket to the broker"""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(_socket_path(self.url))
+        _send_frame(sock, role)
+        return sock
+
+    def _redis_client(self):
+        """Redis connection for redis:// URLs (optional dependency)"""
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(self.url)
+        return self._redis
+
+    def publish(self, channel: str, payload: bytes):
+        """Send one message to every worker, this one included"""
+        if not self.url.startswith(LOCAL_SCHEME):
+            self._redis_client().publish(channel, payload)
+            return
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._sock = self._connect(_PUBLISHER)
+                    _send_frame(self._sock, pickle.dumps((channel, payload)))
+                    return
+                except OSError:
+                    self._sock = None
+                    if attempt:
+                        raise
+
+    def listen(self, *channels: str) -> Iterator[Tuple[str, bytes]]:
+        """Yield (channel, payload) for the given channels forever, reconnecting as needed"""
+        if not self.url.startswith(LOCAL_SCHEME):
+            pubsub = self._redis_client().pubsub()
+            pubsub.subscribe(*channels)
+            for message in pubsub.listen():
+                if message['type'] == 'message':
+                    yield message['channel'].decode(), message['data']
+            return
+
+        while True:
+            try:
+                sock = self._connect(_SUBSCRIBER)
+            except OSError:
+                time.sleep(self.retry_interval)
+                continue
+            try:
+                while True:
+                    frame = _recv_frame(sock)
+                    if frame is None:
+                        break
+                    channel, payload = pickle.loads(frame)
+                    if channel in channels:
+                        yield channel, payload
+            except OSError:
+                pass
+            finally:
+                sock.close()
+            time.sleep(self.retry_interval)
+
+
+class LocalPubSubManager(PubSubManager):
+    """Socket.IO client manager that fans emits out to the other workers through the local broker"""
+
+    name = 'local'
+
+    def __init__(self, url: str, channel: str = 'socketio', write_only: bool = False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.bus = BusConnection(url)
+        self.listener = BusConnection(url)
+
+    def _publish(self, data):
+        """Send an emit/room message to the other workers"""
+        self.bus.publish(self.channel, pickle.dumps(data))
+
+    def _listen(self):
+        """Messages from the other workers, for PubSubManager to apply"""
+        for _, payload in self.listener.listen(self.channel):
+            yield payload
+
+
+def socketio_queue_options(url: Optional[str]) -> Dict[str, Any]:
+    """SocketIO() keyword arguments for a message queue URL (none for a single process)"""
+    if not url:
+        return {}
+    if url.startswith(LOCAL_SCHEME):
+        return {'client_manager': LocalPubSubManager(url)}
+    return {'message_queue': url}
+
+
+class ClusterBus:
+    """App-level topics between workers; handlers run for messages from the other workers only"""
+
+    CHANNEL = 'party-cluster'
+
+    def __init__(self, url: str):
+        self.url = url
+        self.worker_id = uuid.uuid4().hex
+        self.bus = BusConnection(url)
+        self.listener = BusConnection(url)
+        self._handlers: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+        self._thread = None
+
+    def subscribe(self, topic: str, handler: Callable[[Dict[str, Any]], None]):
+        """Call handler(message) for each message another worker publishes on topic"""
+        self._handlers[topic] = handler
+
+    def publish(self, topic: str, **message):
+        """Send a message to the other workers"""
+        try:
+            self.bus.publish(self.CHANNEL, pickle.dumps((self.worker_id, topic, message)))
+        except Exception as e:
+            print(f"⚠️  Cluster publish of {topic} failed: {e}")
+
+    def _run(self):
+        """Listener loop dispatching to the topic handlers"""
+        for _, payload in self.listener.listen(self.CHANNEL):
+            try:
+                origin, topic, message = pickle.loads(payload)
+                handler = self._handlers.get(topic)
+                if origin != self.worker_id and handler:
+                    handler(message)
+            except Exception as e:
+                print(f"❌ Cluster message error: {e}")
+
+    def start(self):
+        """Start listening in the background"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='cluster-bus', daemon=True)
+            self._thread.start()
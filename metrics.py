@@ -0,0 +1,272 @@
+"""
+Metrics
+Counters, gauges and latency histograms for requests, Socket.IO emits, database calls, external
+services and background queues, exported in the Prometheus text format on /metrics. Recording is a
+bisect and a locked add; gauges are only read when scraped
+"""
+
+import bisect
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Seconds; from fast SQLite reads up to yt-dlp downloads and transcodes
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: Any) -> str:
+    """Label value escaped for the text exposition format"""
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    """{name="value",...} or an empty string"""
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _format_value(value: float) -> str:
+    """Sample value as Prometheus expects it"""
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric(ABC):
+    """A named metric family with a fixed set of label names"""
+
+    TYPE = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple:
+        """Label values in declaration order"""
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> Iterator[Tuple[str, Dict[str, Any], float]]:
+        """(sample name, labels, value) triples for exposition"""
+
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+
+    TYPE = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels):
+        """Add amount to the labelled count"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name + '_total', dict(zip(self.labelnames, key)), value
+
+
+class Gauge(Metric):
+    """Current value, either set directly or read from a callback at scrape time"""
+
+    TYPE = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._callbacks: Dict[Tuple, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        """Set the labelled value"""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, func: Callable[[], float], **labels):
+        """Read the labelled value from func whenever metrics are scraped"""
+        with self._lock:
+            self._callbacks[self._key(labels)] = func
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+            callbacks = list(self._callbacks.items())
+        for key, func in callbacks:
+            try:
+                values[key] = func()
+            except Exception as e:
+                print(f"⚠️  Metric {self.name} callback failed: {e}")
+        for key, value in values.items():
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Histogram(Metric):
+    """Observations counted into cumulative latency buckets, with their sum and count"""
+
+    TYPE = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        """Record one observation"""
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        for key, counts, total in values:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield self.name + '_bucket', dict(labels, le=_format_value(bound)), cumulative
+            yield self.name + '_sum', labels, total
+            yield self.name + '_count', labels, cumulative
+
+
+class Registry:
+    """Metrics exported together"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        """Add a metric; names must be unique"""
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self, const_labels: Optional[Dict[str, Any]] = None) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.TYPE}")
+            for name, labels, value in metric.samples():
+                if const_labels:
+                    labels = dict(const_labels, **labels)
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'party_http_request_duration_seconds', 'Flask request latency by route template',
+    ('method', 'route', 'status')))
+SOCKETIO_EMIT_SECONDS = REGISTRY.register(Histogram(
+    'party_socketio_emit_duration_seconds', 'Socket.IO emit latency by event; _count is the emit count',
+    ('event',)))
+DB_QUERY_SECONDS = REGISTRY.register(Histogram(
+    'party_db_query_duration_seconds', 'PartyDatabase method latency; _count is the call count',
+    ('method',)))
+EXTERNAL_CALL_SECONDS = REGISTRY.register(Histogram(
+    'party_external_call_duration_seconds', 'Latency of calls to Ollama, YouTube search and yt-dlp',
+    ('service', 'outcome')))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    'party_worker_queue_depth', 'Items queued or running in background stages', ('queue',)))
+
+
+@contextmanager
+def external_call(service: str):
+    """Time a call to an outside service, labelled ok or error"""
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        EXTERNAL_CALL_SECONDS.observe(time.perf_counter() - start, service=service, outcome=outcome)
+
+
+def instrument_app(app):
+    """Time every Flask request by its route template (not the raw path, which would explode labels)"""
+    from flask import g, request
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_request_latency(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            # Streamed responses (/report) are timed to their first byte
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method,
+                                         route=route, status=response.status_code)
+        return response
+
+    return app
+
+
+def instrument_emit(emit: Callable) -> Callable:
+    """Wrap socketio.emit so every emit, direct or from handlers, is counted and timed"""
+    @wraps(emit)
+    def timed_emit(event, *args, **kwargs):
+        with SOCKETIO_EMIT_SECONDS.time(event=event):
+            return emit(event, *args, **kwargs)
+    return timed_emit
+
+
+class InstrumentedDatabase:
+    """PartyDatabase proxy timing each public method call"""
+
+    # Callers keep raw connections; their queries are not attributed to a method
+    PASSTHROUGH = ('get_connection',)
+
+    def __init__(self, db):
+        self._db = db
+        self._wrappers: Dict[str, Callable] = {}
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._db, name)
+        if not callable(attr) or name in self.PASSTHROUGH or name.startswith('_'):
+            return attr
+
+        wrapper = self._wrappers.get(name)
+        if wrapper is None:
+            def timed(*args, **kwargs):
+                with DB_QUERY_SECONDS.time(method=name):
+                    return getattr(self._db, name)(*args, **kwargs)
+            timed.__name__ = name
+            timed.__doc__ = attr.__doc__
+            wrapper = self._wrappers[name] = timed
+        return wrapper
+
+
+def instrument_database(db):
+    """Wrap db so each method call is timed"""
+    return InstrumentedDatabase(db)
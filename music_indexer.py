@@ -8,11 +8,14 @@ import os
 import json
 import requests
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import Dict, List, Optional, Any
 from mutagen import File
 from mutagen.id3 import ID3NoHeaderError
 from database import PartyDatabase
+from audio_features import analyze_track, ffmpeg_available
+from loudness import measure_loudness
 
 class MusicLibraryIndexer:
     """Indexes local music library for smart search capabilities"""
@@ -267,6 +270,94 @@ class MusicLibraryIndexer:
         
         return stats
     
+    def extract_features(self, workers: int = None, max_files: int = None) -> Dict[str, int]:
+        """Compute BPM/loudness/energy/danceability for tracks without features"""
+        print("🎚️  Starting audio feature extraction...")
+        stats = {'total': 0, 'success': 0, 'failed': 0}
+        
+        if not ffmpeg_available():
+            print("⚠️  ffmpeg not found - skipping audio feature extraction")
+            return stats
+        
+        tracks = self.db.get_tracks_missing_features(limit=max_files)
+        stats['total'] = len(tracks)
+        if not tracks:
+            print("✅ All tracks already have audio features")
+            return stats
+        
+        workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        print(f"📊 Analyzing {len(tracks)} tracks with {workers} workers")
+        
+        # Decoding and FFTs run in worker processes; only the main process writes to SQLite
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(analyze_track, track['file_path'], track['duration']): track
+                for track in tracks
+            }
+            for i, future in enumerate(as_completed(futures), 1):
+                track = futures[future]
+                try:
+                    features = future.result()
+                except Exception as e:
+                    print(f"❌ Feature worker failed for {track['file_path']}: {e}")
+                    features = None
+                
+                if features is None:
+                    # Remembered as analyzed without features, so a corrupt file isn't decoded every run
+                    self.db.update_music_features(track['id'])
+                    stats['failed'] += 1
+                    continue
+                
+                self.db.update_music_features(track['id'], **features)
+                stats['success'] += 1
+                bpm = f"{features['bpm']:.0f} BPM" if features['bpm'] else "no beat"
+                print(f"[{i}/{stats['total']}] 🎚️  {os.path.basename(track['file_path'])}: "
+                      f"{bpm}, energy {features['energy']:.2f}")
+        
+        print("\n🎉 Feature extraction complete!")
+        print(f"✅ Successful: {stats['success']}")
+        print(f"❌ Failed: {stats['failed']}")
+        
+        return stats
+    
+    def measure_library_loudness(self, workers: int = None, max_files: int = None) -> Dict[str, int]:
+        """Measure integrated loudness and playback gain for tracks without one"""
+        print("🔊 Starting loudness measurement...")
+        stats = {'total': 0, 'success': 0, 'failed': 0}
+        
+        if not ffmpeg_available():
+            print("⚠️  ffmpeg not found - skipping loudness measurement")
+            return stats
+        
+        file_paths = self.db.get_unmeasured_library_paths(limit=max_files)
+        stats['total'] = len(file_paths)
+        if not file_paths:
+            print("✅ All tracks already have loudness values")
+            return stats
+        
+        # ffmpeg does the decoding, so threads are enough to keep every core busy
+        workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(measure_loudness, file_path): file_path for file_path in file_paths}
+            for i, future in enumerate(as_completed(futures), 1):
+                file_path = futures[future]
+                measurement = future.result()
+                if measurement is None:
+                    self.db.set_track_loudness(file_path)
+                    stats['failed'] += 1
+                    continue
+                
+                self.db.set_track_loudness(file_path, **measurement)
+                stats['success'] += 1
+                print(f"[{i}/{stats['total']}] 🔊 {os.path.basename(file_path)}: "
+                      f"{measurement['integrated_lufs']} LUFS, gain {measurement['gain_db']} dB")
+        
+        print("\n🎉 Loudness measurement complete!")
+        print(f"✅ Successful: {stats['success']}")
+        print(f"❌ Failed: {stats['failed']}")
+        
+        return stats
+    
     def _test_ollama_connection(self) -> bool:
         """Test if Ollama is available"""
         try:
@@ -300,6 +391,14 @@ def main():
     parser.add_argument("--max-files", type=int, help="Maximum files to index (for testing)")
     parser.add_argument("--skip-embeddings", action="store_true", help="Skip embedding generation")
     parser.add_argument("--test-search", help="Test search with query")
+    # --features/--loudness add a stage after indexing; the --*-only forms skip indexing
+    parser.add_argument("--features", action="store_true", help="Index, then extract audio features")
+    parser.add_argument("--features-only", action="store_true",
+                        help="Only extract audio features for already indexed tracks (no indexing)")
+    parser.add_argument("--loudness", action="store_true", help="Index, then measure loudness/playback gain")
+    parser.add_argument("--loudness-only", action="store_true",
+                        help="Only measure loudness for already indexed tracks (no indexing)")
+    parser.add_argument("--workers", type=int, help="Workers for feature extraction and loudness measurement")
     
     args = parser.parse_args()
     
@@ -310,12 +409,22 @@ def main():
     
     if args.test_search:
         indexer.search_test(args.test_search)
+    elif args.features_only or args.loudness_only:
+        if args.features_only:
+            indexer.extract_features(workers=args.workers, max_files=args.max_files)
+        if args.loudness_only:
+            indexer.measure_library_loudness(workers=args.workers, max_files=args.max_files)
     else:
         stats = indexer.index_library(
             max_files=args.max_files,
             skip_embeddings=args.skip_embeddings
         )
         
+        if args.features:
+            indexer.extract_features(workers=args.workers, max_files=args.max_files)
+        if args.loudness:
+            indexer.measure_library_loudness(workers=args.workers, max_files=args.max_files)
+        
         # Test search after indexing
         if stats['success'] > 0:
             indexer.search_test("queen")
@@ -0,0 +1,262 @@
+"""
+Music Recommendation Engine
+Co-occurrence and transition statistics learned from party selections
+"""
+
+import random
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from typing import List, Dict, Any, Optional, Tuple
+from database import PartyDatabase
+from music_suggest import normalize_text
+
+
+def _artist_key(artist: Optional[str]) -> str:
+    """Normalized artist key"""
+    return normalize_text(artist).strip()
+
+
+def _track_key(artist: Optional[str], title: Optional[str]) -> str:
+    """Normalized artist|title key identifying a song across sources"""
+    return f"{_artist_key(artist)}|{normalize_text(title).strip()}"
+
+
+class MusicRecommender:
+    """Recommends library tracks from artist/genre/track co-occurrence and transitions"""
+
+    def __init__(self, db: PartyDatabase, window: int = 5, max_per_artist: int = 2,
+                 recent_exclusion: int = 50, refresh_interval: float = 30.0):
+        self.db = db
+        self.window = window  # selections that count as "played together"
+        self.max_per_artist = max_per_artist
+        self.recent_exclusion = recent_exclusion
+        self.refresh_interval = refresh_interval  # Seconds between library signature checks
+        self._lock = threading.Lock()
+        self._built = False
+        self._signature = None
+        self._last_check = 0.0
+        self._reset()
+
+    def _reset(self):
+        """Clear all learned statistics and library structures"""
+        # Learned from selections
+        self.artist_cooccurrence = defaultdict(Counter)
+        self.genre_cooccurrence = defaultdict(Counter)
+        self.track_cooccurrence = defaultdict(Counter)
+        self.artist_transitions = defaultdict(Counter)
+        self.genre_transitions = defaultdict(Counter)
+        self.track_transitions = defaultdict(Counter)
+        self.artist_popularity = Counter()
+        self.selection_count = 0
+        self._sequence = deque(maxlen=self.window)
+        self._guest_baskets: Dict[str, deque] = {}
+        self._recent_tracks = deque(maxlen=self.recent_exclusion)
+
+        self._reset_library()
+
+    def _reset_library(self):
+        """Clear the structures precomputed from the library"""
+        self._tracks: Dict[int, Tuple[str, str, str]] = {}  # id -> (artist, genre, track) keys
+        self._track_ids: Dict[str, int] = {}
+        self._artist_tracks: Dict[str, List[int]] = defaultdict(list)
+        self._genre_artists: Dict[str, Counter] = defaultdict(Counter)
+
+    def _load_library(self):
+        """Index library tracks by artist, genre and track key"""
+        self._signature = self.db.get_library_signature()
+        self._last_check = time.monotonic()
+        for library_id, artist, _, title, genre, _ in self.db.get_library_index():
+            artist_key = _artist_key(artist)
+            genre_key = normalize_text(genre).strip()
+            track_key = _track_key(artist, title)
+            self._tracks[library_id] = (artist_key, genre_key, track_key)
+            self._track_ids.setdefault(track_key, library_id)
+            if artist_key:
+                self._artist_tracks[artist_key].append(library_id)
+                if genre_key:
+                    self._genre_artists[genre_key][artist_key] += 1
+
+    def build(self, include_history: bool = True):
+        """Rebuild all structures from the library and (optionally) logged history"""
+        with self._lock:
+            self._reset()
+            self._load_library()
+            self._built = True
+            if not include_history:
+                return
+
+            # Play order gives transitions and session co-occurrence
+            for item in self.db.get_queue_history():
+                self._record(item.get('artist'), item.get('song_title'), item.get('genre'),
+                             item.get('library_id'), guest_name=None)
+
+            # Selections per guest give taste co-occurrence
+            for search in self.db.get_selected_searches():
+                selected = search['selected_result']
+                self._record_guest_basket(search.get('guest_name'),
+                                          self._selection_keys(selected.get('artist'),
+                                                               selected.get('title'),
+                                                               selected.get('genre'), None))
+
+    def ensure_built(self):
+        """Build lazily on first use; re-index the library when music_indexer changed it"""
+        if not self._built:
+            self.build()
+            return
+
+        now = time.monotonic()
+        if now - self._last_check < self.refresh_interval:
+            return
+        self._last_check = now
+        if self.db.get_library_signature() != self._signature:
+            # Learned statistics are keyed by names, so only the library structures are rebuilt
+            with self._lock:
+                self._reset_library()
+                self._load_library()
+
+    def invalidate(self):
+        """Drop learned state so the next request rebuilds from the database"""
+        self._built = False
+
+    def _selection_keys(self, artist: Optional[str], title: Optional[str],
+                        genre: Optional[str], library_id: Optional[int]) -> Tuple[str, str, str]:
+        """Resolve (artist, genre, track) keys, filling genre from the library when missing"""
+        track_key = _track_key(artist, title)
+        if library_id is None:
+            library_id = self._track_ids.get(track_key)
+        genre_key = normalize_text(genre).strip()
+        if not genre_key and library_id in self._tracks:
+            genre_key = self._tracks[library_id][1]
+        return _artist_key(artist), genre_key, track_key
+
+    @staticmethod
+    def _bump_pair(matrix, a: str, b: str):
+        """Symmetric co-occurrence increment"""
+        if a and b and a != b:
+            matrix[a][b] += 1
+            matrix[b][a] += 1
+
+    def _record(self, artist, title, genre, library_id, guest_name):
+        """Update sequence statistics with one selection (caller holds the lock)"""
+        keys = self._selection_keys(artist, title, genre, library_id)
+        artist_key, genre_key, track_key = keys
+
+        if self._sequence:
+            prev_artist, prev_genre, prev_track = self._sequence[-1]
+            if prev_artist and artist_key:
+                self.artist_transitions[prev_artist][artist_key] += 1
+            if prev_genre and genre_key:
+                self.genre_transitions[prev_genre][genre_key] += 1
+            self.track_transitions[prev_track][track_key] += 1
+
+        for other_artist, other_genre, other_track in self._sequence:
+            self._bump_pair(self.artist_cooccurrence, other_artist, artist_key)
+            self._bump_pair(self.genre_cooccurrence, other_genre, genre_key)
+            self._bump_pair(self.track_cooccurrence, other_track, track_key)
+
+        self._sequence.append(keys)
+        self._recent_tracks.append(track_key)
+        if artist_key:
+            self.artist_popularity[artist_key] += 1
+        self.selection_count += 1
+
+        if guest_name:
+            self._record_guest_basket(guest_name, keys)
+
+    def _record_guest_basket(self, guest_name: Optional[str], keys: Tuple[str, str, str]):
+        """Co-occurrence between picks of the same guest (caller holds the lock)"""
+        if not guest_name or guest_name == 'Anonymous':
+            return
+        basket = self._guest_baskets.setdefault(guest_name, deque(maxlen=self.window))
+        for other_artist, other_genre, other_track in basket:
+            self._bump_pair(self.artist_cooccurrence, other_artist, keys[0])
+            self._bump_pair(self.genre_cooccurrence, other_genre, keys[1])
+            self._bump_pair(self.track_cooccurrence, other_track, keys[2])
+        basket.append(keys)
+
+    def record_selection(self, artist: str = None, title: str = None, genre: str = None,
+                         guest_name: str = None, library_id: int = None):
+        """Incrementally learn from a song that was just added to the queue"""
+        if not self._built:
+            self.build()  # The queue history already contains this selection
+            return
+        with self._lock:
+            self._record(artist, title, genre, library_id, guest_name)
+
+    def recommend(self, limit: int = 10, exclude_tracks: Optional[set] = None) -> List[Dict[str, Any]]:
+        """Top-N library tracks for the current context, at most max_per_artist per artist"""
+        self.ensure_built()
+
+        with self._lock:
+            context = list(self._sequence)[-3:]
+            if not context or not self._tracks:
+                return []
+
+            excluded = set(self._recent_tracks)
+            if exclude_tracks:
+                excluded.update(exclude_tracks)
+
+            artist_scores = Counter()
+            genre_scores = Counter()
+            track_scores = Counter()
+
+            # Most recent selection counts most
+            for age, (artist_key, genre_key, track_key) in enumerate(reversed(context)):
+                weight = 0.5 ** age
+                for artist, count in self.artist_transitions.get(artist_key, {}).items():
+                    artist_scores[artist] += 2 * weight * count
+                for artist, count in self.artist_cooccurrence.get(artist_key, {}).items():
+                    artist_scores[artist] += weight * count
+                for genre, count in self.genre_transitions.get(genre_key, {}).items():
+                    genre_scores[genre] += 2 * weight * count
+                for genre, count in self.genre_cooccurrence.get(genre_key, {}).items():
+                    genre_scores[genre] += weight * count
+                if genre_key:
+                    genre_scores[genre_key] += weight
+                for track, count in self.track_transitions.get(track_key, {}).items():
+                    track_scores[track] += 2 * weight * count
+                for track, count in self.track_cooccurrence.get(track_key, {}).items():
+                    track_scores[track] += weight * count
+
+            # Genre affinity spreads to the biggest artists of that genre
+            for genre, score in genre_scores.most_common(5):
+                for artist, _ in self._genre_artists.get(genre, Counter()).most_common(20):
+                    artist_scores[artist] += 0.5 * score
+
+            for artist, count in self.artist_popularity.items():
+                artist_scores[artist] += 0.1 * count
+
+            candidates: Dict[int, float] = {}
+            for track, score in track_scores.items():
+                library_id = self._track_ids.get(track)
+                if library_id is not None and track not in excluded:
+                    candidates[library_id] = score + artist_scores[self._tracks[library_id][0]]
+
+            # Fill with random tracks from the best-scoring artists
+            for artist, score in artist_scores.most_common(limit * 2):
+                track_ids = self._artist_tracks.get(artist)
+                if not track_ids:
+                    continue
+                for library_id in random.sample(track_ids, min(len(track_ids), self.max_per_artist * 2)):
+                    if library_id not in candidates and self._tracks[library_id][2] not in excluded:
+                        candidates[library_id] = score
+
+            ranked = sorted(candidates.items(), key=lambda item: item[1], reverse=True)
+
+            picked = []
+            artist_counts = Counter()
+            for library_id, score in ranked:
+                artist_key = self._tracks[library_id][0]
+                if artist_counts[artist_key] >= self.max_per_artist:
+                    continue
+                artist_counts[artist_key] += 1
+                picked.append((library_id, score))
+                if len(picked) >= limit:
+                    break
+
+        results = self.db.get_library_tracks_by_ids([library_id for library_id, _ in picked])
+        scores = dict(picked)
+        for song in results:
+            song['score'] = round(scores[song['id']], 3)
+        return results
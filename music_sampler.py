@@ -0,0 +1,215 @@
+"""
+Music Library Sampler
+Cheap uniform or weighted random picks from the library without ORDER BY RANDOM()
+"""
+
+import random
+import threading
+import time
+from array import array
+from typing import List, Dict, Any, Optional, Sequence, Union
+from database import PartyDatabase
+from music_suggest import normalize_text
+
+
+def decade_of(year: Optional[int]) -> int:
+    """1987 -> 1980, unknown years -> 0"""
+    try:
+        year = int(year)
+    except (TypeError, ValueError):
+        return 0
+    return (year // 10) * 10 if year > 0 else 0
+
+
+class LibrarySampler:
+    """In-memory id arrays over music_library for O(k) random sampling"""
+
+    def __init__(self, db: PartyDatabase, refresh_interval: float = 30.0):
+        self.db = db
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._signature = None
+        self._last_check = 0.0
+        self._weights_cache: Dict[Any, List[float]] = {}
+        self._clear()
+
+    def _clear(self):
+        """Reset the parallel arrays and filter indexes"""
+        # Parallel arrays: position -> id / artist code / genre code / decade
+        self._ids = array('q')
+        self._artist_codes = array('l')
+        self._genre_codes = array('l')
+        self._decades = array('h')
+        self._artist_codes_by_key: Dict[str, int] = {}
+        self._genre_codes_by_key: Dict[str, int] = {}
+        # Filter value -> positions into the arrays above
+        self._by_artist: Dict[int, array] = {}
+        self._by_genre: Dict[int, array] = {}
+        self._by_decade: Dict[int, array] = {}
+
+    def _get_signature(self):
+        """COUNT/MAX(id) change whenever rows are added or removed"""
+        return self.db.get_library_signature()
+
+    def load(self):
+        """Load ids and filter columns from music_library in one pass"""
+        signature = self._get_signature()
+        rows = self.db.get_library_index()  # A PartyDatabase call, so the proxy can offload it
+
+        with self._lock:
+            self._clear()
+            for position, (library_id, artist, _, _, genre, year) in enumerate(rows):
+                artist_code = self._code(self._artist_codes_by_key, normalize_text(artist).strip())
+                genre_code = self._code(self._genre_codes_by_key, normalize_text(genre).strip())
+                decade = decade_of(year)
+
+                self._ids.append(library_id)
+                self._artist_codes.append(artist_code)
+                self._genre_codes.append(genre_code)
+                self._decades.append(decade)
+                self._by_artist.setdefault(artist_code, array('l')).append(position)
+                self._by_genre.setdefault(genre_code, array('l')).append(position)
+                self._by_decade.setdefault(decade, array('l')).append(position)
+
+            self._weights_cache.clear()
+            self._signature = signature
+            self._last_check = time.monotonic()
+
+    @staticmethod
+    def _code(codes: Dict[str, int], key: str) -> int:
+        """Intern a filter value as a small integer code"""
+        code = codes.get(key)
+        if code is None:
+            code = codes[key] = len(codes)
+        return code
+
+    def _ensure_fresh(self):
+        """Reload when the library changed (checked at most every refresh_interval)"""
+        now = time.monotonic()
+        if self._signature is not None and now - self._last_check < self.refresh_interval:
+            return
+        self._last_check = now
+        if self._signature is None or self._get_signature() != self._signature:
+            self.load()
+
+    def invalidate(self):
+        """Force a signature check on the next sample"""
+        self._last_check = 0.0
+
+    def __len__(self) -> int:
+        """Number of tracks currently indexed"""
+        self._ensure_fresh()
+        return len(self._ids)
+
+    def _candidate_positions(self, artist, genre, decade) -> Sequence[int]:
+        """Positions matching every filter; only the smallest index is scanned"""
+        filters = []  # (positions, predicate) per active filter
+        if artist:
+            names = [artist] if isinstance(artist, str) else list(artist)
+            codes = {self._artist_codes_by_key.get(normalize_text(name).strip()) for name in names}
+            codes.discard(None)
+            positions = array('l')
+            for code in codes:
+                positions.extend(self._by_artist.get(code, ()))
+            filters.append((positions, lambda p, codes=codes: self._artist_codes[p] in codes))
+        if genre:
+            code = self._genre_codes_by_key.get(normalize_text(genre).strip())
+            filters.append((self._by_genre.get(code, array('l')),
+                            lambda p, code=code: self._genre_codes[p] == code))
+        if decade:
+            wanted = decade_of(decade)
+            filters.append((self._by_decade.get(wanted, array('l')),
+                            lambda p, wanted=wanted: self._decades[p] == wanted))
+
+        if not filters:
+            return range(len(self._ids))
+
+        filters.sort(key=lambda f: len(f[0]))
+        positions = filters[0][0]
+        if len(filters) == 1:
+            return positions
+        predicates = [predicate for _, predicate in filters[1:]]
+        return [p for p in positions if all(predicate(p) for predicate in predicates)]
+
+    def sample_ids(self, k: int, artist: Union[str, List[str], None] = None,
+                   genre: Optional[str] = None, decade: Optional[int] = None,
+                   artist_weights: Optional[Dict[str, float]] = None,
+                   exclude_ids: Optional[set] = None) -> List[int]:
+        """Draw up to k distinct library ids, uniformly or weighted per artist"""
+        if k <= 0:
+            return []
+        self._ensure_fresh()
+
+        with self._lock:
+            positions = self._candidate_positions(artist, genre, decade)
+            if not positions:
+                return []
+
+            exclude_ids = exclude_ids or set()
+            picked: List[int] = []
+            seen = set()
+            filter_key = (artist, genre, decade)
+            if exclude_ids and len(exclude_ids) * 2 >= len(positions):
+                # Mostly excluded: draw from the eligible positions so exclusions cannot starve the sample
+                positions = [p for p in positions if self._ids[p] not in exclude_ids]
+                exclude_ids = set()
+                filter_key = None  # One-off candidate set, not worth caching weights for
+
+            if artist_weights:
+                cum_weights = self._cumulative_weights(positions, artist_weights, filter_key)
+                draws = 0
+                while len(picked) < k and draws < k * 10:
+                    batch = random.choices(positions, cum_weights=cum_weights, k=k - len(picked))
+                    draws += len(batch)
+                    for position in batch:
+                        library_id = self._ids[position]
+                        if library_id not in seen and library_id not in exclude_ids:
+                            seen.add(library_id)
+                            picked.append(library_id)
+                if len(picked) < k:
+                    # Draws kept hitting picked or excluded tracks: top up uniformly from the rest
+                    rest = [p for p in positions if self._ids[p] not in seen and self._ids[p] not in exclude_ids]
+                    picked += [self._ids[p] for p in random.sample(rest, min(k - len(picked), len(rest)))]
+                return picked[:k]
+
+            # Uniform: sample a few extra positions to absorb exclusions
+            want = min(len(positions), k + len(exclude_ids))
+            for position in random.sample(positions, want):
+                library_id = self._ids[position]
+                if library_id not in exclude_ids:
+                    picked.append(library_id)
+                    if len(picked) >= k:
+                        break
+            return picked
+
+    def _cumulative_weights(self, positions: Sequence[int], artist_weights: Dict[str, float],
+                            filter_key) -> List[float]:
+        """Cumulative weights for the candidate set, cached until the weights change"""
+        weights_key = tuple(sorted(artist_weights.items()))
+        cache_key = (repr(filter_key), weights_key)
+        cached = self._weights_cache.get(cache_key) if filter_key is not None else None
+        if cached is not None:
+            return cached
+
+        by_code = {}
+        for name, weight in artist_weights.items():
+            code = self._artist_codes_by_key.get(normalize_text(name).strip())
+            if code is not None:
+                by_code[code] = weight
+
+        total = 0.0
+        cum_weights = []
+        for position in positions:
+            total += by_code.get(self._artist_codes[position], 1.0)
+            cum_weights.append(total)
+
+        if filter_key is None:
+            return cum_weights
+        if len(self._weights_cache) > 32:
+            self._weights_cache.clear()
+        self._weights_cache[cache_key] = cum_weights
+        return cum_weights
+
+    def sample(self, k: int, **filters) -> List[Dict[str, Any]]:
+        """Draw up to k random library tracks as result dicts"""
+        return self.db.get_library_tracks_by_ids(self.sample_ids(k, **filters))
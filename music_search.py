@@ -11,6 +11,11 @@ from typing import List, Dict, Any, Optional
 from youtubesearchpython import VideosSearch
 from fuzzywuzzy import fuzz
 from database import PartyDatabase
+from music_suggest import MusicSuggestIndex
+from music_recommender import MusicRecommender
+from music_sampler import LibrarySampler
+from offload import run_blocking
+from metrics import external_call
 
 
 class MusicSearchService:
@@ -21,11 +26,15 @@ class MusicSearchService:
         self.ollama_host = ollama_host
         self.ollama_available = self._test_ollama_connection()
         self.selected_model = None  # Will be loaded dynamically
+        self.suggest_index = MusicSuggestIndex(db)
+        self.recommender = MusicRecommender(db)
+        self.sampler = LibrarySampler(db)
     
     def _test_ollama_connection(self) -> bool:
         """Test if Ollama is available"""
         try:
-            response = requests.get(f"{self.ollama_host}/api/tags", timeout=3)
+            with external_call('ollama'):
+                response = requests.get(f"{self.ollama_host}/api/tags", timeout=3)
             return response.status_code == 200
         except:
             return False
@@ -51,17 +60,7 @@ class MusicSearchService:
     
     def _fuzzy_search_library(self, query: str, limit: int) -> List[Dict[str, Any]]:
         """Fuzzy search through music library"""
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-        SELECT id, file_path, artist, album, title, year, genre, duration, file_size
-        FROM music_library
-        ORDER BY id
-        ''')
-        
-        all_songs = cursor.fetchall()
-        conn.close()
+        all_songs = self.db.get_library_songs()
         
         # Score each song based on fuzzy matching
         scored_songs = []
@@ -99,8 +98,9 @@ class MusicSearchService:
             music_query = f"{query} music"
             
             # Search YouTube
-            videos_search = VideosSearch(music_query, limit=limit)
-            results = videos_search.result()
+            # The search request is made when VideosSearch is constructed
+            with external_call('youtube'):
+                results = run_blocking(lambda: VideosSearch(music_query, limit=limit).result())
             
             youtube_results = []
             for video in results.get('result', []):
@@ -195,15 +195,17 @@ Return only the search terms, separated by commas.
 Query: {query}
 Search terms:"""
 
-            response = requests.post(
-                f"{self.ollama_host}/api/generate",
-                json={
-                    "model": model,
-                    "prompt": prompt,
-                    "stream": False
-                },
-                timeout=10
-            )
+            with external_call('ollama'):
+                response = run_blocking(
+                    requests.post,
+                    f"{self.ollama_host}/api/generate",
+                    json={
+                        "model": model,
+                        "prompt": prompt,
+                        "stream": False
+                    },
+                    timeout=10
+                )
             
             if response.status_code == 200:
                 result = response.json()
@@ -215,6 +217,10 @@ Search terms:"""
         
         return query
     
+    def suggest(self, query: str, limit: int = 8) -> List[Dict[str, Any]]:
+        """Search-as-you-type suggestions from the in-memory prefix index"""
+        return self.suggest_index.suggest(query, limit)
+    
     def combined_search(self, query: str, local_limit: int = 10, youtube_limit: int = 5) -> Dict[str, Any]:
         """Perform combined local + YouTube search"""
         
@@ -241,56 +247,29 @@ Search terms:"""
         }
     
     def get_recommendations(self, limit: int = 10) -> List[Dict[str, Any]]:
-        """Get music recommendations based on patterns"""
+        """Get music recommendations based on party selection history"""
+        try:
+            recommendations = self.recommender.recommend(limit)
+            if recommendations:
+                return recommendations
+        except Exception as e:
+            print(f"Recommender error: {e}")
+        
+        # Cold start: no selections yet, fall back to patterns / random picks
         patterns = self.db.get_music_patterns(limit=20)
         
         if not patterns:
-            # Return random popular songs from library
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
-            SELECT id, file_path, artist, album, title, year, genre
-            FROM music_library
-            ORDER BY RANDOM()
-            LIMIT ?
-            ''', (limit,))
-            
-            results = []
-            for row in cursor.fetchall():
-                song = dict(row)
-                song['source'] = 'local'
-                song['url'] = f"/media/music/{os.path.basename(song['file_path'])}"
-                results.append(song)
-            
-            conn.close()
-            return results
+            # Return random songs from library
+            return self.sampler.sample(limit)
         
-        # Use patterns to find similar music
-        # This is a simplified version - could be enhanced with ML
-        popular_artists = [p['pattern_value'] for p in patterns if p['pattern_type'] == 'artist'][:5]
+        # Use patterns to find similar music, weighted by how often each artist was picked
+        artist_patterns = [p for p in patterns if p['pattern_type'] == 'artist'][:5]
         
-        if not popular_artists:
+        if not artist_patterns:
             return []
         
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        
-        # Find songs by popular artists
-        placeholders = ','.join('?' * len(popular_artists))
-        cursor.execute(f'''
-        SELECT id, file_path, artist, album, title, year, genre
-        FROM music_library
-        WHERE artist IN ({placeholders})
-        ORDER BY RANDOM()
-        LIMIT ?
-        ''', popular_artists + [limit])
-        
-        results = []
-        for row in cursor.fetchall():
-            song = dict(row)
-            song['source'] = 'local'
-            song['url'] = f"/media/music/{os.path.basename(song['file_path'])}"
-            results.append(song)
-        
-        conn.close()
-        return results
\ No newline at end of file
+        return self.sampler.sample(
+            limit,
+            artist=[p['pattern_value'] for p in artist_patterns],
+            artist_weights={p['pattern_value']: p['frequency'] for p in artist_patterns}
+        )
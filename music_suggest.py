@@ -0,0 +1,214 @@
+"""
+Music Suggestion Index
+In-memory prefix trie over artist/title/album tokens for search-as-you-type
+"""
+
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from typing import List, Dict, Any, Optional, Tuple
+from database import PartyDatabase
+
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and strip accents so 'Valérie' matches 'valerie'"""
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into normalized alphanumeric tokens"""
+    return _TOKEN_RE.findall(normalize_text(text))
+
+
+class _TrieNode:
+    """Trie node holding its children and the best entries of its subtree"""
+    __slots__ = ('children', 'entries', 'top')
+
+    def __init__(self):
+        self.children: Dict[str, '_TrieNode'] = {}
+        self.entries: List[int] = []  # entry ids whose token ends exactly here
+        self.top: Tuple[int, ...] = ()  # best entry ids in this subtree
+
+
+class MusicSuggestIndex:
+    """Prefix index of library suggestions weighted by music_patterns frequency"""
+
+    def __init__(self, db: PartyDatabase, top_k: int = 32, refresh_interval: float = 60.0):
+        self.db = db
+        self.top_k = top_k  # candidates kept per node, more than we ever return
+        self.refresh_interval = refresh_interval
+        # (root, entries, entry_tokens) swapped as one reference so readers never mix builds
+        self._state: Tuple[_TrieNode, List[Dict[str, Any]], List[frozenset]] = (_TrieNode(), [], [])
+        self._signature = None
+        self._last_check = 0.0
+        self._build_lock = threading.Lock()
+        self._building = False
+        self._check_lock = threading.Lock()  # One lookup at a time checks the signature and starts a rebuild
+
+    def _get_signature(self) -> Tuple:
+        """Cheap fingerprint of the library and pattern tables"""
+        # Through PartyDatabase methods, so a cooperative proxy runs them off the event loop
+        return self.db.get_library_signature() + self.db.get_pattern_signature()
+
+    def _load_rows(self) -> Tuple[List[Any], Dict[Tuple[str, str], int]]:
+        """Load library rows and pattern frequencies"""
+        rows = [(artist, album, title) for _, artist, album, title, _, _ in self.db.get_library_index()]
+
+        frequencies = {}
+        for pattern_type, pattern_value, frequency in self.db.get_pattern_frequencies():
+            key = (pattern_type, normalize_text(pattern_value))
+            frequencies[key] = frequencies.get(key, 0) + (frequency or 0)
+
+        return rows, frequencies
+
+    def build(self) -> int:
+        """Build a fresh trie from music_library and swap it in"""
+        signature = self._get_signature()
+        rows, frequencies = self._load_rows()
+
+        # Collapse duplicate suggestions and count how often each appears
+        entries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+        def add_entry(kind: str, text: str, artist: Optional[str], weight: float):
+            key = (kind, normalize_text(text) + '\0' + normalize_text(artist or ''))
+            entry = entries.get(key)
+            if entry is None:
+                entries[key] = {'text': text, 'type': kind, 'artist': artist, 'weight': weight}
+            else:
+                entry['weight'] += weight
+
+        for artist, album, title in rows:
+            artist_weight = frequencies.get(('artist', normalize_text(artist)), 0) if artist else 0
+            if artist:
+                add_entry('artist', artist, None, 1 + artist_weight * 10)
+            if title:
+                add_entry('track', title, artist, 1 + artist_weight)
+            if album:
+                add_entry('album', album, artist, 1 + artist_weight)
+
+        entry_list = list(entries.values())
+        root = _TrieNode()
+        entry_tokens = []
+
+        for entry_id, entry in enumerate(entry_list):
+            tokens = tokenize(entry['text'])
+            entry_tokens.append(frozenset(tokens))
+            for token in set(tokens):
+                node = root
+                for char in token:
+                    child = node.children.get(char)
+                    if child is None:
+                        child = node.children[char] = _TrieNode()
+                    node = child
+                node.entries.append(entry_id)
+
+        self._compute_top(root, entry_list)
+
+        self._state = (root, entry_list, entry_tokens)
+        self._signature = signature
+        self._last_check = time.monotonic()
+        return len(entry_list)
+
+    def _compute_top(self, root: _TrieNode, entries: List[Dict[str, Any]]):
+        """Precompute the best entries under every node (iterative post-order)"""
+        weight = lambda entry_id: entries[entry_id]['weight']
+        stack = [(root, False)]
+        while stack:
+            node, children_done = stack.pop()
+            if not children_done:
+                stack.append((node, True))
+                for child in node.children.values():
+                    stack.append((child, False))
+                continue
+
+            candidates = set(node.entries)
+            for child in node.children.values():
+                candidates.update(child.top)
+            node.top = tuple(heapq.nlargest(self.top_k, candidates, key=weight))
+
+    def _ensure_fresh(self):
+        """Rebuild when the library or patterns changed (checked at most every refresh_interval)"""
+        if self._signature is None:
+            with self._build_lock:
+                if self._signature is None:
+                    self.build()
+            return
+
+        # Lookups arriving while another one checks keep serving the current trie
+        if not self._check_lock.acquire(blocking=False):
+            return
+        try:
+            now = time.monotonic()
+            if now - self._last_check < self.refresh_interval or self._building:
+                return
+            self._last_check = now
+
+            try:
+                if self._get_signature() == self._signature:
+                    return
+            except Exception as e:
+                print(f"Suggest index signature error: {e}")
+                return
+
+            # Serve the current trie while a new one is built in the background
+            self._building = True
+            threading.Thread(target=self._background_build, daemon=True).start()
+        finally:
+            self._check_lock.release()
+
+    def _background_build(self):
+        try:
+            with self._build_lock:
+                self.build()
+        except Exception as e:
+            print(f"Suggest index rebuild error: {e}")
+        finally:
+            self._building = False
+
+    def invalidate(self):
+        """Force a signature check on the next lookup"""
+        self._last_check = 0.0
+
+    def suggest(self, query: str, limit: int = 8) -> List[Dict[str, Any]]:
+        """Return the top suggestions whose tokens start with the query words"""
+        tokens = tokenize(query)
+        if not tokens or limit <= 0:
+            return []
+
+        self._ensure_fresh()
+
+        root, entries, entry_tokens = self._state
+
+        # Walk down the trie for the last (possibly partial) word
+        node = root
+        for char in tokens[-1]:
+            node = node.children.get(char)
+            if node is None:
+                return []
+
+        # Earlier words are complete, so they must appear in the suggestion
+        required = tokens[:-1]
+        results = []
+        for entry_id in node.top:
+            if required:
+                candidate_tokens = entry_tokens[entry_id]
+                if not all(any(t.startswith(word) for t in candidate_tokens) for word in required):
+                    continue
+            entry = entries[entry_id]
+            results.append({
+                'text': entry['text'],
+                'type': entry['type'],
+                'artist': entry['artist']
+            })
+            if len(results) >= limit:
+                break
+
+        return results
@@ -0,0 +1,95 @@
+"""
+Blocking Call Offload
+Under eventlet or gevent, runs blocking sqlite, HTTP and yt-dlp calls on a real thread pool
+so they don't stall the event loop; in the threaded dev server calls run inline
+"""
+
+import os
+import threading
+from collections import deque
+from typing import Callable, Any
+
+ASYNC_MODES = ('threading', 'eventlet', 'gevent')
+
+_async_mode = os.environ.get('PARTY_ASYNC_MODE', 'threading')
+
+
+def async_mode() -> str:
+    """Server concurrency model the app was started with"""
+    return _async_mode
+
+
+def set_async_mode(mode: str):
+    """Select the concurrency model; serve.py does this before importing the app"""
+    global _async_mode
+    if mode not in ASYNC_MODES:
+        raise ValueError(f"Unknown async mode {mode!r}, expected one of {', '.join(ASYNC_MODES)}")
+    _async_mode = mode
+
+
+def run_blocking(func: Callable, *args, **kwargs) -> Any:
+    """Call func on the async library's OS thread pool, yielding to other clients meanwhile"""
+    if _async_mode == 'eventlet':
+        from eventlet import tpool
+        return tpool.execute(func, *args, **kwargs)
+    if _async_mode == 'gevent':
+        import gevent
+        return gevent.get_hub().threadpool.apply(func, args, kwargs)
+    return func(*args, **kwargs)
+
+
+def run_blocking_with_progress(func: Callable, progress: Callable, *args, poll_interval: float = 0.25) -> Any:
+    """run_blocking for calls taking a trailing progress callback; progress is delivered on the event loop"""
+    if _async_mode == 'threading':
+        return func(*args, progress)
+
+    # The pool thread must not touch green locks or sockets, so it only queues updates
+    updates = deque()
+    outcome = {}
+
+    def call():
+        try:
+            outcome['value'] = run_blocking(func, *args, lambda *update: updates.append(update))
+        except BaseException as e:
+            outcome['error'] = e
+
+    waiter = threading.Thread(target=call, daemon=True)  # A green thread once monkey-patched
+    waiter.start()
+    while waiter.is_alive():
+        waiter.join(poll_interval)
+        while updates:
+            progress(*updates.popleft())
+    while updates:
+        progress(*updates.popleft())
+
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome.get('value')
+
+
+class CooperativeDatabase:
+    """PartyDatabase proxy whose query methods run through run_blocking"""
+
+    # Connections are bound to the thread that opened them, so callers keep theirs
+    PASSTHROUGH = ('get_connection',)
+
+    def __init__(self, db):
+        self._db = db
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._db, name)
+        if not callable(attr) or name in self.PASSTHROUGH or name.startswith('_'):
+            return attr
+
+        def cooperative(*args, **kwargs):
+            return run_blocking(attr, *args, **kwargs)
+        cooperative.__name__ = name
+        cooperative.__doc__ = attr.__doc__
+        return cooperative
+
+
+def cooperative_database(db):
+    """Wrap db for the event loop, or return it unchanged in threading mode"""
+    if _async_mode == 'threading':
+        return db
+    return CooperativeDatabase(db)
@@ -0,0 +1,135 @@
+"""
+Party Logging
+Queued logging for the party server: request threads only enqueue records, and a background
+listener writes them to a rotating log file (plain text or JSON lines) and the console.
+Configured from PARTY_LOG_* environment variables
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+from datetime import datetime
+from typing import Dict, Optional
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+DEFAULT_MAX_MB = 10  # Per file before it is rotated
+DEFAULT_BACKUPS = 5
+# Attributes every LogRecord has; anything else was passed with extra= and goes into JSON lines
+STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and any extra= fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in STANDARD_ATTRS and not name.startswith('_'):
+                entry[name] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class PartyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener, so the caller only pays for the enqueue"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(vars(record))  # Copy; other handlers may still see the original
+        record.msg = record.getMessage()  # Merge args now, while they are what the caller meant
+        record.args = None
+        if record.exc_info:
+            # Tracebacks hold frames; render them here rather than keep them alive in the queue
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def parse_levels(spec: str) -> Dict[str, int]:
+    """'music_search=DEBUG,werkzeug=WARNING' as logger names and levels"""
+    levels = {}
+    for part in (spec or '').split(','):
+        if '=' not in part:
+            continue
+        name, level = (piece.strip() for piece in part.split('=', 1))
+        value = logging.getLevelName(level.upper())
+        if name and isinstance(value, int):
+            levels[name] = value
+        else:
+            print(f"⚠️  Ignoring log level setting {part.strip()!r}")
+    return levels
+
+
+def file_handler(log_file: str, max_bytes: int, backups: int, when: str = None) -> logging.Handler:
+    """Log file rotated by size, or by time when given an interval like 'midnight' or 'H'"""
+    log_dir = os.path.dirname(log_file)
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+    if when:
+        return logging.handlers.TimedRotatingFileHandler(log_file, when=when, backupCount=backups,
+                                                         encoding='utf-8', delay=True)
+    return logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backups,
+                                                encoding='utf-8', delay=True)
+
+
+def setup_logging(log_file: str = None, level: str = None, json_lines: bool = None,
+                  levels: Dict[str, int] = None, console: bool = True) -> logging.handlers.QueueListener:
+    """Route the root logger through a queue to a background file and console writer"""
+    global _listener
+    env = os.environ
+    log_file = log_file or env.get('PARTY_LOG_FILE', 'party-wall.log')
+    level = (level or env.get('PARTY_LOG_LEVEL', 'INFO')).upper()
+    if json_lines is None:
+        json_lines = env.get('PARTY_LOG_JSON', '').lower() in ('1', 'true', 'yes')
+    levels = levels if levels is not None else parse_levels(env.get('PARTY_LOG_LEVELS', ''))
+
+    stop_logging()  # Reconfiguring replaces the previous listener
+
+    target = file_handler(log_file, int(float(env.get('PARTY_LOG_MAX_MB', DEFAULT_MAX_MB)) * 1024 * 1024),
+                          int(env.get('PARTY_LOG_BACKUPS', DEFAULT_BACKUPS)), env.get('PARTY_LOG_ROTATE_WHEN'))
+    target.setFormatter(JsonFormatter() if json_lines else logging.Formatter(TEXT_FORMAT))
+    handlers = [target]
+    if console:
+        stream = logging.StreamHandler()
+        stream.setFormatter(logging.Formatter(TEXT_FORMAT))
+        handlers.append(stream)
+
+    log_queue = queue.SimpleQueue()  # Unbounded: a burst waits in memory, never in the request
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(PartyQueueHandler(log_queue))
+    root.setLevel(level)
+    for name, module_level in levels.items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Flush queued records and stop the background writer"""
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    listener.stop()  # Drains the queue before returning
+    for handler in listener.handlers:
+        handler.close()
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,167 @@
+"""
+Queue Prefetcher
+Readies the next few queue songs before their turn: copies NAS library files to a local LRU cache
+and re-downloads YouTube songs whose file has gone missing
+"""
+
+import os
+import re
+import shutil
+import threading
+from typing import Dict, Optional, Set
+
+from database import PartyDatabase, cached_media_name, is_party_media, is_under_root
+from offload import run_blocking
+
+_VIDEO_ID_STEM_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+
+
+class QueuePrefetcher:
+    """Background stage that warms the next `lookahead` songs of the music queue"""
+
+    def __init__(self, db: PartyDatabase, cache_dir: str = 'media/cache/music', lookahead: int = 3,
+                 max_cache_bytes: int = 2 * 1024 * 1024 * 1024, download_jobs=None,
+                 poll_interval: float = 15.0, music_root: Optional[str] = None):
+        self.db = db
+        self.cache_dir = cache_dir
+        self.lookahead = lookahead
+        self.max_cache_bytes = max_cache_bytes
+        self.download_jobs = download_jobs  # DownloadJobManager for re-downloads, optional
+        self.poll_interval = poll_interval
+        self.music_root = music_root  # Unindexed files under it may be queued too
+        self._sources: Dict[str, str] = {}  # cache name -> original library path
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {'copied': 0, 'hits': 0, 'redownloads': 0, 'evicted': 0, 'errors': 0}
+
+    def is_library_path(self, path: str) -> bool:
+        """True for indexed library tracks and files under music_root; nothing else is copied or served"""
+        if self.music_root and is_under_root(path, self.music_root):
+            return True
+        return self.db.is_library_track(path)
+
+    def prefetch_upcoming(self) -> Dict[str, int]:
+        """Make sure the next songs are local; returns this pass's counts"""
+        counts = {'copied': 0, 'hits': 0, 'redownloads': 0}
+        protected: Set[str] = set()
+
+        for song in self.db.get_upcoming_queue(self.lookahead):
+            path = song['song_path']
+            if is_party_media(path):
+                if not os.path.exists(path) and self._redownload(path):
+                    counts['redownloads'] += 1
+                continue
+
+            if not self.is_library_path(path):
+                print(f"⚠️  Not prefetching {path}: not in the music library")
+                continue
+
+            name = cached_media_name(path)
+            protected.add(name)
+            with self._lock:
+                self._sources[name] = path
+            target = os.path.join(self.cache_dir, name)
+            if os.path.exists(target):
+                os.utime(target)  # Refresh LRU position
+                counts['hits'] += 1
+            elif self._copy(path, target):
+                counts['copied'] += 1
+
+        self.evict(protected)
+        for key, value in counts.items():
+            self.stats[key] += value
+        return counts
+
+    def _copy(self, source: str, target: str) -> bool:
+        """Copy a library file into the cache atomically"""
+        partial = target + '.part'
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            run_blocking(shutil.copyfile, source, partial)  # NAS reads are slow disk I/O
+            os.replace(partial, target)
+            return True
+        except OSError as e:
+            print(f"⚠️  Prefetch copy failed for {source}: {e}")
+            self.stats['errors'] += 1
+            if os.path.exists(partial):
+                os.unlink(partial)
+            return False
+
+    def _redownload(self, path: str) -> bool:
+        """Fetch a downloaded YouTube song again if its file was removed"""
+        video_id = os.path.splitext(os.path.basename(path))[0]
+        if self.download_jobs is None or not _VIDEO_ID_STEM_RE.match(video_id):
+            return False
+        return self.download_jobs.prefetch(video_id)
+
+    def evict(self, protected: Optional[Set[str]] = None) -> int:
+        """Delete least recently used cache files until under max_cache_bytes"""
+        protected = protected or set()
+        try:
+            entries = [entry for entry in os.scandir(self.cache_dir)
+                       if entry.is_file() and not entry.name.endswith('.part')]
+        except FileNotFoundError:
+            return 0
+
+        files = sorted(((entry.stat().st_mtime, entry.stat().st_size, entry.name) for entry in entries))
+        total = sum(size for _, size, _ in files)
+        evicted = 0
+        for _, size, name in files:
+            if total <= self.max_cache_bytes:
+                break
+            if name in protected:
+                continue
+            try:
+                os.unlink(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        self.stats['evicted'] += evicted
+        return evicted
+
+    def resolve(self, name: str) -> Optional[str]:
+        """Path to serve for a cache name: the cached copy, or the queued original on a miss"""
+        target = os.path.join(self.cache_dir, os.path.basename(name))
+        if os.path.exists(target):
+            os.utime(target)
+            return target
+
+        with self._lock:
+            source = self._sources.get(name)
+        if source is None:
+            # Not seen by this worker's prefetch pass, or evicted: only queued songs and the one
+            # playing (already marked played) may be read through
+            source = self.db.find_queue_song_by_cache_name(os.path.basename(name))
+        if source and os.path.exists(source) and self.is_library_path(source):
+            return source
+        return None
+
+    def _run(self):
+        """Worker loop: prefetch on wake-up or every poll_interval"""
+        while not self._stop.is_set():
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            try:
+                self.prefetch_upcoming()
+            except Exception as e:
+                print(f"❌ Prefetcher error: {e}")
+
+    def wake(self):
+        """Prefetch soon; starts the worker on first use"""
+        with self._lock:  # Concurrent queue changes must not start a second worker
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='queue-prefetcher', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self, wait: bool = False):
+        """Stop the worker thread, optionally waiting for its current pass to finish"""
+        self._stop.set()
+        self._wake.set()
+        with self._lock:
+            thread = self._thread
+        if wait and thread is not None:
+            thread.join()
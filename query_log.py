@@ -0,0 +1,228 @@
+"""
+Query Log
+Opt-in SQLite statement profiling for PartyDatabase: every execute is timed and its rows counted,
+statements over a threshold are logged with their EXPLAIN QUERY PLAN, and per-statement totals
+are kept for a top-N report. Enable with PARTY_SLOW_QUERY_MS=<threshold in milliseconds>
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+# Statements EXPLAIN QUERY PLAN can describe; pragmas, DDL and transactions are only timed
+EXPLAINABLE = ('select', 'insert', 'update', 'delete', 'replace', 'with')
+_WHITESPACE = re.compile(r'\s+')
+_PLACEHOLDER_LIST = re.compile(r'\?(?:\s*,\s*\?)+')
+
+
+def normalize_sql(sql: str) -> str:
+    """Statement text used to aggregate: one line, variable-length IN lists collapsed"""
+    return _PLACEHOLDER_LIST.sub('?, ...', _WHITESPACE.sub(' ', sql).strip())
+
+
+def full_scans(plan: List[str]) -> List[str]:
+    """Plan lines that read a whole table without an index"""
+    scans = []
+    for line in plan:
+        if line.startswith('SCAN ') and 'USING' not in line and 'VIRTUAL TABLE' not in line \
+                and line != 'SCAN CONSTANT ROW':
+            scans.append(line)
+    return scans
+
+
+class QueryLog:
+    """Statement timings for one process: slow statements with plans, and totals per statement"""
+
+    def __init__(self, threshold_ms: float = 100.0, top_n: int = 20, keep: int = 100):
+        self.threshold_ms = threshold_ms
+        self.top_n = top_n
+        self.slow = deque(maxlen=keep)  # Most recent slow statements, newest last
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional['QueryLog']:
+        """A log using PARTY_SLOW_QUERY_MS as its threshold, or None when profiling is off"""
+        value = os.environ.get('PARTY_SLOW_QUERY_MS')
+        if not value:
+            return None
+        try:
+            return cls(threshold_ms=float(value))
+        except ValueError:
+            print(f"⚠️  Ignoring PARTY_SLOW_QUERY_MS={value!r}: not a number")
+            return None
+
+    def record(self, conn: sqlite3.Connection, sql: str, params: Any, seconds: float, rows: int,
+               explain: bool = True):
+        """Add one finished statement; explain and log it when over the threshold"""
+        key = normalize_sql(sql)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = {'sql': key, 'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0}
+            stats['calls'] += 1
+            stats['total_ms'] += seconds * 1000
+            stats['max_ms'] = max(stats['max_ms'], seconds * 1000)
+            stats['rows'] += rows
+
+        if seconds * 1000 < self.threshold_ms:
+            return
+        plan = self.explain(conn, sql, params) if explain else []
+        entry = {'sql': key, 'ms': round(seconds * 1000, 3), 'rows': rows, 'plan': plan,
+                 'full_scans': full_scans(plan), 'at': time.time()}
+        with self._lock:
+            self.slow.append(entry)
+        print(f"⚠️  Slow query ({entry['ms']:.1f} ms, {rows} rows): {key}")
+        if plan:
+            print(f"   Plan: {' | '.join(plan)}")
+
+    @staticmethod
+    def explain(conn: sqlite3.Connection, sql: str, params: Any = ()) -> List[str]:
+        """EXPLAIN QUERY PLAN lines for a statement, or an empty list for ones it cannot describe"""
+        if not sql.lstrip().lower().startswith(EXPLAINABLE):
+            return []
+        try:
+            # A plain cursor, so explaining is not itself recorded
+            cursor = sqlite3.Cursor(conn)
+            plan = [row[3] for row in cursor.execute('EXPLAIN QUERY PLAN ' + sql, params or ())]
+            cursor.close()
+            return plan
+        except sqlite3.Error as e:
+            return [f'unavailable: {e}']
+
+    def top(self, n: int = None, by: str = 'total_ms') -> List[Dict[str, Any]]:
+        """Statements with the largest total time (or calls, max_ms, rows), with their average"""
+        with self._lock:
+            stats = [dict(s) for s in self._stats.values()]
+        stats.sort(key=lambda s: s[by], reverse=True)
+        for s in stats:
+            s['avg_ms'] = round(s['total_ms'] / s['calls'], 3)
+            s['total_ms'] = round(s['total_ms'], 3)
+            s['max_ms'] = round(s['max_ms'], 3)
+        return stats[:n or self.top_n]
+
+    def report(self) -> Dict[str, Any]:
+        """Threshold, top statements and recent slow statements"""
+        with self._lock:
+            slow = list(self.slow)
+        return {'threshold_ms': self.threshold_ms, 'top': self.top(), 'slow': slow}
+
+    def reset(self):
+        """Forget all totals and slow statements"""
+        with self._lock:
+            self._stats.clear()
+            self.slow.clear()
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Cursor timing each statement from execute through its last fetch"""
+
+    def __init__(self, connection):
+        super().__init__(connection)
+        self._statement = None  # [sql, params, seconds, rows] until the statement is finished
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        start = time.perf_counter()
+        super().execute(sql, parameters)
+        self._statement = [sql, parameters, time.perf_counter() - start, 0]
+        if self.description is None:
+            self._finish()  # Writes, DDL and pragmas without results are done once executed
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        start = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        self._record(sql, (), time.perf_counter() - start, max(self.rowcount, 0), explain=False)
+        return self
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(0 if row is None else 1, time.perf_counter() - start, done=row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(len(rows), time.perf_counter() - start, done=not rows)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(len(rows), time.perf_counter() - start, done=True)
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(0, time.perf_counter() - start, done=True)
+            raise
+        self._fetched(1, time.perf_counter() - start, done=False)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def _fetched(self, rows: int, seconds: float, done: bool):
+        """Add fetch time and rows to the running statement"""
+        if self._statement is not None:
+            self._statement[2] += seconds
+            self._statement[3] += rows
+            if done:
+                self._finish()
+
+    def _finish(self):
+        """Record the running statement, if any"""
+        if self._statement is None:
+            return
+        sql, params, seconds, rows = self._statement
+        self._statement = None
+        if rows == 0 and self.rowcount > 0:
+            rows = self.rowcount  # Rows changed by INSERT, UPDATE or DELETE
+        self._record(sql, params, seconds, rows)
+
+    def _record(self, sql, params, seconds, rows, explain=True):
+        query_log = getattr(self.connection, 'query_log', None)
+        if query_log is not None:
+            query_log.record(self.connection, sql, params, seconds, rows, explain=explain)
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """Connection whose cursors, including the ones conn.execute creates, report to query_log"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.query_log: Optional[QueryLog] = None
+        # Cursors with a statement still being read; held so conn.execute(...).fetchone() is recorded too
+        self._open_cursors: List[ProfiledCursor] = []
+
+    def cursor(self, factory=ProfiledCursor):
+        cursor = super().cursor(factory)
+        if isinstance(cursor, ProfiledCursor):
+            self._open_cursors = [c for c in self._open_cursors if c._statement is not None]
+            self._open_cursors.append(cursor)
+        return cursor
+
+    def execute(self, sql, parameters=()):
+        # sqlite3 would create a plain cursor here
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        # Statements read only partly (fetchone on a multi-row result) are recorded as they stand
+        for cursor in self._open_cursors:
+            cursor._finish()
+        self._open_cursors = []
+        super().close()
@@ -0,0 +1,127 @@
+"""
+Music Queue Events
+Sequence-numbered queue deltas for Socket.IO clients, with replay and unplayed-window snapshots
+"""
+
+import json
+import threading
+import uuid
+from collections import deque
+from typing import Callable, Dict, Any, List, Optional
+
+from database import PartyDatabase
+
+DELTA_EVENT = 'music_delta'
+
+
+class QueueEventLog:
+    """Publishes added/removed/moved/played deltas; clients that see a gap replay or re-snapshot.
+    With shared_epoch the sequence and replay buffer live in the database, shared by all workers."""
+
+    def __init__(self, db: PartyDatabase, emit: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                 history: int = 256, shared_epoch: Optional[str] = None):
+        self.db = db
+        self.emit = emit
+        self.history = history
+        self.shared = shared_epoch is not None
+        # Changes on restart, so clients know to re-snapshot
+        self.epoch = shared_epoch if self.shared else uuid.uuid4().hex[:8]
+        self._seq = 0
+        self._history = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    @property
+    def seq(self) -> int:
+        """Sequence number of the latest delta"""
+        if self.shared:
+            return self.db.get_queue_event_bounds(self.epoch)[1]
+        return self._seq
+
+    def publish(self, op: str, **payload) -> Dict[str, Any]:
+        """Assign the next sequence number and emit one delta"""
+        with self._lock:
+            delta = {'epoch': self.epoch, 'op': op}
+            delta.update(payload)
+            if self.shared:
+                seq = self.db.append_queue_event(self.epoch, json.dumps(delta))
+                if seq % self.history == 0:
+                    self.db.prune_queue_events(seq - self.history)
+                delta['seq'] = seq
+            else:
+                self._seq += 1
+                delta['seq'] = self._seq
+                self._history.append(delta)
+            # Emitted under the lock so clients receive deltas in sequence order
+            if self.emit:
+                self.emit(DELTA_EVENT, delta)
+        return delta
+
+    def added(self, queue_ids: List[int]) -> Optional[Dict[str, Any]]:
+        """New songs entered the queue"""
+        if not queue_ids:
+            return None
+        songs = self.db.get_queue_songs(list(queue_ids))
+        if not songs:
+            return None
+        return self.publish('added', songs=songs)
+
+    def removed(self, queue_ids: List[int]) -> Optional[Dict[str, Any]]:
+        """Songs left the queue without being played"""
+        if not queue_ids:
+            return None
+        return self.publish('removed', ids=list(queue_ids))
+
+    def played(self, queue_ids: List[int]) -> Optional[Dict[str, Any]]:
+        """Songs were played and leave the unplayed window"""
+        if not queue_ids:
+            return None
+        return self.publish('played', ids=list(queue_ids))
+
+    def moved(self, positions: Dict[int, int]) -> Optional[Dict[str, Any]]:
+        """Songs changed queue_position"""
+        if not positions:
+            return None
+        return self.publish('moved', positions={str(queue_id): position
+                                                for queue_id, position in positions.items()})
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Unplayed window consistent with the current sequence number"""
+        with self._lock:
+            # Sequence first: a delta landing in between is re-applied, which clients tolerate
+            seq = self.seq
+            songs = self.db.get_queue_songs(unplayed_only=True)
+            return {
+                'epoch': self.epoch,
+                'seq': seq,
+                'songs': songs,
+                'unplayed_count': len(songs)
+            }
+
+    def since(self, seq: int) -> Optional[List[Dict[str, Any]]]:
+        """Deltas after seq, or None when they are no longer buffered (snapshot instead)"""
+        if self.shared:
+            return self._shared_since(seq)
+        with self._lock:
+            if seq > self._seq:
+                return None
+            if seq == self._seq:
+                return []
+            if not self._history or self._history[0]['seq'] > seq + 1:
+                return None
+            return [delta for delta in self._history if delta['seq'] > seq]
+
+    def _shared_since(self, seq: int) -> Optional[List[Dict[str, Any]]]:
+        """since() over the database replay buffer"""
+        first, last = self.db.get_queue_event_bounds(self.epoch)
+        if seq > last:
+            return None
+        if seq == last:
+            return []
+        if not first or first > seq + 1 or last - seq > self.history:
+            return None
+        deltas = []
+        for event in self.db.get_queue_events_since(self.epoch, seq, self.history):
+            delta = json.loads(event['payload'])
+            delta['seq'] = event['seq']
+            deltas.append(delta)
+        return deltas
@@ -0,0 +1,38 @@
+"""
+Memory Book Report
+Reads one /report page of uploads in small keyset batches while the template streams it out,
+so the page renders with flat memory however many uploads the party collected
+"""
+
+from typing import Any, Dict, Iterator, Optional
+
+REPORT_BATCH_SIZE = 100
+DEFAULT_PER_PAGE = 500
+MAX_PER_PAGE = 2000
+
+
+class ReportPage:
+    """One page of the report: its uploads, fetched lazily in batches, and where the next page starts"""
+
+    def __init__(self, db, after_id: int = None, per_page: int = DEFAULT_PER_PAGE,
+                 batch_size: int = REPORT_BATCH_SIZE):
+        self.db = db
+        self.per_page = max(1, min(per_page, MAX_PER_PAGE))
+        self.batch_size = batch_size
+        # Read the first batch now so database errors surface before the response starts streaming
+        self._first_batch = db.get_report_uploads(after_id, min(batch_size, self.per_page))
+        self.next_after: Optional[int] = None  # Cursor for the next page, known once the page is read
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        batch, count, last_id = self._first_batch, 0, None
+        while batch:
+            for upload in batch:
+                yield upload
+            count += len(batch)
+            last_id = batch[-1]['id']
+            if count >= self.per_page or len(batch) < self.batch_size:
+                break
+            batch = self.db.get_report_uploads(last_id, min(self.batch_size, self.per_page - count))
+
+        if count >= self.per_page and self.db.get_report_uploads(last_id, 1):
+            self.next_after = last_id
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Party Memory Wall Production Server
+Serves the app under eventlet or gevent so each guest connection is a cheap green thread
+instead of an OS thread of the Werkzeug dev server; --workers runs several app processes
+on consecutive ports that share the database and a message queue
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+from offload import ASYNC_MODES
+
+DEFAULT_MESSAGE_QUEUE = 'local:///tmp/party-wall-bus.sock'
+
+
+def patch_for(async_mode: str):
+    """Monkey-patch the standard library; must run before Flask, requests or sqlite are imported"""
+    if async_mode == 'eventlet':
+        import eventlet
+        eventlet.monkey_patch()
+    elif async_mode == 'gevent':
+        from gevent import monkey
+        monkey.patch_all()
+
+
+def nginx_upstream(server: str, port: int, workers: int) -> str:
+    """nginx upstream block with one server line per worker port"""
+    lines = [f"    server {server}:{port + index};" for index in range(workers)]
+    return "upstream party_app {\n    ip_hash;  # Socket.IO sessions must stay on one worker\n" \
+        + "\n".join(lines) + "\n}"
+
+
+def run_workers(args):
+    """Start the local broker and one app process per worker, and wait for them"""
+    message_queue = args.message_queue or DEFAULT_MESSAGE_QUEUE
+    broker = None
+    if message_queue.startswith('local://'):
+        from message_bus import LocalBroker
+        broker = LocalBroker(message_queue)
+        broker.start()
+
+    # Create and migrate the database once, before the workers race to do it
+    from database import PartyDatabase
+    PartyDatabase()
+
+    epoch = uuid.uuid4().hex[:8]
+    workers = []
+    for index in range(args.workers):
+        env = dict(os.environ, PARTY_MESSAGE_QUEUE=message_queue, PARTY_WORKER_INDEX=str(index),
+                   PARTY_CLUSTER_EPOCH=epoch)
+        workers.append(subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--async-mode', args.async_mode,
+             '--host', args.host, '--port', str(args.port + index)], env=env))
+
+    ports = ', '.join(str(args.port + index) for index in range(args.workers))
+    print(f"🧩 {args.workers} workers on ports {ports} sharing {message_queue}")
+    print("   Put them behind a sticky proxy so Socket.IO sessions stay put; nginx upstream block:")
+    print(nginx_upstream('127.0.0.1' if args.host == '0.0.0.0' else args.host, args.port, args.workers))
+    try:
+        while all(worker.poll() is None for worker in workers):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.wait(10)
+        if broker:
+            broker.stop()
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Run the Party Memory Wall server")
+    parser.add_argument("--async-mode", choices=ASYNC_MODES,
+                        default=os.environ.get('PARTY_ASYNC_MODE', 'eventlet'),
+                        help="eventlet/gevent for the party, threading for the dev server")
+    parser.add_argument("--host", default="0.0.0.0", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on (first worker)")
+    parser.add_argument("--workers", type=int, default=1, help="App processes, one per core")
+    parser.add_argument("--message-queue", default=os.environ.get('PARTY_MESSAGE_QUEUE'),
+                        help=f"Worker message queue URL (default {DEFAULT_MESSAGE_QUEUE}, or redis://...)")
+    parser.add_argument("--nginx-upstream", metavar="HOST",
+                        help="Print the nginx upstream block for --port and --workers on HOST, and exit")
+    args = parser.parse_args()
+
+    if args.nginx_upstream:
+        print(nginx_upstream(args.nginx_upstream, args.port, args.workers))
+        return
+
+    if args.workers > 1:
+        run_workers(args)
+        return
+
+    try:
+        patch_for(args.async_mode)
+    except ImportError:
+        print(f"❌ {args.async_mode} is not installed: pip install -r requirements.txt "
+              f"(or pip install {args.async_mode}), or run with --async-mode threading for development")
+        sys.exit(1)
+    os.environ['PARTY_ASYNC_MODE'] = args.async_mode
+
+    import offload
+    offload.set_async_mode(args.async_mode)
+    from app import app, socketio, PARTY_CONFIG
+
+    print("🎉 Starting Party Memory Wall Backend")
+    print(f"🎂 {PARTY_CONFIG['title']}")
+    print(f"⚡ Async mode: {args.async_mode} on http://{args.host}:{args.port}")
+
+    socketio.run(
+        app,
+        host=args.host,
+        port=args.port,
+        debug=False,
+        use_reloader=False,
+        log_output=False,
+        allow_unsafe_werkzeug=args.async_mode == 'threading'
+    )
+
+
+if __name__ == "__main__":
+    main()
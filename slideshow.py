@@ -0,0 +1,58 @@
+"""
+Slideshow Scheduler
+Hands the display the next few slides in rotation with their download sizes, so the TV preloads a
+small window instead of every photo at startup
+"""
+
+from typing import Any, Dict, List
+
+DEFAULT_MANIFEST_SIZE = 8  # Matches the display's photo queue
+MAX_MANIFEST_SIZE = 50
+MAX_PRELOAD_WINDOW = 3
+PRELOAD_BUDGET_BYTES = 12 * 1024 * 1024  # Decoded ahead on the TV, on top of the slide on screen
+
+
+class SlideshowScheduler:
+    """Walks the slideshow rotation newest first, wrapping around at the oldest upload"""
+
+    def __init__(self, db, max_window: int = MAX_PRELOAD_WINDOW, budget_bytes: int = PRELOAD_BUDGET_BYTES):
+        self.db = db
+        self.max_window = max_window
+        self.budget_bytes = budget_bytes
+
+    def upcoming(self, after: int = None, count: int = DEFAULT_MANIFEST_SIZE,
+                 total: int = None) -> List[Dict[str, Any]]:
+        """The count slides following upload after, or from the newest when after is None"""
+        if total is None:
+            total = self.db.count_slideshow_media()
+        count = max(0, min(count, MAX_MANIFEST_SIZE, total))  # Never the same slide twice in one manifest
+        if count == 0:
+            return []
+
+        items = self.db.get_slideshow_media(limit=count, after_id=after)
+        if len(items) < count:
+            # Past the oldest upload (or after was deleted): continue from the newest
+            items += self.db.get_slideshow_media(limit=count - len(items))
+        return items
+
+    def preload_window(self, items: List[Dict[str, Any]]) -> int:
+        """How many upcoming slides fit the preload budget, between 1 and max_window"""
+        window, spent = 0, 0
+        for item in items[:self.max_window]:
+            # Videos only fetch metadata and a poster ahead of time; their bytes stream while playing
+            if item['file_type'] == 'photo':
+                spent += item['bytes'] or 0
+            if window and spent > self.budget_bytes:
+                break
+            window += 1
+        return max(1, window)
+
+    def manifest(self, after: int = None, count: int = DEFAULT_MANIFEST_SIZE) -> Dict[str, Any]:
+        """Upcoming slides with URLs, byte sizes, dimensions and the suggested preload window"""
+        total = self.db.count_slideshow_media()
+        items = self.upcoming(after, count, total)
+        return {
+            'items': items,
+            'preload_window': self.preload_window(items),
+            'total_count': total,
+        }
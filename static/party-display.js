@@ -8,12 +8,18 @@ class PartyDisplay {
     constructor() {
         this.currentSlide = 0;
         this.slides = [];
+        this.manifestSize = 8; // Slides fetched per manifest, enough for the photo queue
+        this.preloadWindow = 2; // Upcoming slides decoded ahead, suggested by the server
+        this.nextManifest = null;
+        this.manifestRequest = null;
         this.slideInterval = 7000; // 7 seconds
         this.slideshowTimer = null;
         this.progressTimer = null;
         this.websocket = null;
         this.musicPlayer = null;
         this.musicQueueData = [];
+        this.musicQueueEpoch = null;
+        this.musicQueueSeq = 0;
         this.currentMusic = null;
         this.isPlaying = false;
         this.connectionRetryCount = 0;
@@ -77,14 +83,10 @@ class PartyDisplay {
         console.log('📡 Loading media content...');
         
         try {
-            const response = await fetch('/api/media');
-            
-            if (!response.ok) {
-                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
-            }
-            
-            const data = await response.json();
-            this.slides = data.media || [];
+            // Only the next few slides from the scheduler; their images load as they come up
+            const manifest = await this.fetchManifest();
+            this.slides = manifest.items || [];
+            this.nextManifest = null;
             
             console.log(`📷 Loaded ${this.slides.length} media items`);
             
@@ -122,6 +124,99 @@ class PartyDisplay {
         }
     }
 
+    async fetchManifest(after) {
+        const params = new URLSearchParams({ count: this.manifestSize });
+        if (after !== undefined) params.set('after', after);
+        
+        const response = await fetch(`/api/slideshow/manifest?${params}`);
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+        }
+        
+        const manifest = await response.json();
+        this.preloadWindow = manifest.preload_window || this.preloadWindow;
+        return manifest;
+    }
+
+    prefetchNextManifest() {
+        // Near the end of the held slides, fetch what follows and decode its first photos
+        if (this.nextManifest || this.manifestRequest || this.slides.length === 0) return;
+        
+        const last = this.slides[this.slides.length - 1];
+        this.manifestRequest = this.fetchManifest(last.upload_id)
+            .then(manifest => {
+                if (this.slides[this.slides.length - 1] !== last) return; // Reloaded meanwhile
+                this.nextManifest = manifest;
+                const needed = this.preloadWindow - (this.slides.length - this.currentSlide);
+                manifest.items.slice(0, Math.max(0, needed))
+                    .filter(slide => slide.file_type === 'photo')
+                    .forEach(slide => this.decodeImage(slide.url));
+            })
+            .catch(error => console.warn('⚠️ Failed to prefetch slideshow manifest:', error))
+            .finally(() => { this.manifestRequest = null; });
+    }
+
+    decodeImage(url) {
+        // Download and decode off-screen so the slide appears without a blank frame
+        const image = new Image();
+        image.src = url;
+        return (image.decode ? image.decode() : Promise.resolve()).catch(() => {});
+    }
+
+    preloadUpcoming() {
+        // The current slide and the next few hold their media; the rest hold nothing
+        this.slideshow.querySelectorAll('.slide[data-upload-id]').forEach(slideEl => {
+            const index = Number(slideEl.dataset.index);
+            const ahead = index - this.currentSlide;
+            if (ahead >= 0 && ahead <= this.preloadWindow) {
+                this.loadSlideMedia(slideEl, this.slides[index - 1], ahead === 0);
+            } else {
+                this.releaseSlideMedia(slideEl);
+            }
+        });
+        
+        if (this.slides.length - this.currentSlide < this.preloadWindow) {
+            this.prefetchNextManifest();
+        }
+    }
+
+    loadSlideMedia(slideEl, slide, immediate) {
+        if (!slide || slideEl.dataset.loaded) return;
+        slideEl.dataset.loaded = slide.url;
+        
+        if (slide.file_type === 'photo') {
+            const show = () => {
+                if (slideEl.dataset.loaded === slide.url) slideEl.style.backgroundImage = `url(${slide.url})`;
+            };
+            immediate ? show() : this.decodeImage(slide.url).then(show);
+        } else if (slide.file_type === 'video') {
+            const video = slideEl.querySelector('video');
+            if (!video) return;
+            if (slide.poster) video.poster = slide.poster;
+            if (!slide.hls_url || !this.attachHls(video, slide.hls_url)) {
+                video.src = slide.url;
+            }
+        }
+    }
+
+    releaseSlideMedia(slideEl) {
+        // Drop decoded photos and video buffers for slides that are no longer close
+        if (!slideEl.dataset.loaded) return;
+        delete slideEl.dataset.loaded;
+        
+        slideEl.style.backgroundImage = '';
+        const video = slideEl.querySelector('video');
+        if (video) {
+            if (video.hls) {
+                video.hls.destroy();
+                video.hls = null;
+            }
+            video.removeAttribute('src');
+            video.removeAttribute('poster');
+            video.load();
+        }
+    }
+
     async renderSlides() {
         console.log('🎨 Rendering slides...');
         
@@ -129,7 +224,11 @@ class PartyDisplay {
         
         // Clear existing slides except welcome slide
         const existingSlides = this.slideshow.querySelectorAll('.slide:not(#welcomeSlide)');
-        existingSlides.forEach(slide => slide.remove());
+        existingSlides.forEach(slide => {
+            const video = slide.querySelector('video');
+            if (video && video.hls) video.hls.destroy();
+            slide.remove();
+        });
         
         // Add new slides
         this.slides.forEach((slide, index) => {
@@ -150,13 +249,11 @@ class PartyDisplay {
         slideEl.setAttribute('data-index', index);
         slideEl.setAttribute('data-upload-id', slide.upload_id);
         
-        // Handle different media types
+        // Handle different media types; sources are attached by preloadUpcoming()
         if (slide.file_type === 'photo') {
-            slideEl.style.backgroundImage = `url(${slide.url})`;
             slideEl.classList.add('ken-burns-effect');
         } else if (slide.file_type === 'video') {
             const video = document.createElement('video');
-            video.src = slide.url;
             video.autoplay = false; // Will be enabled when slide becomes active
             video.muted = false;
             video.loop = false;
@@ -187,6 +284,23 @@ class PartyDisplay {
         return slideEl;
     }
 
+    attachHls(video, playlistUrl) {
+        // Long videos stream as HLS segments, buffering a few seconds ahead instead of the whole file
+        if (video.canPlayType('application/vnd.apple.mpegurl')) {
+            video.src = playlistUrl;
+            return true;
+        }
+        if (!window.Hls || !Hls.isSupported()) {
+            return false; // Plain MP4 fallback
+        }
+        const hls = new Hls({ autoStartLoad: false, maxBufferLength: 10, maxMaxBufferLength: 20 });
+        hls.loadSource(playlistUrl);
+        hls.attachMedia(video);
+        video.addEventListener('play', () => hls.startLoad(), { once: true });
+        video.hls = hls;
+        return true;
+    }
+
     nextSlide() {
         const totalSlides = this.slideshow.querySelectorAll('.slide').length;
         const uploadedSlidesCount = this.slides.length; // Actual uploaded content
@@ -210,15 +324,22 @@ class PartyDisplay {
         
         // Calculate next slide index (only cycle through uploaded content, skip welcome slide)
         if (this.currentSlide >= uploadedSlidesCount) {
-            this.currentSlide = 1; // Loop back to first uploaded slide
+            if (this.nextManifest) {
+                // Swap in the slides that follow in rotation, releasing the ones just shown
+                this.slides = this.nextManifest.items;
+                this.nextManifest = null;
+                this.renderSlides();
+            }
+            this.currentSlide = 1; // Loop back to first held slide
         } else {
             this.currentSlide++;
         }
         
         // Ensure we stay within uploaded slides range
-        if (this.currentSlide < 1 || this.currentSlide > uploadedSlidesCount) {
+        if (this.currentSlide < 1 || this.currentSlide > this.slides.length) {
             this.currentSlide = 1;
         }
+        this.preloadUpcoming();
         
         console.log(`📄 Advancing to slide ${this.currentSlide} of ${uploadedSlidesCount} uploaded slides`);
         
@@ -262,6 +383,7 @@ class PartyDisplay {
         
         // Calculate previous slide index
         this.currentSlide = this.currentSlide <= 0 ? totalSlides - 1 : this.currentSlide - 1;
+        this.preloadUpcoming();
         
         // Activate previous slide
         const prevSlideEl = this.slideshow.querySelector(`[data-index="${this.currentSlide}"], #welcomeSlide`);
@@ -307,6 +429,7 @@ class PartyDisplay {
         const targetSlide = allSlides[slideIndex];
         if (targetSlide) {
             this.currentSlide = slideIndex;
+            this.preloadUpcoming();
             targetSlide.classList.add('active');
             
             // Start video if this is a video slide
@@ -524,7 +647,7 @@ class PartyDisplay {
         
         try {
             // Use SocketIO instead of plain WebSocket
-            this.websocket = io();
+            this.websocket = io({ auth: { role: 'display' } });
             
             this.websocket.on('connect', () => {
                 console.log('✅ SocketIO connected');
@@ -532,14 +655,9 @@ class PartyDisplay {
                 this.updateConnectionStatus('connected', 'Connected');
             });
             
-            this.websocket.on('new_upload', (data) => {
-                console.log('📨 New upload received:', data);
-                this.handleNewUpload(data.data);
-            });
-            
-            this.websocket.on('music_update', (data) => {
-                console.log('🎵 Music update received:', data);
-                this.updateMusicQueue(data.data);
+            this.websocket.on('batch', (data) => {
+                // Broadcasts arrive coalesced; replay them in order
+                data.data.events.forEach(event => this.handleWebSocketMessage(event));
             });
             
             this.websocket.on('slideshow_update', (data) => {
@@ -587,12 +705,17 @@ class PartyDisplay {
             case 'new_upload':
                 this.handleNewUpload(data.data);
                 break;
-            case 'music_update':
-                this.updateMusicQueue(data.data);
+            case 'music_delta':
+                this.applyMusicDelta(data.data);
                 break;
             case 'slideshow_update':
                 this.handleSlideshowUpdate(data.data);
                 break;
+            case 'download_progress':
+                break;
+            case 'media_rendition':
+                this.applyMediaRendition(data.data);
+                break;
             case 'connected':
                 console.log('🎉 Connected to Party Memory Wall');
                 break;
@@ -619,22 +742,81 @@ class PartyDisplay {
         }
     }
 
-    updateMusicQueue(musicData) {
-        console.log('🎵 Music queue updated:', musicData);
+    applyMediaRendition(rendition) {
+        // A photo or video rendition finished; switch to it unless the original is playing
+        if (rendition.status !== 'ready' || rendition.kind === 'thumb') return; // Thumbnails are for the report
+        const slide = this.slides.find(s => s.upload_id == rendition.upload_id);
+        if (!slide) {
+            this.loadContent(); // A HEIC photo becomes showable once converted
+            return;
+        }
         
-        if (musicData.new_song) {
-            // Update now playing display
-            const songTitle = document.getElementById('songTitle');
-            const artistName = document.getElementById('artistName');
-            
-            if (songTitle) {
-                songTitle.textContent = musicData.new_song.title || 'New song added';
+        const slideEl = this.slideshow && this.slideshow.querySelector(`.slide[data-upload-id="${rendition.upload_id}"]`);
+        // Slides outside the preload window pick the rendition up when they are loaded
+        const video = slideEl && slideEl.dataset.loaded && slideEl.querySelector('video');
+        if (rendition.kind === 'display') {
+            slide.url = rendition.url;
+            if (slideEl && slideEl.dataset.loaded) {
+                this.decodeImage(rendition.url).then(() => {
+                    if (slideEl.dataset.loaded) {
+                        slideEl.dataset.loaded = rendition.url;
+                        slideEl.style.backgroundImage = `url(${rendition.url})`;
+                    }
+                });
             }
-            
-            if (artistName) {
-                artistName.textContent = `by ${musicData.new_song.guest_name || 'Anonymous'}`;
+        } else if (rendition.kind === 'poster') {
+            slide.poster = rendition.url;
+            if (video) video.poster = rendition.url;
+        } else if (rendition.kind === 'video') {
+            slide.url = rendition.url;
+            if (video && video.paused && !slide.hls_url) video.src = rendition.url;
+        } else if (rendition.kind === 'hls') {
+            slide.hls_url = rendition.url;
+            if (video && video.paused && !video.hls) {
+                video.removeAttribute('src');
+                if (!this.attachHls(video, rendition.url)) video.src = slide.url;
             }
         }
+        console.log(`🎞️ Using ${rendition.kind} rendition for upload ${rendition.upload_id}`);
+    }
+
+    applyMusicDelta(delta) {
+        // Deltas carry a sequence number; on a gap or server restart fall back to a fresh snapshot
+        if (delta.epoch !== this.musicQueueEpoch || delta.seq !== this.musicQueueSeq + 1) {
+            if (delta.epoch === this.musicQueueEpoch && delta.seq <= this.musicQueueSeq) {
+                return; // Already applied
+            }
+            console.log(`🎵 Music delta gap (have ${this.musicQueueSeq}, got ${delta.seq}), reloading queue`);
+            this.loadMusicQueue();
+            return;
+        }
+        this.musicQueueSeq = delta.seq;
+        
+        switch (delta.op) {
+            case 'added':
+                delta.songs.forEach(song => {
+                    if (song.played || this.musicQueueData.some(queued => queued.id === song.id)) return;
+                    this.musicQueueData.push(song);
+                });
+                this.musicQueueData.sort((a, b) => a.queue_position - b.queue_position);
+                break;
+            case 'removed':
+            case 'played':
+                this.musicQueueData = this.musicQueueData.filter(song => !delta.ids.includes(song.id));
+                break;
+            case 'moved':
+                this.musicQueueData.forEach(song => {
+                    const position = delta.positions[String(song.id)];
+                    if (position !== undefined) song.queue_position = position;
+                });
+                this.musicQueueData.sort((a, b) => a.queue_position - b.queue_position);
+                break;
+        }
+        
+        this.updateMusicQueueDisplay();
+        if (this.musicQueueData.length > 0 && !this.currentMusic) {
+            this.playNextMusic();
+        }
     }
 
     handleSlideshowUpdate(updateData) {
@@ -696,11 +878,13 @@ class PartyDisplay {
         if (volumeRange && this.audioPlayer) {
             volumeRange.addEventListener('input', (e) => {
                 const volume = e.target.value / 100;
-                this.audioPlayer.volume = volume;
+                this.baseVolume = volume;
+                this.applyTrackGain();
                 console.log('🔊 Volume set to:', Math.round(volume * 100) + '%');
             });
             
             // Set initial volume
+            this.baseVolume = 0.7;
             this.audioPlayer.volume = 0.7;
             volumeRange.value = 70;
         }
@@ -711,10 +895,14 @@ class PartyDisplay {
 
     async loadMusicQueue() {
         try {
-            const response = await fetch('/api/music/queue');
+            const response = await fetch('/api/music/queue/snapshot');
             if (response.ok) {
                 const queueData = await response.json();
-                this.musicQueueData = queueData.queue || [];
+                const currentId = this.currentMusic ? this.currentMusic.id : null;
+                this.musicQueueData = (queueData.songs || []).filter(song => song.id !== currentId);
+                this.musicQueueEpoch = queueData.epoch;
+                this.musicQueueSeq = queueData.seq;
+                this.updateMusicQueueDisplay();
                 console.log(`🎵 Loaded ${this.musicQueueData.length} songs in queue`);
                 
                 if (this.musicQueueData.length > 0 && !this.currentMusic) {
@@ -758,15 +946,18 @@ class PartyDisplay {
             await this.loadMusicQueue();
             if (this.musicQueueData.length === 0) {
                 console.log('🎵 No music in queue');
+                this.currentMusic = null; // Next added song starts playback
                 return;
             }
         }
         
         const nextSong = this.musicQueueData.shift(); // Remove from queue
         this.currentMusic = nextSong;
+        this.reportMusicPlayed(nextSong);
         
         if (this.audioPlayer && nextSong) {
-            this.audioPlayer.src = `/media/music/${nextSong.filename}`;
+            this.audioPlayer.src = nextSong.url || `/media/music/${nextSong.filename}`;
+            this.applyTrackGain();
             this.audioPlayer.play().catch(error => {
                 console.error('❌ Failed to play music:', error);
             });
@@ -781,12 +972,54 @@ class PartyDisplay {
             console.log('🎵 Now playing:', nextSong.song_title);
         }
         
-        // Auto-advance when song ends
+        this.preloadNextMusic();
+        
+        // Auto-advance when song ends (once per song, or every song played so far would advance)
         if (this.audioPlayer) {
             this.audioPlayer.addEventListener('ended', () => {
                 console.log('🎵 Song ended, playing next');
                 this.playNextMusic();
+            }, { once: true });
+        }
+    }
+
+    preloadNextMusic() {
+        // Buffer the upcoming song in the browser so the next track starts without a gap
+        const upcoming = this.musicQueueData[0];
+        if (!upcoming || !upcoming.url) return;
+        
+        if (!this.preloadPlayer) {
+            this.preloadPlayer = new Audio();
+            this.preloadPlayer.preload = 'auto';
+            this.preloadPlayer.muted = true;
+        }
+        if (this.preloadPlayer.dataset.url !== upcoming.url) {
+            this.preloadPlayer.dataset.url = upcoming.url;
+            this.preloadPlayer.src = upcoming.url;
+            this.preloadPlayer.load();
+        }
+    }
+
+    applyTrackGain() {
+        // Server-measured loudness gain; HTML audio volume can't exceed 1.0
+        if (!this.audioPlayer) return;
+        const base = this.baseVolume !== undefined ? this.baseVolume : 0.7;
+        const gain = (this.currentMusic && this.currentMusic.gain) || 1.0;
+        this.audioPlayer.volume = Math.min(1, Math.max(0, base * gain));
+    }
+
+    async reportMusicPlayed(song) {
+        // Lets the server advance the queue and the AI DJ plan ahead
+        if (!song || !song.id) return;
+        
+        try {
+            await fetch('/api/music/played', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ queue_id: song.id })
             });
+        } catch (error) {
+            console.error('❌ Failed to report played song:', error);
         }
     }
 
@@ -828,8 +1061,12 @@ class PartyDisplay {
             // Create thumbnail
             const thumbnail = document.createElement('div');
             thumbnail.className = 'photo-queue-thumbnail';
-            if (slide.file_type === 'photo') {
-                thumbnail.style.backgroundImage = `url(${slide.url})`;
+            const preloaded = i <= this.preloadWindow;
+            if (slide.file_type === 'photo' && preloaded) {
+                thumbnail.style.backgroundImage = `url(${slide.url})`; // Same URL as the decoded slide
+            } else if (slide.file_type === 'photo') {
+                thumbnail.textContent = '📷';
+                thumbnail.style.backgroundColor = 'rgba(255, 215, 0, 0.3)';
             } else {
                 thumbnail.textContent = '📹';
                 thumbnail.style.backgroundColor = 'rgba(255, 215, 0, 0.3)';
@@ -14,6 +14,7 @@ class PartyUpload {
         this.websocket = null;
         this.connectionRetryCount = 0;
         this.maxRetries = 3;
+        this.downloadJobs = new Map(); // job id -> { button, song, originalText }
         
         // Configuration from server
         this.config = {
@@ -156,7 +157,8 @@ class PartyUpload {
         try {
             this.websocket = io({
                 transports: ['polling', 'websocket'],
-                upgrade: true
+                upgrade: true,
+                auth: { role: 'uploader' }
             });
             
             this.websocket.on('connect', () => {
@@ -181,12 +183,14 @@ class PartyUpload {
             });
             
             // Listen for real-time updates
-            this.websocket.on('new_upload', (data) => {
-                console.log('📸 New upload notification:', data);
-            });
-            
-            this.websocket.on('music_update', (data) => {
-                console.log('🎵 Music update notification:', data);
+            this.websocket.on('batch', (data) => {
+                // Broadcasts arrive coalesced into batches
+                data.data.events.forEach(event => {
+                    // Only events for this guest's own downloads are sent to upload pages
+                    if (event.type === 'download_progress') {
+                        this.updateDownloadJob(event.data);
+                    }
+                });
             });
             
         } catch (error) {
@@ -702,30 +706,115 @@ class PartyUpload {
         this.searchButton = document.getElementById('searchButton');
         this.searchResults = document.getElementById('searchResults');
         this.searchLoading = document.getElementById('searchLoading');
+        this.searchSuggestions = document.getElementById('searchSuggestions');
+        this.suggestController = null;
         
         if (!this.musicSearchInput || !this.searchButton) {
             console.log('⚠️  Music search elements not found');
             return;
         }
         
-        // Add event listeners
-        this.searchButton.addEventListener('click', () => this.performMusicSearch());
+        // Add event listeners - only committed searches hit the full pipeline
+        this.searchButton.addEventListener('click', () => {
+            this.hideSuggestions();
+            this.performMusicSearch();
+        });
         this.musicSearchInput.addEventListener('keypress', (e) => {
             if (e.key === 'Enter') {
                 e.preventDefault();
+                this.hideSuggestions();
                 this.performMusicSearch();
             }
         });
         
-        // Add real-time search suggestions (debounced)
-        let searchTimeout;
+        // Add real-time search suggestions (debounced, served from the in-memory index)
+        let suggestTimeout;
         this.musicSearchInput.addEventListener('input', (e) => {
-            clearTimeout(searchTimeout);
+            clearTimeout(suggestTimeout);
             const query = e.target.value.trim();
-            if (query.length >= 3) {
-                searchTimeout = setTimeout(() => this.performMusicSearch(), 1000);
+            if (query.length >= 2) {
+                suggestTimeout = setTimeout(() => this.fetchSuggestions(query), 150);
+            } else {
+                this.hideSuggestions();
+            }
+        });
+        this.musicSearchInput.addEventListener('blur', () => {
+            // Delay so a tap on a suggestion still registers
+            setTimeout(() => this.hideSuggestions(), 200);
+        });
+    }
+
+    async fetchSuggestions(query) {
+        if (!this.searchSuggestions) return;
+        
+        // Cancel the previous keystroke's request
+        if (this.suggestController) {
+            this.suggestController.abort();
+        }
+        this.suggestController = new AbortController();
+        
+        try {
+            const response = await fetch(`/api/music/suggest?q=${encodeURIComponent(query)}&limit=6`, {
+                signal: this.suggestController.signal
+            });
+            
+            if (!response.ok) {
+                throw new Error(`Suggest failed: ${response.statusText}`);
             }
+            
+            const data = await response.json();
+            
+            // Ignore stale responses if the user kept typing
+            if (this.musicSearchInput.value.trim() !== query) return;
+            
+            this.displaySuggestions(data.suggestions || []);
+            
+        } catch (error) {
+            if (error.name !== 'AbortError') {
+                console.warn('⚠️ Music suggestions unavailable:', error);
+            }
+        }
+    }
+
+    displaySuggestions(suggestions) {
+        if (!this.searchSuggestions) return;
+        
+        if (suggestions.length === 0) {
+            this.hideSuggestions();
+            return;
+        }
+        
+        const icons = { artist: '🎤', track: '🎵', album: '💿' };
+        this.searchSuggestions.innerHTML = '';
+        
+        suggestions.forEach((suggestion) => {
+            const item = document.createElement('div');
+            item.className = 'search-suggestion';
+            item.innerHTML = `
+                <span class="suggestion-icon">${icons[suggestion.type] || '🎵'}</span>
+                <span class="suggestion-text">${this.escapeHtml(suggestion.text)}</span>
+                ${suggestion.artist ? `<span class="suggestion-artist">${this.escapeHtml(suggestion.artist)}</span>` : ''}
+            `;
+            
+            item.addEventListener('mousedown', (event) => {
+                event.preventDefault();
+                this.musicSearchInput.value = suggestion.artist && suggestion.type !== 'artist'
+                    ? `${suggestion.artist} ${suggestion.text}`
+                    : suggestion.text;
+                this.hideSuggestions();
+                this.performMusicSearch();
+            });
+            
+            this.searchSuggestions.appendChild(item);
         });
+        
+        this.searchSuggestions.style.display = 'block';
+    }
+
+    hideSuggestions() {
+        if (this.searchSuggestions) {
+            this.searchSuggestions.style.display = 'none';
+        }
     }
 
     async performMusicSearch() {
@@ -958,12 +1047,15 @@ class PartyUpload {
                 }
                 
                 const result = await response.json();
-                console.log('✅ YouTube music downloaded and queued:', result);
+                console.log('⏳ YouTube download queued:', result);
                 
-                if (button) {
-                    button.textContent = '✅ Downloaded!';
-                    button.className = 'add-btn added';
+                // Progress arrives over Socket.IO; polling covers a dropped connection
+                this.downloadJobs.set(result.job_id, { button, song, originalText });
+                if (this.websocket && this.websocket.connected) {
+                    this.websocket.emit('watch_download', { job_id: result.job_id });
                 }
+                this.updateDownloadJob({ id: result.job_id, status: result.status, progress: result.progress });
+                this.pollDownloadJob(result.job_id, result.status_url);
             }
             
         } catch (error) {
@@ -979,6 +1071,49 @@ class PartyUpload {
         }
     }
 
+    updateDownloadJob(job) {
+        const tracked = this.downloadJobs.get(job.id);
+        if (!tracked) return;
+        
+        const { button, song, originalText } = tracked;
+        if (job.status === 'completed') {
+            this.downloadJobs.delete(job.id);
+            console.log('✅ YouTube music downloaded and queued:', job);
+            if (button) {
+                button.textContent = '✅ Downloaded!';
+                button.className = 'add-btn added';
+            }
+        } else if (job.status === 'failed') {
+            this.downloadJobs.delete(job.id);
+            console.error('❌ YouTube download failed:', job.error);
+            this.showError(`Failed to add "${song.title}" to queue`);
+            if (button) {
+                button.textContent = originalText;
+                button.className = 'add-btn';
+                button.disabled = false;
+            }
+        } else if (button) {
+            const label = job.status === 'processing' ? 'Converting...'
+                : job.status === 'queued' ? 'Waiting...'
+                : `Downloading ${Math.round(job.progress || 0)}%`;
+            button.textContent = label;
+        }
+    }
+
+    async pollDownloadJob(jobId, statusUrl) {
+        while (this.downloadJobs.has(jobId)) {
+            await new Promise(resolve => setTimeout(resolve, 3000));
+            try {
+                const response = await fetch(statusUrl);
+                if (response.ok) {
+                    this.updateDownloadJob(await response.json());
+                }
+            } catch (error) {
+                console.warn('⚠️ Download status poll failed:', error);
+            }
+        }
+    }
+
     showNoResults() {
         if (!this.searchResults) return;
         
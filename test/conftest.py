@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Shared Test Fixtures
+Temporary party database used by the test modules
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tempfile
+import pytest
+from database import PartyDatabase
+
+
+@pytest.fixture
+def db():
+    """Temporary party database"""
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as temp_db:
+        temp_db_path = temp_db.name
+
+    db = PartyDatabase(temp_db_path)
+    yield db
+
+    for path in (temp_db_path, temp_db_path + '-wal', temp_db_path + '-shm'):
+        if os.path.exists(path):
+            os.unlink(path)
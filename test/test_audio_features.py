@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Test Audio Feature Extraction
+Tests tempo/loudness/energy on synthetic signals and feature storage
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+from audio_features import SAMPLE_RATE, analysis_offset, analyze_track, compute_features, ffmpeg_available
+
+
+def click_track(bpm, seconds=20, amplitude=0.8):
+    """Decaying noise bursts on every beat"""
+    samples = np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+    burst = np.random.default_rng(0).standard_normal(2000).astype(np.float32)
+    burst *= np.exp(-np.arange(2000) / 300.0).astype(np.float32) * amplitude
+    step = 60.0 / bpm * SAMPLE_RATE
+    position = 0.0
+    while int(position) + len(burst) < len(samples):
+        samples[int(position):int(position) + len(burst)] += burst
+        position += step
+    return samples
+
+
+@pytest.mark.parametrize("bpm", [90, 120, 128, 150])
+def test_tempo_estimation(bpm):
+    """Click tracks come back within 2 BPM"""
+    features = compute_features(click_track(bpm))
+    assert features['bpm'] == pytest.approx(bpm, abs=2)
+    assert features['danceability'] > 0.5
+    print(f"✅ Tempo test passed for {bpm} BPM")
+
+
+def test_loudness_and_energy_order():
+    """Louder material has higher loudness and energy"""
+    quiet = compute_features(click_track(120, amplitude=0.05))
+    loud = compute_features(click_track(120, amplitude=0.8))
+    assert loud['loudness_db'] > quiet['loudness_db']
+    assert loud['energy'] > quiet['energy']
+    print("✅ Loudness ordering test passed")
+
+
+def test_no_pulse_signals():
+    """A steady tone has no tempo and silence has no energy"""
+    t = np.arange(10 * SAMPLE_RATE) / SAMPLE_RATE
+    tone = compute_features(0.5 * np.sin(2 * np.pi * 440 * t))
+    assert tone['bpm'] is None
+    assert tone['danceability'] < 0.3
+
+    silence = compute_features(np.zeros(SAMPLE_RATE, dtype=np.float32))
+    assert silence == {'bpm': None, 'loudness_db': -100.0, 'energy': 0.0, 'danceability': 0.0}
+    print("✅ No-pulse test passed")
+
+
+def test_analysis_offset():
+    """The window is centred on long tracks and starts at 0 for short ones"""
+    assert analysis_offset(None) == 0.0
+    assert analysis_offset(20) == 0.0
+    assert analysis_offset(240, window=30) == 105.0
+    print("✅ Analysis offset test passed")
+
+
+def test_feature_storage(db):
+    """Features land in music_library and the track leaves the pending list"""
+    library_id = db.add_to_music_library(file_path="/music/a.mp3", artist="Queen", title="A", duration=200)
+    db.add_to_music_library(file_path="/music/b.mp3", artist="Queen", title="B")
+
+    pending = db.get_tracks_missing_features()
+    assert [t['file_path'] for t in pending] == ["/music/a.mp3", "/music/b.mp3"]
+    assert pending[0]['duration'] == 200
+
+    assert db.update_music_features(library_id, bpm=121.5, loudness_db=-12.0, energy=0.7, danceability=0.8)
+    assert [t['file_path'] for t in db.get_tracks_missing_features()] == ["/music/b.mp3"]
+    assert len(db.get_tracks_missing_features(limit=1)) == 1
+
+    conn = db.get_connection()
+    row = conn.execute('SELECT bpm, energy, features_at FROM music_library WHERE id = ?', (library_id,)).fetchone()
+    conn.close()
+    assert row['bpm'] == 121.5
+    assert row['energy'] == 0.7
+    assert row['features_at'] is not None
+    print("✅ Feature storage test passed")
+
+
+def test_failed_tracks_are_not_retried(db, monkeypatch):
+    """A track that cannot be decoded is marked analyzed without features and skipped next run"""
+    import music_indexer
+    monkeypatch.setattr(music_indexer, 'ffmpeg_available', lambda: True)
+    db.add_to_music_library(file_path="/music/missing.mp3", artist="Queen", title="Gone", duration=200)
+    indexer = music_indexer.MusicLibraryIndexer(library_path="/music", db_path=db.db_path)
+
+    assert indexer.extract_features(workers=1)['failed'] == 1
+    assert db.get_tracks_missing_features() == []
+    assert indexer.extract_features(workers=1)['total'] == 0
+
+    conn = db.get_connection()
+    row = conn.execute("SELECT energy, features_at FROM music_library WHERE file_path = '/music/missing.mp3'").fetchone()
+    conn.close()
+    assert row['energy'] is None and row['features_at'] is not None
+    print("✅ Failed feature track test passed")
+
+
+@pytest.mark.skipif(not ffmpeg_available(), reason="ffmpeg not installed")
+def test_decode_with_ffmpeg(tmp_path):
+    """A WAV written to disk round-trips through the ffmpeg decoder"""
+    import wave
+
+    samples = click_track(120, seconds=12)
+    path = tmp_path / "click.wav"
+    with wave.open(str(path), 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes((np.clip(samples, -1, 1) * 32767).astype('<i2').tobytes())
+
+    features = analyze_track(str(path), duration=12)
+    assert features['bpm'] == pytest.approx(120, abs=2)
+    assert analyze_track(str(tmp_path / "missing.wav")) is None
+    print("✅ ffmpeg decode test passed")
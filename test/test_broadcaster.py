@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Test Broadcast Dispatcher
+Tests batching, keyed coalescing, per-client rate caps and slow-client backlogs
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+from broadcaster import BroadcastDispatcher, BATCH_EVENT
+
+
+class RecordingEmit:
+    """Collects emitted batches as (recipient, [event types])"""
+
+    def __init__(self):
+        self.sent = []
+
+    def __call__(self, event, payload, to=None):
+        assert event == BATCH_EVENT
+        self.sent.append((to, payload['data']['events']))
+
+
+def make_dispatcher(**kwargs):
+    """Dispatcher with two display clients whose worker thread never starts"""
+    emit = RecordingEmit()
+    dispatcher = BroadcastDispatcher(emit, **kwargs)
+    dispatcher._start = lambda: None  # Tests flush by hand
+    dispatcher.add_client('a', rooms=['display'])
+    dispatcher.add_client('b', rooms=['display'])
+    return dispatcher, emit
+
+
+def test_burst_becomes_one_broadcast():
+    """Twenty uploads in one window go out as one batch to everyone"""
+    dispatcher, emit = make_dispatcher()
+    for i in range(20):
+        dispatcher.publish('new_upload', {'id': i})
+    assert dispatcher.stats()['queue_depth'] == 20
+
+    assert dispatcher.flush() == 1
+    recipient, events = emit.sent[0]
+    assert recipient == ['a', 'b']
+    assert [event['data']['id'] for event in events] == list(range(20))
+    assert dispatcher.stats()['queue_depth'] == 0
+    print("✅ Burst batching test passed")
+
+
+def test_keyed_events_are_merged():
+    """Progress updates for the same job collapse to the latest one, keeping order for the rest"""
+    dispatcher, emit = make_dispatcher()
+    dispatcher.publish('download_progress', {'progress': 10}, key='job1')
+    dispatcher.publish('music_delta', {'seq': 1})
+    dispatcher.publish('download_progress', {'progress': 60}, key='job1')
+    dispatcher.publish('music_delta', {'seq': 2})
+    dispatcher.flush()
+
+    events = emit.sent[0][1]
+    assert [event['type'] for event in events] == ['music_delta', 'download_progress', 'music_delta']
+    assert events[1]['data'] == {'progress': 60}
+    assert dispatcher.stats()['merged'] == 1
+    print("✅ Keyed merge test passed")
+
+
+def test_rate_limited_client_catches_up_later():
+    """A client without tokens keeps its events and receives them merged in its next batch"""
+    dispatcher, emit = make_dispatcher(max_rate=0.001, burst=100)
+    dispatcher._clients['b']['tokens'] = 0  # Slow client: refills far slower than the test runs
+
+    dispatcher.publish('new_upload', {'id': 1})
+    dispatcher.flush()
+    assert emit.sent == [('a', [{'type': 'new_upload', 'data': {'id': 1}}])]
+    assert dispatcher.stats()['client_backlog'] == 1
+
+    dispatcher._clients['b']['tokens'] = 1
+    dispatcher.publish('new_upload', {'id': 2})
+    dispatcher.flush()
+    sent_to_b = [events for recipient, events in emit.sent if recipient == 'b']
+    assert [event['data']['id'] for event in sent_to_b[0]] == [1, 2]
+    assert dispatcher.stats()['client_backlog'] == 0
+    print("✅ Rate limit test passed")
+
+
+def test_slow_client_backlog_is_bounded():
+    """Events beyond a stalled client's backlog cap are dropped and counted"""
+    dispatcher, emit = make_dispatcher(max_rate=0.001, max_client_backlog=5)
+    dispatcher._clients['b']['tokens'] = 0
+
+    for i in range(8):
+        dispatcher.publish('new_upload', {'id': i})
+    dispatcher.flush()
+
+    stats = dispatcher.stats()
+    assert stats['dropped'] == 3
+    assert stats['client_backlog'] == 5
+    assert [recipient for recipient, _ in emit.sent] == ['a']
+    print("✅ Slow client test passed")
+
+
+def test_events_go_to_their_rooms():
+    """Display events skip upload pages; download progress reaches only its followers"""
+    dispatcher, emit = make_dispatcher()
+    dispatcher.add_client('phone1', rooms=['uploader'])
+    dispatcher.add_client('phone2', rooms=['uploader'])
+    dispatcher.add_client('admin', rooms=['admin'])
+    dispatcher.join('phone2', 'download:job1')
+
+    dispatcher.publish('new_upload', {'id': 1}, rooms=('display', 'admin'))
+    dispatcher.publish('download_progress', {'progress': 50}, rooms=('download:job1', 'admin'))
+    dispatcher.publish('party_notice', {'text': 'Cake!'})  # No rooms: everyone
+    assert dispatcher.flush() == 4
+
+    received = {}
+    for recipients, events in emit.sent:
+        for sid in (recipients if isinstance(recipients, list) else [recipients]):
+            received[sid] = [event['type'] for event in events]
+    assert received == {
+        'a': ['new_upload', 'party_notice'],
+        'b': ['new_upload', 'party_notice'],
+        'phone1': ['party_notice'],
+        'phone2': ['download_progress', 'party_notice'],
+        'admin': ['new_upload', 'download_progress', 'party_notice'],
+    }
+    print("✅ Room routing test passed")
+
+
+def test_worker_delivers_without_blocking_publish():
+    """publish() returns immediately and the worker flushes after the window"""
+    emit = RecordingEmit()
+    dispatcher = BroadcastDispatcher(emit, window=0.05)
+    dispatcher.add_client('a')
+
+    started = time.perf_counter()
+    dispatcher.publish('new_upload', {'id': 1})
+    assert time.perf_counter() - started < 0.05
+
+    deadline = time.time() + 2
+    while not emit.sent and time.time() < deadline:
+        time.sleep(0.01)
+    dispatcher.stop()
+    assert emit.sent[0][1] == [{'type': 'new_upload', 'data': {'id': 1}}]
+    print("✅ Background delivery test passed")
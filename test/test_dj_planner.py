@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Test AI DJ Queue Planner
+Tests energy matching, no-repeat/artist-spacing constraints and incremental re-planning
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import numpy as np
+import pytest
+from music_sampler import LibrarySampler
+from dj_planner import DJPlanner, tempo_fit
+
+
+@pytest.fixture
+def db(db):
+    """Temporary party database with 300 analyzed tracks over 30 artists"""
+    conn = db.get_connection()
+    for i in range(300):
+        conn.execute('''
+        INSERT INTO music_library (file_path, artist, title, duration, bpm, energy, danceability, features_at)
+        VALUES (?, ?, ?, 200, ?, ?, 0.5, CURRENT_TIMESTAMP)
+        ''', (f"/music/{i}.mp3", f"Artist {i % 30}", f"Song {i}", 90 + (i % 60), (i % 100) / 100))
+    conn.commit()
+    conn.close()
+    return db
+
+
+@pytest.fixture
+def planner(db):
+    """Enabled planner without a recommender"""
+    planner = DJPlanner(db, LibrarySampler(db), lookahead=5, locked=1)
+    planner.set_enabled(True)
+    return planner
+
+
+def upcoming(db):
+    """Unplayed queue entries in play order"""
+    return [song for song in db.get_music_queue()['songs'] if not song['played']]
+
+
+def test_tempo_fit():
+    """Same tempo and half/double time fit best, unknown tempo is neutral"""
+    fit = tempo_fit(np.array([120.0, 240.0, 60.0, 150.0, np.nan]), 120.0)
+    assert fit[0] == pytest.approx(1.0)
+    assert fit[1] > fit[3] and fit[2] > fit[3]
+    assert fit[4] == 0.5
+    assert list(tempo_fit(np.array([100.0]), None)) == [0.5]
+    print("✅ Tempo fit test passed")
+
+
+def test_disabled_planner_does_nothing(db):
+    """replan is a no-op until AI DJ mode is enabled"""
+    planner = DJPlanner(db, LibrarySampler(db))
+    assert planner.replan() is None
+    assert upcoming(db) == []
+    print("✅ Disabled planner test passed")
+
+
+def test_fills_lookahead_with_constraints(db, planner):
+    """The queue is filled without repeats or back-to-back artists"""
+    plan = planner.replan()
+    songs = upcoming(db)
+
+    assert plan['added'] == 5
+    assert len(songs) == 5
+    assert all(song['dj_planned'] for song in songs)
+    assert len({song['song_path'] for song in songs}) == 5
+    assert len({song['artist'] for song in songs}) == 5
+    print("✅ Lookahead fill test passed")
+
+
+def test_energy_follows_upload_rate(db, planner):
+    """A busy upload minute raises the target energy of planned songs"""
+    quiet = planner.measure_party_energy()
+    for i in range(30):
+        db.add_upload(device_id=f"device-{i}", guest_name="Guest", file_path=f"/p/{i}.jpg", file_type='photo')
+    busy = planner.measure_party_energy()
+    assert busy > quiet
+
+    planner.plan()
+    conn = db.get_connection()
+    energies = [row[0] for row in conn.execute('''
+    SELECT ml.energy FROM music_queue mq JOIN music_library ml ON ml.id = mq.library_id
+    ''')]
+    conn.close()
+    assert np.mean(energies) > 0.6
+    print("✅ Energy target test passed")
+
+
+def test_incremental_replan_keeps_head_and_guest_picks(db, planner):
+    """A guest pick replaces only the DJ songs after the locked head; guest picks stay"""
+    planner.replan()
+    first = upcoming(db)
+
+    upload_id = db.add_upload(device_id='guest', guest_name='Valérie', file_path='/music/7.mp3', file_type='music')
+    guest_queue_id = db.add_to_music_queue(upload_id=upload_id, song_title='Song 7', artist='Artist 7')
+    plan = planner.replan(guest_pick=True)
+
+    songs = upcoming(db)
+    assert songs[0]['id'] == first[0]['id']  # Locked head survives
+    assert songs[1]['id'] == guest_queue_id  # Guest pick moves ahead of the new DJ tail
+    assert plan['removed'] == 4
+    assert len(songs) == 5
+
+    # Playing a song re-plans cheaply and never repeats what already played
+    db.mark_music_played(songs[0]['id'])
+    plan = planner.replan()
+    played_paths = {songs[0]['song_path']}
+    assert not any(song['song_path'] in played_paths for song in upcoming(db))
+    assert plan['took_ms'] < 250
+    print(f"✅ Incremental re-plan test passed ({plan['took_ms']} ms)")
+
+
+def test_track_change_keeps_planned_tail(db):
+    """Playing a song only appends; the prefetched head and the rest of the tail stay queued"""
+    planner = DJPlanner(db, LibrarySampler(db), lookahead=5)
+    planner.set_enabled(True)
+    planner.replan()
+    first = [song['id'] for song in upcoming(db)]
+
+    for played in range(3):
+        db.mark_music_played(first[played])
+        plan = planner.replan()
+        assert (plan['removed'], plan['added']) == (0, 1)
+    songs = [song['id'] for song in upcoming(db)]
+    assert songs[:2] == first[3:] and len(songs) == 5
+
+    # With the default lock, a guest pick leaves the next three (prefetched) songs in place
+    upload_id = db.add_upload(device_id='guest', guest_name='Sam', file_path='/music/9.mp3', file_type='music')
+    guest_queue_id = db.add_to_music_queue(upload_id=upload_id, song_title='Song 9', artist='Artist 9')
+    plan = planner.replan(guest_pick=True)
+    after = [song['id'] for song in upcoming(db)]
+    assert after[:3] == songs[:3] and after[3] == guest_queue_id
+    assert (plan['removed'], plan['added'], len(after)) == (2, 1, 5)
+    print("✅ Planned tail test passed")
+
+
+def test_workers_planning_at_once_respect_lookahead(db):
+    """Planners in two worker processes never fill the queue past lookahead together"""
+    worker_a = DJPlanner(db, LibrarySampler(db), lookahead=5)
+    worker_b = DJPlanner(db, LibrarySampler(db), lookahead=5)
+    worker_a.set_enabled(True)
+
+    # Worker B reads the empty queue, then worker A plans before B writes
+    fill = worker_b._fill
+    worker_b._fill = lambda *args: (worker_a.plan(), fill(*args))[1]
+    plan = worker_b.plan()
+
+    assert plan['added'] == 0
+    assert len(upcoming(db)) == 5
+    assert len({song['song_path'] for song in upcoming(db)}) == 5
+    print("✅ Concurrent workers test passed")
+
+
+def test_replan_latency(db, planner):
+    """A track change on a 10k library stays well under a frame budget"""
+    conn = db.get_connection()
+    conn.executemany('''
+    INSERT INTO music_library (file_path, artist, title, bpm, energy, danceability)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ''', [(f"/bulk/{i}.mp3", f"Bulk {i % 700}", f"Bulk {i}", 80 + i % 90, (i % 97) / 97, 0.5)
+          for i in range(10000)])
+    conn.commit()
+    conn.close()
+
+    planner.sampler.invalidate()
+    planner.replan()
+    started = time.perf_counter()
+    for _ in range(10):
+        songs = upcoming(db)
+        db.mark_music_played(songs[0]['id'])
+        planner.replan()
+    per_change = (time.perf_counter() - started) * 100
+    assert per_change < 100
+    print(f"✅ Re-plan latency {per_change:.1f} ms per track change")
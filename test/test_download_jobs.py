@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Test YouTube Download Jobs
+Tests job states, progress events, deduplication, the bounded queue and the download cache
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+import pytest
+from download_jobs import DownloadJobManager, DownloadQueueFull, canonical_url, parse_video_id
+
+
+class FakeDownloader:
+    """Stands in for yt-dlp: reports progress and writes a file once released"""
+
+    def __init__(self, download_dir):
+        self.download_dir = download_dir
+        self.release = threading.Event()
+        self.calls = []
+
+    def __call__(self, url, download_dir, progress):
+        self.calls.append(url)
+        for percent in (10, 50, 100):
+            progress('downloading', percent)
+        self.release.wait(5)
+        if 'broken' in url:
+            raise RuntimeError('Video unavailable')
+        progress('processing', 100)
+        video_id = url.rsplit('=', 1)[-1]
+        file_path = os.path.join(download_dir, f"{video_id}.mp3")
+        with open(file_path, 'wb') as f:
+            f.write(b'ID3')
+        return file_path, {'id': video_id, 'title': 'Real Title', 'duration': 215}
+
+
+def make_manager(db, tmp_path, **kwargs):
+    """Manager wired to a fake downloader and recording callbacks"""
+    downloader = FakeDownloader(str(tmp_path))
+    updates, completed = [], []
+
+    def on_complete(job, file_path, info):
+        completed.append((job['id'], file_path, info['title']))
+        return 42
+
+    manager = DownloadJobManager(db, download_dir=str(tmp_path), downloader=downloader,
+                                 on_update=updates.append, on_complete=on_complete,
+                                 progress_interval=0, **kwargs)
+    return manager, downloader, updates, completed
+
+
+def test_job_lifecycle(db, tmp_path):
+    """A job goes queued -> downloading -> processing -> completed with progress events"""
+    manager, downloader, updates, completed = make_manager(db, tmp_path)
+    job, created = manager.submit('https://youtu.be/watch?v=abc', guest_name='Valérie',
+                                  title='Song', artist='Queen')
+    assert created
+    assert job['status'] == 'queued'
+
+    downloader.release.set()
+    manager.shutdown()
+
+    final = manager.get_job(job['id'])
+    assert final['status'] == 'completed'
+    assert final['progress'] == 100
+    assert final['queue_id'] == 42
+    assert final['title'] == 'Real Title'
+    assert completed == [(job['id'], final['file_path'], 'Real Title')]
+
+    states = [update['status'] for update in updates]
+    assert states[0] == 'queued'
+    assert 'downloading' in states and 'processing' in states
+    assert states[-1] == 'completed'
+    assert 50 in [update['progress'] for update in updates if update['status'] == 'downloading']
+    print("✅ Job lifecycle test passed")
+
+
+def test_duplicate_url_shares_one_job(db, tmp_path):
+    """The same URL submitted twice while active maps to one job and one download"""
+    manager, downloader, _, _ = make_manager(db, tmp_path)
+    first, created_first = manager.submit('https://youtu.be/watch?v=dup')
+    second, created_second = manager.submit('https://youtu.be/watch?v=dup')
+
+    assert created_first and not created_second
+    assert first['id'] == second['id']
+
+    downloader.release.set()
+    manager.shutdown()
+    assert downloader.calls == ['https://youtu.be/watch?v=dup']
+
+    # Once finished, the URL can be requested again
+    manager, downloader, _, _ = make_manager(db, tmp_path)
+    third, created_third = manager.submit('https://youtu.be/watch?v=dup')
+    assert created_third and third['id'] != first['id']
+    downloader.release.set()
+    manager.shutdown()
+    print("✅ Deduplication test passed")
+
+
+def test_failed_job(db, tmp_path):
+    """Downloader errors mark the job failed with the message"""
+    manager, downloader, _, completed = make_manager(db, tmp_path)
+    job, _ = manager.submit('https://youtu.be/watch?v=broken')
+    downloader.release.set()
+    manager.shutdown()
+
+    final = manager.get_job(job['id'])
+    assert final['status'] == 'failed'
+    assert 'Video unavailable' in final['error']
+    assert completed == []
+    print("✅ Failed job test passed")
+
+
+def test_bounded_queue(db, tmp_path):
+    """Submissions beyond max_pending are rejected until jobs finish"""
+    manager, downloader, _, _ = make_manager(db, tmp_path, max_workers=1, max_pending=2)
+    manager.submit('https://youtu.be/watch?v=1')
+    manager.submit('https://youtu.be/watch?v=2')
+    with pytest.raises(DownloadQueueFull):
+        manager.submit('https://youtu.be/watch?v=3')
+    assert manager.stats() == {'pending': 2, 'max_pending': 2}
+
+    downloader.release.set()
+    manager.shutdown()
+    assert manager.stats()['pending'] == 0
+    print("✅ Bounded queue test passed")
+
+
+def test_recover_requeues_interrupted_jobs(db, tmp_path):
+    """Jobs left active by a crash are picked up again on startup"""
+    db.create_download_job('stale', 'https://youtu.be/watch?v=stale')
+    db.update_download_job('stale', status='downloading', progress=37)
+
+    manager, downloader, _, _ = make_manager(db, tmp_path)
+    assert manager.recover() == 1
+    downloader.release.set()
+    manager.shutdown()
+    assert manager.get_job('stale')['status'] == 'completed'
+    print("✅ Recovery test passed")
+
+
+def test_parse_video_id():
+    """Video ids come from every common YouTube URL shape without network access"""
+    for url in ('https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+                'https://youtube.com/watch?feature=share&v=dQw4w9WgXcQ&t=42',
+                'https://youtu.be/dQw4w9WgXcQ?si=abc',
+                'https://m.youtube.com/shorts/dQw4w9WgXcQ',
+                'https://music.youtube.com/watch?v=dQw4w9WgXcQ&list=RD',
+                'https://www.youtube-nocookie.com/embed/dQw4w9WgXcQ'):
+        assert parse_video_id(url) == 'dQw4w9WgXcQ', url
+    assert parse_video_id('https://vimeo.com/123456') is None
+    assert parse_video_id('https://www.youtube.com/watch?v=short') is None
+    assert parse_video_id('not a url') is None
+    print("✅ Video id parsing test passed")
+
+
+def test_different_links_share_one_job(db, tmp_path):
+    """youtu.be and watch links to the same video deduplicate"""
+    manager, downloader, _, _ = make_manager(db, tmp_path)
+    first, _ = manager.submit('https://www.youtube.com/watch?v=dQw4w9WgXcQ')
+    second, created = manager.submit('https://youtu.be/dQw4w9WgXcQ')
+    assert not created
+    assert second['id'] == first['id']
+    assert first['url'] == canonical_url('dQw4w9WgXcQ')
+    downloader.release.set()
+    manager.shutdown()
+    print("✅ Canonical URL test passed")
+
+
+def test_cached_video_queues_instantly(db, tmp_path):
+    """A re-requested video is queued from the cache without calling the downloader"""
+    manager, downloader, _, completed = make_manager(db, tmp_path)
+    downloader.release.set()
+    job, _ = manager.submit('https://youtu.be/dQw4w9WgXcQ')
+    manager.shutdown()
+
+    file_path = manager.get_job(job['id'])['file_path']
+    assert file_path == os.path.join(str(tmp_path), 'dQw4w9WgXcQ.mp3')
+    assert db.get_cached_download('dQw4w9WgXcQ')['file_path'] == file_path
+
+    manager, downloader, _, completed = make_manager(db, tmp_path)
+    again, created = manager.submit('https://www.youtube.com/watch?v=dQw4w9WgXcQ', guest_name='Valérie')
+    assert created
+    assert again['status'] == 'completed'
+    assert again['file_path'] == file_path
+    assert downloader.calls == []
+    assert completed == [(again['id'], file_path, 'Real Title')]
+
+    # A cache entry whose file disappeared falls back to downloading
+    os.unlink(file_path)
+    job, _ = manager.submit('https://youtu.be/dQw4w9WgXcQ')
+    assert job['status'] == 'queued'
+    downloader.release.set()
+    manager.shutdown()
+    assert downloader.calls == [canonical_url('dQw4w9WgXcQ')]
+    print("✅ Download cache test passed")
+
+
+def test_prefetch_download_does_not_queue(db, tmp_path):
+    """Prefetch re-downloads refresh the cache without queueing the song again"""
+    manager, downloader, _, completed = make_manager(db, tmp_path)
+    downloader.release.set()
+    assert manager.prefetch('dQw4w9WgXcQ')
+    manager.shutdown()
+
+    assert completed == []
+    assert db.get_cached_download('dQw4w9WgXcQ')['title'] == 'Real Title'
+    print("✅ Prefetch download test passed")
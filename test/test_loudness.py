@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Test Loudness Normalization
+Tests ebur128 parsing, gain limits, storage and the queue gain field
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+import pytest
+from audio_features import ffmpeg_available
+from loudness import LoudnessAnalyzer, compute_gain, measure_loudness, parse_ebur128
+
+EBUR128_SUMMARY = """
+[Parsed_ebur128_0 @ 0x55d0c8a4a2c0] Summary:
+
+  Integrated loudness:
+    I:         -11.3 LUFS
+    Threshold: -21.6 LUFS
+
+  Loudness range:
+    LRA:         4.9 LU
+    Threshold: -31.5 LUFS
+    LRA low:   -14.6 LUFS
+    LRA high:   -9.7 LUFS
+
+  True peak:
+    Peak:        0.4 dBFS
+"""
+
+
+@pytest.fixture
+def make_analyzer(db):
+    """LoudnessAnalyzer factory; workers are stopped and joined before the database is removed"""
+    analyzers = []
+
+    def make(**options):
+        analyzer = LoudnessAnalyzer(db, **options)
+        analyzers.append(analyzer)
+        return analyzer
+    yield make
+
+    for analyzer in analyzers:
+        analyzer.stop(wait=True)
+
+
+def queue_song(db, file_path):
+    """Queue an uploaded song"""
+    upload_id = db.add_upload(device_id='test-device', guest_name='Guest', file_path=file_path, file_type='music')
+    return db.add_to_music_queue(upload_id=upload_id, song_title=os.path.basename(file_path))
+
+
+def test_parse_ebur128():
+    """Integrated loudness and true peak come from the summary block"""
+    assert parse_ebur128(EBUR128_SUMMARY) == {'integrated_lufs': -11.3, 'true_peak_db': 0.4}
+    assert parse_ebur128("I: -inf LUFS\nPeak: -inf dBFS") == {'integrated_lufs': None, 'true_peak_db': None}
+    assert parse_ebur128("garbage") == {'integrated_lufs': None, 'true_peak_db': None}
+    print("✅ ebur128 parse test passed")
+
+
+def test_compute_gain():
+    """Gain reaches the reference level but respects peak ceiling and limits"""
+    assert compute_gain(-11.3) == -6.7
+    assert compute_gain(-24.0, true_peak_db=-10.0) == 6.0  # Capped boost
+    assert compute_gain(-22.0, true_peak_db=-3.0) == 2.0  # Peak-limited boost
+    assert compute_gain(-2.0) == -15.0
+    assert compute_gain(None) is None
+    print("✅ Gain computation test passed")
+
+
+def test_queue_gain_field(db):
+    """get_music_queue returns a linear gain, 1.0 until measured"""
+    queue_song(db, '/music/loud.mp3')
+    queue_song(db, '/music/quiet.mp3')
+    assert [song['gain'] for song in db.get_music_queue()['songs']] == [1.0, 1.0]
+
+    db.set_track_loudness('/music/loud.mp3', integrated_lufs=-12.0, true_peak_db=0.0, gain_db=-6.0)
+    db.set_track_loudness('/music/quiet.mp3', integrated_lufs=-21.0, true_peak_db=-6.0, gain_db=3.0)
+    loud, quiet = db.get_music_queue()['songs']
+    assert loud['gain'] == pytest.approx(0.5012, abs=1e-3)
+    assert quiet['gain'] == pytest.approx(1.4125, abs=1e-3)
+    assert loud['gain_db'] == -6.0
+    print("✅ Queue gain field test passed")
+
+
+def test_analyzer_measures_each_track_once(db, make_analyzer):
+    """Pending queue tracks are measured once, failures are not retried"""
+    calls = []
+
+    def fake_measure(file_path):
+        calls.append(file_path)
+        if 'broken' in file_path:
+            return None
+        return {'integrated_lufs': -14.0, 'true_peak_db': -2.0, 'gain_db': -4.0}
+
+    queue_song(db, '/music/a.mp3')
+    queue_song(db, '/music/a.mp3')  # Same file queued twice
+    queue_song(db, '/music/broken.mp3')
+
+    analyzer = make_analyzer(measure=fake_measure)
+    assert analyzer.measure_pending() == 2
+    assert analyzer.measure_pending() == 0
+    assert sorted(calls) == ['/music/a.mp3', '/music/broken.mp3']
+    assert (analyzer.measured, analyzer.failed) == (1, 1)
+
+    gains = {song['song_path']: song['gain'] for song in db.get_music_queue()['songs']}
+    assert gains['/music/broken.mp3'] == 1.0
+    assert gains['/music/a.mp3'] < 1.0
+    print("✅ Analyzer test passed")
+
+
+def test_concurrent_wakes_start_one_worker(make_analyzer, monkeypatch):
+    """Queue changes racing to wake the analyzer start a single worker thread"""
+    started = []
+
+    class CountingThread(threading.Thread):
+        def start(self):
+            if self.name == 'loudness-analyzer':
+                started.append(self)
+            super().start()
+
+    import loudness
+    monkeypatch.setattr(loudness.threading, 'Thread', CountingThread)
+    analyzer = make_analyzer(poll_interval=60, measure=lambda file_path: None)
+    wakers = [CountingThread(target=analyzer.wake) for _ in range(16)]
+    for waker in wakers:
+        waker.start()
+    for waker in wakers:
+        waker.join()
+    analyzer.stop(wait=True)
+    assert len(started) == 1
+    assert not started[0].is_alive()
+    print("✅ Concurrent wake test passed")
+
+
+def test_library_paths_pending(db):
+    """Library tracks without a measurement are listed for the indexer stage"""
+    db.add_to_music_library(file_path='/lib/1.mp3', title='One')
+    db.add_to_music_library(file_path='/lib/2.mp3', title='Two')
+    db.set_track_loudness('/lib/1.mp3', integrated_lufs=-18.0, gain_db=0.0)
+    assert db.get_unmeasured_library_paths() == ['/lib/2.mp3']
+    print("✅ Library pending test passed")
+
+
+@pytest.mark.skipif(not ffmpeg_available(), reason="ffmpeg not installed")
+def test_measure_with_ffmpeg(tmp_path):
+    """A generated tone is measured end to end"""
+    import subprocess
+    path = tmp_path / "tone.wav"
+    subprocess.run(['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'sine=frequency=440:duration=5',
+                    str(path)], check=True)
+    measurement = measure_loudness(str(path))
+    assert measurement['integrated_lufs'] is not None
+    assert measurement['gain_db'] is not None
+    print("✅ ffmpeg loudness test passed")
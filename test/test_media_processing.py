@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Test Video Processing
+Tests rendition state, progress reporting, failure handling, HLS packaging, photo normalization
+(EXIF rotation, HEIC conversion, thumbnails) and the slideshow's switch to renditions
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tempfile
+import pytest
+from PIL import Image
+import media_processing
+from media_processing import (RenditionWorker, VideoProcessor, PhotoProcessor, default_transcode_workers,
+                              SCALE_FILTER, DISPLAY_WIDTH, DISPLAY_HEIGHT, THUMB_SIZE)
+
+
+@pytest.fixture
+def video_dir():
+    """Temporary videos directory with one uploaded .mov"""
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, 'toast.mov'), 'wb') as f:
+            f.write(b'mov' * 1000)
+        yield directory
+
+
+def fake_probe(path):
+    """ffprobe stand-in: 10 s at 4K for the source, display size for the output"""
+    if path.endswith('.mov'):
+        return {'duration': 10.0, 'width': 3840, 'height': 2160}
+    return {'duration': 10.0, 'width': 1920, 'height': 1080}
+
+
+def fake_transcode(source, target, duration, threads, progress):
+    """ffmpeg stand-in reporting progress through the encode"""
+    for percent in (10, 50, 90):
+        progress(percent)
+    with open(target, 'wb') as f:
+        f.write(b'mp4')
+
+
+def fake_poster(source, target, at):
+    """Poster frame stand-in"""
+    with open(target, 'wb') as f:
+        f.write(b'\xff\xd8jpeg')
+
+
+def fake_packager(source, playlist):
+    """HLS packaging stand-in writing a two-segment playlist"""
+    directory = os.path.dirname(playlist)
+    for index in range(2):
+        with open(os.path.join(directory, f'seg_run1_{index:05d}.ts'), 'wb') as f:
+            f.write(b'ts')
+    with open(playlist, 'w') as f:
+        f.write('#EXTM3U\n#EXTINF:4.0,\nseg_run1_00000.ts\n#EXTINF:4.0,\nseg_run1_00001.ts\n#EXT-X-ENDLIST\n')
+
+
+def add_video(db, video_dir):
+    """Record an uploaded video"""
+    upload_id = db.add_upload('device-1', 'Sam', os.path.join(video_dir, 'toast.mov'), 'video',
+                              original_filename='toast.mov')
+    db.mark_upload_processed(upload_id)
+    return upload_id
+
+
+def test_transcode_produces_renditions(db, video_dir):
+    """Poster and web MP4 become ready and the slideshow prefers them"""
+    updates = []
+    processor = VideoProcessor(db, output_dir=video_dir, max_workers=1, on_update=updates.append,
+                               content_hash=lambda path: 'hash-' + os.path.basename(path),
+                               probe=fake_probe, transcoder=fake_transcode, poster=fake_poster,
+                               progress_interval=0)
+    upload_id = add_video(db, video_dir)
+
+    assert processor.submit(upload_id, os.path.join(video_dir, 'toast.mov'))
+    processor.shutdown()
+
+    renditions = db.get_media_renditions(upload_id)
+    assert renditions['video']['status'] == 'ready'
+    assert renditions['video']['width'] == 1920
+    assert renditions['poster']['status'] == 'ready'
+    assert os.path.exists(os.path.join(video_dir, str(upload_id), 'web.mp4'))
+    assert not os.path.exists(os.path.join(video_dir, str(upload_id), 'web.part.mp4'))
+
+    progress = [u['progress'] for u in updates if u['kind'] == 'video' and u['status'] == 'processing']
+    assert progress[-3:] == [10, 50, 90]
+    assert processor.stats()['completed'] == 1
+
+    item = db.get_slideshow_media()[0]
+    assert item['url'] == f"/media/videos/{upload_id}/web.mp4?v=hash-web.mp4"
+    assert item['poster'] == f"/media/videos/{upload_id}/poster.jpg?v=hash-poster.jpg"
+    assert item['original_url'].startswith('/media/videos/toast.mov')
+    print("✅ Rendition test passed")
+
+
+def test_failed_transcode_keeps_original(db, video_dir):
+    """A failed encode is recorded and the original keeps playing"""
+    def broken_transcode(source, target, duration, threads, progress):
+        raise RuntimeError('ffmpeg exited with 1: moov atom not found')
+
+    processor = VideoProcessor(db, output_dir=video_dir, max_workers=1, probe=fake_probe,
+                               transcoder=broken_transcode, poster=fake_poster)
+    upload_id = add_video(db, video_dir)
+    processor.submit(upload_id, os.path.join(video_dir, 'toast.mov'))
+    processor.shutdown()
+
+    video = db.get_media_renditions(upload_id)['video']
+    assert video['status'] == 'failed'
+    assert 'moov atom' in video['error']
+    assert db.get_slideshow_media()[0]['url'] == '/media/videos/toast.mov'
+    assert processor.stats()['failed'] == 1
+    print("✅ Failed transcode test passed")
+
+
+def test_recover_and_worker_cap(db, video_dir):
+    """Unfinished renditions are re-queued once and workers are capped by cores"""
+    upload_id = add_video(db, video_dir)
+    db.create_media_rendition(upload_id, 'poster')
+    db.create_media_rendition(upload_id, 'video')
+    db.update_media_rendition(upload_id, 'video', status='processing', progress=40)
+
+    processor = VideoProcessor(db, output_dir=video_dir, max_workers=1, probe=fake_probe,
+                               transcoder=fake_transcode, poster=fake_poster)
+    assert processor.recover() == 1
+    processor.shutdown()
+    assert db.get_media_renditions(upload_id)['video']['status'] == 'ready'
+    assert db.get_unfinished_renditions(('poster', 'video', 'hls')) == []
+
+    assert 1 <= default_transcode_workers() <= max(1, os.cpu_count() or 1)
+    assert 'force_original_aspect_ratio=decrease' in SCALE_FILTER
+    print("✅ Recovery test passed")
+
+
+def test_long_videos_get_hls(db, video_dir):
+    """Videos over the threshold get a playlist next to the MP4; shorter ones do not"""
+    processor = VideoProcessor(db, output_dir=video_dir, max_workers=1, probe=fake_probe,
+                               transcoder=fake_transcode, poster=fake_poster, packager=fake_packager,
+                               hls_min_duration=5)
+    long_id = add_video(db, video_dir)
+    processor.submit(long_id, os.path.join(video_dir, 'toast.mov'))
+    processor.shutdown()
+
+    hls = db.get_media_renditions(long_id)['hls']
+    assert hls['status'] == 'ready'
+    assert hls['file_path'] == os.path.join(video_dir, str(long_id), 'index.m3u8')
+    item = db.get_slideshow_media()[0]
+    assert item['hls_url'] == f"/media/videos/{long_id}/index.m3u8"
+    assert item['url'] == f"/media/videos/{long_id}/web.mp4"  # MP4 fallback for non-HLS players
+
+    short = VideoProcessor(db, output_dir=video_dir, max_workers=1, probe=fake_probe,
+                           transcoder=fake_transcode, poster=fake_poster, packager=fake_packager,
+                           hls_min_duration=60)
+    short_id = add_video(db, video_dir)
+    short.submit(short_id, os.path.join(video_dir, 'toast.mov'))
+    short.shutdown()
+    assert 'hls' not in db.get_media_renditions(short_id)
+    print("✅ HLS packaging test passed")
+
+
+def test_photo_rotated_and_shrunk(db, video_dir):
+    """A sideways phone photo becomes an upright, display-sized rendition without EXIF"""
+    source = os.path.join(video_dir, 'portrait.jpg')
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: rotate 90° clockwise to view
+    exif[0x010F] = 'PhoneMaker'
+    Image.new('RGB', (4000, 3000), 'blue').save(source, 'JPEG', exif=exif.tobytes())
+
+    upload_id = db.add_upload('device-1', 'Sam', source, 'photo', original_filename='portrait.jpg')
+    db.mark_upload_processed(upload_id)
+    processor = PhotoProcessor(db, output_dir=video_dir, max_workers=1)
+    assert processor.submit(upload_id, source)
+    processor.shutdown()
+
+    display = db.get_media_renditions(upload_id)['display']
+    assert display['status'] == 'ready'
+    with Image.open(display['file_path']) as image:
+        assert image.height > image.width  # Upright portrait
+        assert image.width <= DISPLAY_WIDTH and image.height <= DISPLAY_HEIGHT
+        assert not image.getexif()
+    assert os.path.exists(source)  # Original kept for the memory book
+    thumb = db.get_media_renditions(upload_id)['thumb']
+    assert thumb['status'] == 'ready'
+    assert max(thumb['width'], thumb['height']) == THUMB_SIZE and thumb['height'] > thumb['width']
+
+    item = db.get_slideshow_media()[0]
+    assert item['url'].startswith(f"/media/photos/{upload_id}/display.")
+    assert item['original_url'] == '/media/photos/portrait.jpg'
+    print("✅ Photo normalization test passed")
+
+
+def test_heic_converted_before_showing(db, video_dir, monkeypatch):
+    """HEIC photos join the slideshow only once the external converter produced a rendition"""
+    source = os.path.join(video_dir, 'IMG_0001.HEIC')
+    with open(source, 'wb') as f:
+        f.write(b'\x00\x00\x00\x18ftypheic' + b'\x00' * 64)
+    upload_id = db.add_upload('device-1', 'Sam', source, 'photo', original_filename='IMG_0001.HEIC')
+    assert db.get_slideshow_media() == []
+
+    # heif-convert stand-in: writes a small JPEG to its last argument
+    script = "import sys; from PIL import Image; Image.new('RGB', (30, 20), 'red').save(sys.argv[2], 'JPEG')"
+    monkeypatch.setattr(media_processing, 'heif_converter', lambda: [sys.executable, '-c', script])
+
+    # A client refetching the slideshow on each ready event must already find the photo there
+    in_slideshow = []
+    processor = PhotoProcessor(db, output_dir=video_dir, max_workers=1,
+                               on_update=lambda rendition: rendition['status'] == 'ready' and in_slideshow.append(
+                                   [item['upload_id'] for item in db.get_slideshow_media()]))
+    processor.submit(upload_id, source)
+    processor.shutdown()
+
+    assert db.get_media_renditions(upload_id)['display']['width'] == 30
+    assert db.get_slideshow_media()[0]['upload_id'] == upload_id
+    assert in_slideshow == [[upload_id], [upload_id]]  # Display, then thumbnail
+
+    monkeypatch.setattr(media_processing, 'heif_converter', lambda: None)
+    failed = PhotoProcessor(db, output_dir=video_dir, max_workers=1)
+    other_id = db.add_upload('device-1', 'Sam', source, 'photo', original_filename='IMG_0002.HEIC')
+    failed.submit(other_id, source)
+    failed.shutdown()
+    assert db.get_media_renditions(other_id)['display']['status'] == 'failed'
+    assert [item['upload_id'] for item in db.get_slideshow_media()] == [upload_id]
+    print("✅ HEIC conversion test passed")
+
+
+def test_incomplete_worker_fails_on_creation(db, video_dir):
+    """A rendition worker without _run fails when created, not inside a pool thread"""
+    class NoRun(RenditionWorker):
+        KINDS = ('display',)
+
+    with pytest.raises(TypeError):
+        NoRun(db, output_dir=video_dir, max_workers=1)
+    print("✅ Abstract worker test passed")
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Test Media File Serving
+Tests content-hash ETags, immutable caching of versioned URLs, the proxy offload headers
+and Range/conditional requests replayed from a seeking video player
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+import tempfile
+import pytest
+from flask import Flask
+from media_server import MediaServer, IMMUTABLE_MAX_AGE
+
+VIDEO_SIZE = 3 * 1024 * 1024
+
+
+@pytest.fixture
+def media_root():
+    """Temporary media directory with a photo and a video"""
+    with tempfile.TemporaryDirectory() as directory:
+        os.makedirs(os.path.join(directory, 'photos'))
+        with open(os.path.join(directory, 'photos', 'cake.jpg'), 'wb') as f:
+            f.write(b'\xff\xd8' + b'x' * 4096)
+        os.makedirs(os.path.join(directory, 'videos'))
+        with open(os.path.join(directory, 'videos', 'speech.mp4'), 'wb') as f:
+            f.write(bytes(range(256)) * (VIDEO_SIZE // 256))
+        yield directory
+
+
+def media_app(server, media_root):
+    """Minimal app serving media_root through a MediaServer"""
+    app = Flask(__name__)
+
+    @app.route('/media/<path:filename>')
+    def media(filename):
+        return server.send_from_directory(media_root, filename)
+
+    return app.test_client()
+
+
+def serve(media_root, mode, url, headers=None):
+    """Request a media URL from a minimal app using the given offload mode"""
+    server = MediaServer({media_root: '/protected-media/'}, mode=mode)
+    return server, media_app(server, media_root).get(url, headers=headers or {})
+
+
+class SeekingPlayer:
+    """Replays a <video>/<audio> element's requests with a browser-like cache, counting body bytes"""
+
+    def __init__(self, client, url):
+        self.client = client
+        self.url = url
+        self.etag = None
+        self.cached = set()  # 64 KB blocks held in the browser cache
+        self.bytes_transferred = 0
+        self.statuses = []
+
+    def play(self, start: int, end: int):
+        """Fetch a byte range, from the cache when every block of it is held"""
+        blocks = set(range(start // 65536, end // 65536 + 1))
+        headers = {'Range': f'bytes={start}-{end}'}
+        if self.etag:
+            if blocks <= self.cached:
+                headers = {'If-None-Match': self.etag}
+            else:
+                headers['If-Range'] = self.etag
+
+        response = self.client.get(self.url, headers=headers)
+        self.statuses.append(response.status_code)
+        self.bytes_transferred += len(response.data)
+        if response.status_code == 200:
+            self.cached = set(range(VIDEO_SIZE // 65536 + 1))
+        elif response.status_code == 206:
+            self.cached |= blocks
+        self.etag = response.headers.get('ETag', self.etag)
+        return response
+
+
+def test_strong_etag_and_revalidation(media_root):
+    """Unversioned URLs revalidate with a strong content-hash ETag"""
+    server, response = serve(media_root, 'python', '/media/photos/cake.jpg')
+    digest = server.content_hash(os.path.join(media_root, 'photos', 'cake.jpg'))
+    assert response.status_code == 200
+    assert response.headers['ETag'] == f'"{digest}"'
+    assert response.data.startswith(b'\xff\xd8')
+    assert response.cache_control.no_cache
+
+    _, cached = serve(media_root, 'python', '/media/photos/cake.jpg', {'If-None-Match': f'"{digest}"'})
+    assert cached.status_code == 304
+    assert cached.data == b''
+    print("✅ ETag revalidation test passed")
+
+
+def test_versioned_url_is_immutable(media_root):
+    """A URL carrying the current content hash is cacheable forever"""
+    server = MediaServer({media_root: '/protected-media/'}, mode='python')
+    url = server.versioned_url('/media/photos/cake.jpg', os.path.join(media_root, 'photos', 'cake.jpg'))
+
+    _, response = serve(media_root, 'python', url)
+    assert response.cache_control.max_age == IMMUTABLE_MAX_AGE
+    assert response.cache_control.immutable
+    assert not response.cache_control.no_cache
+
+    _, stale = serve(media_root, 'python', '/media/photos/cake.jpg?v=old')
+    assert not stale.cache_control.immutable
+
+    os.makedirs(os.path.join(media_root, 'videos', '7'))
+    with open(os.path.join(media_root, 'videos', '7', 'seg_run1_00000.ts'), 'wb') as f:
+        f.write(b'ts')
+    _, segment = serve(media_root, 'python', '/media/videos/7/seg_run1_00000.ts')
+    assert segment.cache_control.immutable  # HLS segments are named per packaging run
+    assert segment.headers['Content-Type'] == 'video/mp2t'
+    print("✅ Immutable caching test passed")
+
+
+def test_offload_headers(media_root):
+    """nginx and sendfile modes send headers instead of the bytes"""
+    _, accel = serve(media_root, 'nginx', '/media/photos/cake.jpg')
+    assert accel.headers['X-Accel-Redirect'] == '/protected-media/photos/cake.jpg'
+    assert accel.headers['Content-Type'] == 'image/jpeg'
+    assert 'X-Sendfile' not in accel.headers
+    assert accel.data == b''
+
+    _, sendfile = serve(media_root, 'sendfile', '/media/photos/cake.jpg')
+    assert sendfile.headers['X-Sendfile'] == os.path.realpath(os.path.join(media_root, 'photos', 'cake.jpg'))
+    assert sendfile.data == b''
+
+    _, cached = serve(media_root, 'nginx', '/media/photos/cake.jpg', {'If-None-Match': accel.headers['ETag']})
+    assert cached.status_code == 304
+    assert 'X-Accel-Redirect' not in cached.headers
+    print("✅ Offload header test passed")
+
+
+def test_hash_cache_and_traversal(media_root):
+    """Hashes follow file changes and paths cannot escape the directory"""
+    server, _ = serve(media_root, 'python', '/media/photos/cake.jpg')
+    path = os.path.join(media_root, 'photos', 'cake.jpg')
+    before = server.content_hash(path)
+    with open(path, 'ab') as f:
+        f.write(b'more')
+    assert server.content_hash(path) != before
+
+    _, response = serve(media_root, 'python', '/media/../../etc/passwd')
+    assert response.status_code == 404
+    print("✅ Hash cache test passed")
+
+
+def test_upload_hashed_while_written(media_root, db):
+    """Saving an upload yields its hash, and serving it afterwards never reads the file to hash it"""
+    server = MediaServer({media_root: '/protected-media/'}, mode='python', store=db)
+    body = os.urandom(3 * 1024 * 1024 + 17)
+    path = os.path.join(media_root, 'videos', 'toast.mp4')
+    size, digest = server.save_upload(io.BytesIO(body), path)
+
+    assert size == len(body)
+    assert digest == MediaServer._hash_file(path)
+    assert server.content_hash(path) == digest
+    assert server.hashes_computed == 0
+    other_worker = MediaServer({media_root: '/protected-media/'}, mode='python', store=db)
+    assert other_worker.content_hash(path) == digest and other_worker.hashes_computed == 0
+    print("✅ Hash while writing test passed")
+
+
+def test_range_requests(media_root):
+    """Seeks are answered with 206 partial content, past the end with 416"""
+    _, head = serve(media_root, 'python', '/media/videos/speech.mp4', {'Range': 'bytes=0-1023'})
+    assert head.status_code == 206
+    assert head.headers['Accept-Ranges'] == 'bytes'
+    assert head.headers['Content-Range'] == f'bytes 0-1023/{VIDEO_SIZE}'
+    assert head.data == bytes(range(256)) * 4
+
+    _, middle = serve(media_root, 'python', '/media/videos/speech.mp4', {'Range': 'bytes=1048576-'})
+    assert middle.status_code == 206
+    assert len(middle.data) == VIDEO_SIZE - 1048576
+
+    _, past_end = serve(media_root, 'python', '/media/videos/speech.mp4', {'Range': f'bytes={VIDEO_SIZE}-'})
+    assert past_end.status_code == 416
+    assert past_end.headers['Content-Range'] == f'bytes */{VIDEO_SIZE}'
+    print("✅ Range request test passed")
+
+
+def test_looping_video_replay(media_root):
+    """A looping, seeking video is transferred once and then only revalidated"""
+    server = MediaServer({media_root: '/protected-media/'}, mode='python')
+    player = SeekingPlayer(media_app(server, media_root), '/media/videos/speech.mp4')
+
+    # Metadata probe, moov atom at the end, then playback from the start in chunks
+    pattern = [(0, 65535), (VIDEO_SIZE - 65536, VIDEO_SIZE - 1)]
+    pattern += [(offset, offset + 1048575) for offset in range(0, VIDEO_SIZE, 1048576)]
+    for start, end in pattern:
+        player.play(start, end)
+    first_pass = player.bytes_transferred
+    assert first_pass <= VIDEO_SIZE + 2 * 65536
+    assert set(player.statuses) == {206}
+
+    for _ in range(5):  # The slideshow loops the video
+        for start, end in pattern:
+            player.play(start, end)
+    assert player.bytes_transferred == first_pass
+    assert player.statuses[-1] == 304
+    assert server.hashes_computed == 1
+
+    # A stale If-Range gets the whole new file instead of a spliced range
+    player.etag = '"stale"'
+    response = player.play(1048576, 2097151)
+    assert response.status_code == 200
+    assert len(response.data) == VIDEO_SIZE
+    print(f"✅ Seek replay test passed ({first_pass} bytes for {len(player.statuses)} requests)")
+
+
+def test_validators_shared_through_database(media_root, db):
+    """A second worker reuses the stored hash and answers If-Modified-Since"""
+    path = os.path.join(media_root, 'videos', 'speech.mp4')
+    first = MediaServer({media_root: '/protected-media/'}, mode='python', store=db)
+    digest = first.content_hash(path)
+
+    second = MediaServer({media_root: '/protected-media/'}, mode='python', store=db)
+    assert second.content_hash(path) == digest
+    assert second.hashes_computed == 0
+
+    client = media_app(second, media_root)
+    last_modified = client.get('/media/videos/speech.mp4').headers['Last-Modified']
+    response = client.get('/media/videos/speech.mp4', headers={'If-Modified-Since': last_modified})
+    assert response.status_code == 304
+    print("✅ Shared validator test passed")
+
+
+def test_nginx_upstream_matches_workers():
+    """nginx proxies to every worker port serve.py opens, and docker-compose publishes them"""
+    from serve import nginx_upstream
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(root, 'nginx', 'party.conf')) as f:
+        config = f.read()
+    with open(os.path.join(root, 'docker-compose-party.yml')) as f:
+        compose = f.read()
+
+    assert nginx_upstream('party-flask', 6000, 4) in config
+    assert '--port 6000 --workers 4' in compose
+    assert '"6000-6003:6000-6003"' in compose
+    print("✅ nginx upstream test passed")
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Test Memory Book Export
+Tests the static site build, incremental re-rendering from the manifest, cleanup of removed
+uploads and the streamed ZIP archive
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+import tempfile
+import zipfile
+import pytest
+from PIL import Image
+from memory_book import MemoryBookExporter, write_zip, MANIFEST_NAME
+
+
+@pytest.fixture
+def media_dir():
+    """Temporary media directory"""
+    with tempfile.TemporaryDirectory() as directory:
+        yield directory
+
+
+def add_photo(db, media_dir, name, size=(1200, 900)):
+    """Record a processed photo upload backed by a real JPEG"""
+    path = os.path.join(media_dir, name)
+    Image.new('RGB', size, 'green').save(path, 'JPEG')
+    upload_id = db.add_upload('device-1', 'Sam', path, 'photo', original_filename=name,
+                              birthday_note='Joyeux anniversaire!')
+    db.mark_upload_processed(upload_id)
+    return upload_id
+
+
+class UnseekableStream(io.RawIOBase):
+    """Write-only stream like a pipe or HTTP response, recording the largest single write"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.largest_write = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.largest_write = max(self.largest_write, len(data))
+        self.buffer += data
+        return len(data)
+
+
+def test_build_static_book(db, media_dir):
+    """Photos, videos and music land in the book with pages linking them relatively"""
+    photo_id = add_photo(db, media_dir, 'cake.jpg')
+    video_path = os.path.join(media_dir, 'toast.mov')
+    with open(video_path, 'wb') as f:
+        f.write(b'mov' * 100)
+    video_id = db.add_upload('device-1', 'Alex', video_path, 'video', original_filename='toast.mov')
+    db.mark_upload_processed(video_id)
+    song_path = os.path.join(media_dir, 'abc123.mp3')
+    with open(song_path, 'wb') as f:
+        f.write(b'ID3')
+    song_id = db.add_upload('device-1', 'Kim', song_path, 'music', original_filename='Our Song.mp3')
+    db.mark_upload_processed(song_id)
+
+    output = os.path.join(media_dir, 'book')
+    stats = MemoryBookExporter(db, output_dir=output, workers=2, per_page=2).build()
+    assert stats['rendered'] == 3 and stats['failed'] == 0
+    assert stats['pages'] == 2
+
+    with Image.open(os.path.join(output, 'images', str(photo_id), 'thumb.webp')) as thumb:
+        assert max(thumb.size) == 320
+    assert os.path.exists(os.path.join(output, 'videos', f'{video_id}.mov'))
+    index = open(os.path.join(output, 'index.html'), encoding='utf-8').read()
+    assert f'src="images/{photo_id}/thumb.webp"' in index
+    assert 'href="page-2.html"' in index
+    assert '/media/' not in index  # Nothing points back at the party server
+    page_two = open(os.path.join(output, 'page-2.html'), encoding='utf-8').read()
+    assert f'href="music/{song_id}-Our_Song.mp3"' in page_two
+    print("✅ Static book test passed")
+
+
+def test_incremental_rebuild(db, media_dir):
+    """Only new or changed uploads are rendered again and removed ones are cleaned up"""
+    first_id = add_photo(db, media_dir, 'one.jpg')
+    second_id = add_photo(db, media_dir, 'two.jpg')
+    output = os.path.join(media_dir, 'book')
+    exporter = MemoryBookExporter(db, output_dir=output, workers=1, per_page=10)
+    exporter.build()
+    assert os.path.exists(os.path.join(output, MANIFEST_NAME))
+
+    again = exporter.build()
+    assert again['rendered'] == 0 and again['unchanged'] == 2
+    assert again['pages_written'] == 0
+
+    third_id = add_photo(db, media_dir, 'three.jpg')
+    added = exporter.build()
+    assert added['rendered'] == 1 and added['unchanged'] == 2
+    assert added['pages_written'] == 1
+
+    # A display rendition that appears later replaces the original-based render
+    rendition = os.path.join(media_dir, 'display.webp')
+    Image.new('RGB', (640, 480), 'red').save(rendition, 'WEBP')
+    db.create_media_rendition(first_id, 'display')
+    db.update_media_rendition(first_id, 'display', status='ready', file_path=rendition, content_hash='r1')
+    assert exporter.build()['rendered'] == 1
+
+    conn = db.get_connection()
+    conn.execute('DELETE FROM uploads WHERE id = ?', (second_id,))
+    conn.commit()
+    conn.close()
+    exporter.build()
+    assert not os.path.exists(os.path.join(output, 'images', str(second_id), 'display.webp'))
+    assert os.path.exists(os.path.join(output, 'images', str(third_id), 'display.webp'))
+    print("✅ Incremental rebuild test passed")
+
+
+def test_zip_streams_to_unseekable_output(db, media_dir):
+    """The archive streams file by file into a pipe-like stream, storing images uncompressed"""
+    add_photo(db, media_dir, 'big.jpg', size=(3000, 2000))
+    output = os.path.join(media_dir, 'book')
+    MemoryBookExporter(db, output_dir=output, workers=1).build()
+    with open(os.path.join(output, 'clip.bin'), 'wb') as f:
+        f.write(os.urandom(3 * 1024 * 1024))
+
+    stream = UnseekableStream()
+    count = write_zip(output, stream)
+    assert stream.largest_write < 3 * 1024 * 1024  # Written in chunks, not as one archive blob
+
+    with zipfile.ZipFile(io.BytesIO(bytes(stream.buffer))) as archive:
+        names = archive.namelist()
+        assert len(names) == count
+        assert 'memory-book/index.html' in names
+        assert f'memory-book/{MANIFEST_NAME}' not in names
+        webp = next(info for info in archive.infolist() if info.filename.endswith('display.webp'))
+        assert webp.compress_type == zipfile.ZIP_STORED
+        assert archive.getinfo('memory-book/index.html').compress_type == zipfile.ZIP_DEFLATED
+        assert archive.testzip() is None
+    print("✅ Streamed ZIP test passed")
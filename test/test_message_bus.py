@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Test Worker Message Bus
+Tests the local broker, cluster topics, the Socket.IO client manager and shared queue sequencing
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pickle
+import queue
+import tempfile
+import threading
+import time
+import pytest
+from message_bus import LocalBroker, BusConnection, ClusterBus, LocalPubSubManager, socketio_queue_options
+from queue_events import QueueEventLog
+
+
+@pytest.fixture
+def broker_url():
+    """Running local broker on a temporary Unix socket"""
+    with tempfile.TemporaryDirectory() as directory:
+        url = f"local://{directory}/bus.sock"
+        broker = LocalBroker(url)
+        broker.start()
+        yield url
+        broker.stop()
+
+
+def collect(iterator, count):
+    """Read count items from a blocking iterator on a helper thread"""
+    items = queue.Queue()
+
+    def run():
+        for item in iterator:
+            items.put(item)
+    threading.Thread(target=run, daemon=True).start()
+    time.sleep(0.2)  # Let the subscriber connect
+    return lambda: [items.get(timeout=2) for _ in range(count)]
+
+
+def test_broker_fans_out_by_channel(broker_url):
+    """Every subscriber receives published frames for its channels"""
+    first = collect(BusConnection(broker_url).listen('socketio'), 2)
+    second = collect(BusConnection(broker_url).listen('socketio'), 2)
+
+    publisher = BusConnection(broker_url)
+    publisher.publish('other', b'ignored')
+    publisher.publish('socketio', b'one')
+    publisher.publish('socketio', b'two')
+
+    expected = [('socketio', b'one'), ('socketio', b'two')]
+    assert first() == expected
+    assert second() == expected
+    print("✅ Broker fan-out test passed")
+
+
+def test_cluster_topics_skip_own_messages(broker_url):
+    """Handlers see messages from other workers only"""
+    worker_a, worker_b = ClusterBus(broker_url), ClusterBus(broker_url)
+    seen_a, seen_b = queue.Queue(), queue.Queue()
+    worker_a.subscribe('setting', seen_a.put)
+    worker_b.subscribe('setting', seen_b.put)
+    worker_a.start()
+    worker_b.start()
+    time.sleep(0.2)
+
+    worker_a.publish('setting', key='ollama_model')
+    assert seen_b.get(timeout=2) == {'key': 'ollama_model'}
+    time.sleep(0.2)
+    assert seen_a.empty()
+    print("✅ Cluster topic test passed")
+
+
+def test_socketio_manager_round_trip(broker_url):
+    """Socket.IO pub/sub messages reach the other worker's listener"""
+    sender, receiver = LocalPubSubManager(broker_url), LocalPubSubManager(broker_url)
+    received = collect(receiver._listen(), 1)
+
+    message = {'method': 'emit', 'event': 'slideshow_update', 'data': {'action': 'next'},
+               'namespace': '/', 'room': 'display', 'host_id': sender.host_id}
+    sender._publish(message)
+    assert pickle.loads(received()[0]) == message
+
+    assert socketio_queue_options(None) == {}
+    assert socketio_queue_options('redis://localhost:6379/0') == {'message_queue': 'redis://localhost:6379/0'}
+    assert isinstance(socketio_queue_options(broker_url)['client_manager'], LocalPubSubManager)
+    print("✅ Socket.IO manager test passed")
+
+
+def test_workers_share_queue_sequence(db):
+    """Two workers' event logs hand out one sequence and replay each other's deltas"""
+    worker_a = QueueEventLog(db, shared_epoch='party1', history=4)
+    worker_b = QueueEventLog(db, shared_epoch='party1', history=4)
+
+    first = worker_a.removed([1])['seq']
+    second = worker_b.removed([2])['seq']
+    assert second == first + 1
+    assert worker_a.seq == worker_b.seq == second
+
+    replay = worker_a.since(first)
+    assert [(delta['seq'], delta['ids']) for delta in replay] == [(second, [2])]
+    assert worker_b.snapshot()['seq'] == second
+
+    for queue_id in range(3, 9):
+        worker_b.removed([queue_id])
+    assert worker_a.since(first) is None  # Older than the replay window
+    assert worker_a.since(worker_a.seq + 1) is None
+    print("✅ Shared sequence test passed")
+
+
+def test_database_uses_wal(db):
+    """Workers share the database file in WAL mode"""
+    conn = db.get_connection()
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    conn.close()
+    print("✅ WAL mode test passed")
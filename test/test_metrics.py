@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test Metrics
+Tests histogram buckets and the text exposition format, route/emit/database/external call
+instrumentation and the cost of recording
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import pytest
+from flask import Flask
+import metrics
+from metrics import Registry, Metric, Counter, Gauge, Histogram
+
+
+def sample(text, line_start):
+    """Value of the exposition line starting with line_start"""
+    for line in text.splitlines():
+        if line.startswith(line_start + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+
+def test_exposition_format():
+    """Histograms expose cumulative buckets, sum and count; gauges read their callbacks"""
+    registry = Registry()
+    latency = registry.register(Histogram('test_latency_seconds', 'Latency', ('route',), buckets=(0.1, 1.0)))
+    hits = registry.register(Counter('test_hits', 'Hits', ('kind',)))
+    depth = registry.register(Gauge('test_depth', 'Depth', ('queue',)))
+
+    for value in (0.05, 0.5, 0.5, 3.0):
+        latency.observe(value, route='/api/media')
+    hits.inc(kind='a "quoted"\nvalue')
+    pending = [1, 2, 3]
+    depth.set_function(lambda: len(pending), queue='downloads')
+
+    text = registry.render({'worker': 0})
+    assert '# TYPE test_latency_seconds histogram' in text
+    assert sample(text, 'test_latency_seconds_bucket{worker="0",route="/api/media",le="0.1"}') == 1
+    assert sample(text, 'test_latency_seconds_bucket{worker="0",route="/api/media",le="1"}') == 3
+    assert sample(text, 'test_latency_seconds_bucket{worker="0",route="/api/media",le="+Inf"}') == 4
+    assert sample(text, 'test_latency_seconds_count{worker="0",route="/api/media"}') == 4
+    assert sample(text, 'test_latency_seconds_sum{worker="0",route="/api/media"}') == pytest.approx(4.05)
+    assert 'test_hits_total{worker="0",kind="a \\"quoted\\"\\nvalue"} 1' in text
+    assert sample(text, 'test_depth{worker="0",queue="downloads"}') == 3
+
+    pending.append(4)
+    assert sample(registry.render(), 'test_depth{queue="downloads"}') == 4  # Read at scrape time
+    with pytest.raises(ValueError):
+        registry.register(Counter('test_hits', 'Again'))
+
+    class Summary(Metric):
+        TYPE = 'summary'
+
+    with pytest.raises(TypeError):  # No samples(): fails here, not on the first scrape
+        Summary('test_summary', 'Incomplete')
+    print("✅ Exposition format test passed")
+
+
+def test_routes_and_emits_are_instrumented():
+    """Requests are labelled by route template; emits by event"""
+    app = Flask(__name__)
+    metrics.instrument_app(app)
+
+    @app.route('/api/download/<job_id>')
+    def download(job_id):
+        return job_id
+
+    client = app.test_client()
+    for job_id in ('a', 'b', 'c'):
+        client.get(f'/api/download/{job_id}')
+    client.get('/no/such/page')
+
+    text = metrics.REGISTRY.render()
+    assert sample(text, 'party_http_request_duration_seconds_count'
+                        '{method="GET",route="/api/download/<job_id>",status="200"}') == 3
+    assert sample(text, 'party_http_request_duration_seconds_count'
+                        '{method="GET",route="unmatched",status="404"}') >= 1
+    assert 'route="/api/download/a"' not in text
+
+    sent = []
+    emit = metrics.instrument_emit(lambda event, data, to=None: sent.append((event, to)))
+    emit('test_batch', {'events': []}, to='display')
+    assert sent == [('test_batch', 'display')]
+    assert sample(metrics.REGISTRY.render(),
+                  'party_socketio_emit_duration_seconds_count{event="test_batch"}') == 1
+    print("✅ Route and emit instrumentation test passed")
+
+
+def test_database_and_external_calls(db):
+    """Database methods are timed by name; external calls record their outcome"""
+    instrumented = metrics.instrument_database(db)
+    before = sample(metrics.REGISTRY.render(), 'party_db_query_duration_seconds_count{method="ping"}') or 0
+    assert instrumented.ping() is True
+    assert instrumented.ping() is True
+    assert instrumented.db_path == db.db_path
+    conn = instrumented.get_connection()  # Raw connections pass through untimed
+    conn.close()
+    text = metrics.REGISTRY.render()
+    assert sample(text, 'party_db_query_duration_seconds_count{method="ping"}') == before + 2
+    assert 'method="get_connection"' not in text
+
+    with metrics.external_call('test-service'):
+        pass
+    with pytest.raises(RuntimeError):
+        with metrics.external_call('test-service'):
+            raise RuntimeError('Ollama is down')
+    text = metrics.REGISTRY.render()
+    assert sample(text, 'party_external_call_duration_seconds_count{service="test-service",outcome="ok"}') == 1
+    assert sample(text, 'party_external_call_duration_seconds_count{service="test-service",outcome="error"}') == 1
+    print("✅ Database and external call test passed")
+
+
+def test_recording_is_cheap():
+    """Recording stays in the low microseconds, so unscraped metrics cost next to nothing"""
+    histogram = Histogram('test_cost_seconds', 'Cost', ('route',))
+    start = time.perf_counter()
+    for _ in range(100000):
+        histogram.observe(0.003, route='/api/media')
+    per_call = (time.perf_counter() - start) / 100000
+    assert per_call < 20e-6, f"observe() took {per_call * 1e6:.1f} µs"
+    print(f"✅ Recording cost test passed ({per_call * 1e6:.2f} µs per observation)")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test Music Recommendation Engine
+Tests co-occurrence/transition learning and diversity constraints
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from music_recommender import MusicRecommender
+
+
+LIBRARY = {
+    'Queen': ('Rock', ['Bohemian Rhapsody', "Don't Stop Me Now", 'Somebody to Love', 'Radio Ga Ga']),
+    'David Bowie': ('Rock', ['Heroes', 'Starman', 'Changes', 'Let\'s Dance']),
+    'ABBA': ('Pop', ['Dancing Queen', 'Mamma Mia', 'Waterloo', 'SOS']),
+    'Mozart': ('Classical', ['Eine kleine Nachtmusik', 'Requiem', 'Symphony 40', 'Magic Flute']),
+}
+
+
+@pytest.fixture
+def db(db):
+    """Temporary party database with a small multi-genre library"""
+    for artist, (genre, titles) in LIBRARY.items():
+        for title in titles:
+            db.add_to_music_library(file_path=f"/music/{artist}/{title}.mp3",
+                                    artist=artist, title=title, genre=genre)
+    return db
+
+
+def queue_song(db, artist, title, guest='Test Guest'):
+    """Queue a library song the way /api/music/add-to-queue does"""
+    upload_id = db.add_upload(device_id='test-device', guest_name=guest,
+                              file_path=f"/music/{artist}/{title}.mp3", file_type='music')
+    db.add_to_music_queue(upload_id=upload_id, song_title=title, artist=artist)
+
+
+def test_cold_start_returns_nothing(db):
+    """Without selections the engine defers to the fallback paths"""
+    recommender = MusicRecommender(db)
+    assert recommender.recommend(5) == []
+    print("✅ Cold start test passed")
+
+
+def test_transitions_drive_recommendations(db):
+    """After Queen the party kept picking Bowie, so Bowie is recommended"""
+    for _ in range(3):
+        queue_song(db, 'Queen', 'Bohemian Rhapsody')
+        queue_song(db, 'David Bowie', 'Heroes')
+        queue_song(db, 'Mozart', 'Requiem')
+    queue_song(db, 'Queen', 'Radio Ga Ga')
+
+    recommender = MusicRecommender(db, max_per_artist=2)
+    results = recommender.recommend(3)
+
+    assert results
+    assert results[0]['artist'] == 'David Bowie'
+    assert all(r['source'] == 'local' for r in results)
+    print("✅ Transition recommendation test passed")
+
+
+def test_diversity_and_recent_exclusion(db):
+    """No artist exceeds max_per_artist and recently queued songs are skipped"""
+    for title in LIBRARY['Queen'][1][:2]:
+        queue_song(db, 'Queen', title)
+
+    recommender = MusicRecommender(db, max_per_artist=1)
+    results = recommender.recommend(10)
+
+    artists = [r['artist'] for r in results]
+    assert len(artists) == len(set(artists))
+    queued = set(LIBRARY['Queen'][1][:2])
+    assert not any(r['title'] in queued for r in results)
+    print("✅ Diversity test passed")
+
+
+def test_incremental_selection(db):
+    """record_selection updates the matrices without a rebuild"""
+    queue_song(db, 'ABBA', 'Waterloo')
+    recommender = MusicRecommender(db)
+    recommender.ensure_built()
+    before = recommender.selection_count
+
+    recommender.record_selection(artist='Mozart', title='Requiem', guest_name='Valérie')
+    recommender.record_selection(artist='ABBA', title='SOS', guest_name='Valérie')
+
+    assert recommender.selection_count == before + 2
+    assert recommender.artist_transitions['mozart']['abba'] == 1
+    assert recommender.artist_cooccurrence['abba']['mozart'] >= 1
+    assert recommender.genre_transitions['classical']['pop'] == 1
+    print("✅ Incremental selection test passed")
+
+
+def test_newly_indexed_tracks_are_picked_up(db):
+    """Tracks music_indexer adds later are recommended without a restart, keeping learned statistics"""
+    for _ in range(3):
+        queue_song(db, 'Queen', 'Bohemian Rhapsody')
+        queue_song(db, 'Prince', 'Purple Rain')  # Not in the library yet
+    queue_song(db, 'Queen', 'Radio Ga Ga')
+
+    recommender = MusicRecommender(db, refresh_interval=0)
+    assert not any(r['artist'] == 'Prince' for r in recommender.recommend(5))
+    learned = recommender.selection_count
+
+    db.add_to_music_library(file_path='/music/Prince/Kiss.mp3', artist='Prince', title='Kiss', genre='Funk')
+    results = recommender.recommend(5)
+    assert results[0]['title'] == 'Kiss'  # After Queen the party keeps picking Prince
+    assert recommender.selection_count == learned
+    print("✅ Library refresh test passed")
+
+
+def test_offline_evaluation(db):
+    """The replay benchmark scores every selection after warm-up"""
+    from benchmarks.evaluate_recommender import evaluate
+
+    for _ in range(4):
+        queue_song(db, 'Queen', 'Bohemian Rhapsody')
+        queue_song(db, 'David Bowie', 'Heroes')
+
+    stats = evaluate(db.db_path, top_n=5, warmup=2)
+    assert stats['events'] == 6
+    assert stats['artist_hits'] > 0
+    print("✅ Offline evaluation test passed")
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Test Music Library Sampler
+Tests uniform/weighted sampling and artist/genre/decade filters
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+from collections import Counter
+import pytest
+from music_sampler import LibrarySampler, decade_of
+
+
+@pytest.fixture
+def db(db):
+    """Temporary party database with 400 tracks over 4 artists and 4 decades"""
+    artists = [('Queen', 'Rock'), ('ABBA', 'Pop'), ('Daft Punk', 'Electronic'), ('Mozart', 'Classical')]
+    conn = db.get_connection()
+    for i in range(400):
+        artist, genre = artists[i % 4]
+        conn.execute('''
+        INSERT INTO music_library (file_path, artist, title, genre, year)
+        VALUES (?, ?, ?, ?, ?)
+        ''', (f"/music/{i}.mp3", artist, f"Song {i}", genre, 1970 + (i % 40)))
+    conn.commit()
+    conn.close()
+    return db
+
+
+def test_decade_of():
+    """Years collapse to their decade"""
+    assert decade_of(1987) == 1980
+    assert decade_of("2003") == 2000
+    assert decade_of(None) == 0
+    print("✅ Decade test passed")
+
+
+def test_uniform_sample_is_distinct(db):
+    """Uniform picks are distinct library tracks"""
+    sampler = LibrarySampler(db)
+    tracks = sampler.sample(25)
+
+    assert len(tracks) == 25
+    assert len({t['id'] for t in tracks}) == 25
+    assert all(t['source'] == 'local' for t in tracks)
+    assert len(sampler) == 400
+    print("✅ Uniform sampling test passed")
+
+
+def test_filters(db):
+    """Artist, genre and decade filters combine"""
+    sampler = LibrarySampler(db)
+
+    assert {t['artist'] for t in sampler.sample(20, artist='queen')} == {'Queen'}
+    assert {t['genre'] for t in sampler.sample(20, genre='Pop')} == {'Pop'}
+    assert {decade_of(t['year']) for t in sampler.sample(20, decade=1980)} == {1980}
+
+    combined = sampler.sample(50, artist=['Queen', 'ABBA'], decade=1990)
+    assert combined
+    assert {t['artist'] for t in combined} <= {'Queen', 'ABBA'}
+    assert {decade_of(t['year']) for t in combined} == {1990}
+
+    assert sampler.sample(5, artist='Nobody') == []
+    print("✅ Filter test passed")
+
+
+def test_weighted_sampling(db):
+    """Heavier artists are drawn far more often"""
+    sampler = LibrarySampler(db)
+    counts = Counter()
+    for _ in range(50):
+        ids = sampler.sample_ids(4, artist_weights={'Daft Punk': 50, 'Queen': 1})
+        counts.update(sampler._artist_codes[sampler._ids.index(i)] for i in ids)
+
+    daft_punk = sampler._artist_codes_by_key['daft punk']
+    assert counts.most_common(1)[0][0] == daft_punk
+    print("✅ Weighted sampling test passed")
+
+
+def test_exclusions_and_refresh(db):
+    """Excluded ids are never returned and new rows appear after a refresh"""
+    sampler = LibrarySampler(db)
+    queen_ids = set(sampler.sample_ids(200, artist='Queen'))
+    assert len(queen_ids) == 100
+
+    remaining = sampler.sample_ids(100, artist='Queen', exclude_ids=set(list(queen_ids)[:90]))
+    assert len(remaining) == 10
+
+    db.add_to_music_library(file_path="/music/new.mp3", artist="Céline Dion", title="New")
+    sampler.invalidate()
+    assert [t['title'] for t in sampler.sample(5, artist='celine dion')] == ['New']
+    print("✅ Exclusion and refresh test passed")
+
+
+def test_mostly_excluded_library(db):
+    """With most of the library excluded, every remaining track can still be drawn"""
+    sampler = LibrarySampler(db)
+    all_ids = sampler.sample_ids(400)
+    excluded = set(all_ids[:385])
+    eligible = set(all_ids[385:])
+
+    for weights in (None, {'Queen': 5.0}):
+        for _ in range(20):
+            picked = sampler.sample_ids(10, artist_weights=weights, exclude_ids=excluded)
+            assert len(picked) == 10 and len(set(picked)) == 10
+            assert set(picked) <= eligible
+        assert set(sampler.sample_ids(50, artist_weights=weights, exclude_ids=excluded)) == eligible
+
+    # Weighted draws that keep landing on excluded tracks still fill k from the rest
+    queen_heavy = sampler.sample_ids(100, artist_weights={'Queen': 1000.0},
+                                     exclude_ids=set(sampler.sample_ids(100, artist='Queen')))
+    assert len(queen_heavy) == 100
+    print("✅ Mostly excluded library test passed")
+
+
+def test_faster_than_order_by_random(db):
+    """Sampling beats ORDER BY RANDOM() on a larger library"""
+    conn = db.get_connection()
+    conn.executemany('INSERT INTO music_library (file_path, artist, title) VALUES (?, ?, ?)',
+                     [(f"/bulk/{i}.mp3", f"Artist {i % 500}", f"Track {i}") for i in range(50000)])
+    conn.commit()
+
+    sampler = LibrarySampler(db)
+    sampler.sample_ids(1)  # Load once
+
+    started = time.perf_counter()
+    for _ in range(20):
+        sampler.sample_ids(10)
+    sampler_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(20):
+        conn.execute('SELECT id FROM music_library ORDER BY RANDOM() LIMIT 10').fetchall()
+    random_time = time.perf_counter() - started
+    conn.close()
+
+    assert sampler_time < random_time
+    print(f"✅ Sampling {sampler_time * 50:.3f} ms vs ORDER BY RANDOM {random_time * 50:.3f} ms per call")
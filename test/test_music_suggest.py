@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Test Music Suggestion Index
+Tests the in-memory prefix trie behind /api/music/suggest
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+import time
+import pytest
+from music_suggest import MusicSuggestIndex, tokenize
+
+
+@pytest.fixture
+def db(db):
+    """Temporary party database with a small library"""
+    db.add_to_music_library(file_path="/test/queen1.mp3", artist="Queen",
+                            title="Bohemian Rhapsody", album="A Night at the Opera", genre="Rock")
+    db.add_to_music_library(file_path="/test/queen2.mp3", artist="Queen",
+                            title="Don't Stop Me Now", album="Jazz", genre="Rock")
+    db.add_to_music_library(file_path="/test/celine.mp3", artist="Céline Dion",
+                            title="My Heart Will Go On", album="Let's Talk About Love", genre="Pop")
+    db.add_to_music_library(file_path="/test/queens.mp3", artist="Queens of the Stone Age",
+                            title="No One Knows", album="Songs for the Deaf", genre="Rock")
+    return db
+
+
+def test_tokenize_strips_accents():
+    """Accents and punctuation are normalized away"""
+    assert tokenize("Céline Dion - Don't") == ['celine', 'dion', 'don', 't']
+    print("✅ Tokenize test passed")
+
+
+def test_prefix_suggestions(db):
+    """Prefixes match artist, title and album tokens"""
+    index = MusicSuggestIndex(db)
+
+    texts = [s['text'] for s in index.suggest("bohem")]
+    assert "Bohemian Rhapsody" in texts
+
+    texts = [s['text'] for s in index.suggest("celi")]
+    assert "Céline Dion" in texts
+
+    assert index.suggest("zzz") == []
+    assert index.suggest("") == []
+    print("✅ Prefix suggestion test passed")
+
+
+def test_multi_word_query(db):
+    """Earlier words filter the candidates of the last prefix"""
+    index = MusicSuggestIndex(db)
+
+    results = index.suggest("queens of the st")
+    assert results
+    assert all('Queens' in (r['text'] + (r['artist'] or '')) for r in results)
+    print("✅ Multi-word suggestion test passed")
+
+
+def test_pattern_frequency_weighting(db):
+    """Artists the party keeps picking rank first"""
+    db.update_music_pattern('artist', 'Queens of the Stone Age')
+    db.update_music_pattern('artist', 'Queens of the Stone Age')
+
+    index = MusicSuggestIndex(db)
+    results = index.suggest("que")
+    assert results[0]['text'] == "Queens of the Stone Age"
+    assert results[0]['type'] == 'artist'
+    print("✅ Pattern weighting test passed")
+
+
+def test_rebuild_after_library_change(db):
+    """New library rows show up once the signature changes"""
+    index = MusicSuggestIndex(db, refresh_interval=0)
+    assert index.suggest("abba") == []
+
+    db.add_to_music_library(file_path="/test/abba.mp3", artist="ABBA", title="Dancing Queen")
+    index.suggest("abba")  # Triggers background rebuild
+    deadline = time.time() + 5
+    while index._building and time.time() < deadline:
+        time.sleep(0.01)
+
+    texts = [s['text'] for s in index.suggest("abba")]
+    assert "ABBA" in texts
+    print("✅ Rebuild test passed")
+
+
+def test_concurrent_lookups_start_one_rebuild(db):
+    """Lookups racing after a library change start a single background rebuild"""
+    index = MusicSuggestIndex(db, refresh_interval=0)
+    index.suggest("queen")
+    db.add_to_music_library(file_path="/test/abba.mp3", artist="ABBA", title="Dancing Queen")
+
+    rebuilds = []
+    build = index._background_build
+    index._background_build = lambda: (rebuilds.append(1), time.sleep(0.2), build())
+    barrier = threading.Barrier(16)
+    lookups = [threading.Thread(target=lambda: (barrier.wait(), index.suggest("queen"))) for _ in range(16)]
+    for lookup in lookups:
+        lookup.start()
+    for lookup in lookups:
+        lookup.join()
+    deadline = time.time() + 5
+    while index._building and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert len(rebuilds) == 1
+    assert "ABBA" in [s['text'] for s in index.suggest("abba")]
+    print("✅ Concurrent rebuild test passed")
+
+
+def test_lookup_latency(db):
+    """Lookups stay well under 5 ms on a larger library"""
+    for i in range(3000):
+        db.add_to_music_library(file_path=f"/test/bulk/{i}.mp3", artist=f"Artist {i % 300}",
+                                title=f"Song Number {i} Party Mix", album=f"Album {i % 500}")
+
+    index = MusicSuggestIndex(db)
+    index.suggest("a")  # Build once
+
+    queries = ["a", "so", "song num", "party", "artist 12", "bohemian", "mix"]
+    started = time.perf_counter()
+    for _ in range(50):
+        for query in queries:
+            index.suggest(query)
+    average_ms = (time.perf_counter() - started) * 1000 / (50 * len(queries))
+
+    assert average_ms < 5, f"Average lookup took {average_ms:.3f} ms"
+    print(f"✅ Lookup latency test passed ({average_ms:.3f} ms average)")
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test Blocking Call Offload
+Tests async mode selection, the cooperative database proxy and progress relaying
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import offload
+from offload import CooperativeDatabase, cooperative_database, run_blocking_with_progress
+
+
+def test_async_mode_selection():
+    """Only known async modes are accepted; the dev server keeps the plain database"""
+    assert offload.async_mode() == 'threading'
+    with pytest.raises(ValueError):
+        offload.set_async_mode('asyncio')
+    assert offload.async_mode() == 'threading'
+    print("✅ Async mode test passed")
+
+
+def test_cooperative_database_proxy(db):
+    """Query methods go through run_blocking; connections and attributes pass through"""
+    assert cooperative_database(db) is db
+
+    proxy = CooperativeDatabase(db)
+    proxy.set_setting('party_mode', 'on')
+    assert proxy.get_setting('party_mode') == 'on'
+    assert proxy.get_setting.__doc__ == db.get_setting.__doc__
+    assert proxy.db_path == db.db_path
+
+    conn = proxy.get_connection()
+    assert conn.execute("SELECT value FROM settings WHERE key = 'party_mode'").fetchone()[0] == 'on'
+    conn.close()
+    print("✅ Cooperative database test passed")
+
+
+class GuardedDatabase(CooperativeDatabase):
+    """Cooperative proxy that fails on raw connections, which would query on the event loop"""
+
+    def __init__(self, db):
+        super().__init__(db)
+        self.offloaded = []
+
+    def __getattr__(self, name):
+        assert name != 'get_connection', 'raw connection would run sqlite on the event loop'
+        if not name.startswith('_'):
+            self.offloaded.append(name)
+        return super().__getattr__(name)
+
+
+def test_music_indexes_query_through_proxy(db):
+    """Suggest index, sampler, recommender and fuzzy search only use offloadable database methods"""
+    from music_suggest import MusicSuggestIndex
+    from music_sampler import LibrarySampler
+    from music_recommender import MusicRecommender
+    from music_search import MusicSearchService
+
+    conn = db.get_connection()
+    conn.execute("INSERT INTO music_library (file_path, artist, title, genre, year) "
+                 "VALUES ('/music/a.mp3', 'ABBA', 'Dancing Queen', 'Pop', 1976)")
+    conn.commit()
+    conn.close()
+
+    proxy = GuardedDatabase(db)
+    assert MusicSuggestIndex(proxy).suggest('danc')[0]['text'] == 'Dancing Queen'
+    assert len(LibrarySampler(proxy)) == 1
+    MusicRecommender(proxy).ensure_built()
+    assert MusicSearchService(proxy)._fuzzy_search_library('dancing queen', 5)
+    assert {'get_library_signature', 'get_library_index', 'get_library_songs'} <= set(proxy.offloaded)
+    print("✅ Music index offload test passed")
+
+
+def test_progress_is_relayed():
+    """Progress callbacks reach the caller and the return value comes back"""
+    def download(url, progress):
+        for percent in (10, 100):
+            progress('downloading', percent)
+        return f"{url}.mp3"
+
+    updates = []
+    assert run_blocking_with_progress(download, lambda *update: updates.append(update), 'song') == 'song.mp3'
+    assert updates == [('downloading', 10), ('downloading', 100)]
+    print("✅ Progress relay test passed")
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Test Party Logging
+Tests that logging callers only enqueue, JSON lines with extra fields and tracebacks,
+per-module levels and size-based rotation
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import glob
+import json
+import logging
+import tempfile
+import time
+import pytest
+import party_logging
+from party_logging import setup_logging, stop_logging, parse_levels, PartyQueueHandler
+
+
+@pytest.fixture
+def log_dir(monkeypatch):
+    """Temporary log directory; the root logger is restored afterwards"""
+    for name in ('PARTY_LOG_FILE', 'PARTY_LOG_LEVEL', 'PARTY_LOG_JSON', 'PARTY_LOG_LEVELS',
+                 'PARTY_LOG_MAX_MB', 'PARTY_LOG_BACKUPS', 'PARTY_LOG_ROTATE_WHEN'):
+        monkeypatch.delenv(name, raising=False)
+    root = logging.getLogger()
+    saved_handlers, saved_level = list(root.handlers), root.level
+    with tempfile.TemporaryDirectory() as directory:
+        yield directory
+        stop_logging()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in saved_handlers:
+        root.addHandler(handler)
+    root.setLevel(saved_level)
+
+
+def test_callers_only_enqueue(log_dir):
+    """A slow disk holds up the background writer, not the thread that logs"""
+    log_file = os.path.join(log_dir, 'party.log')
+    listener = setup_logging(log_file=log_file, console=False)
+    assert any(isinstance(handler, PartyQueueHandler) for handler in logging.getLogger().handlers)
+
+    file_handler = listener.handlers[0]
+    write = file_handler.emit
+    file_handler.emit = lambda record: (time.sleep(0.02), write(record))  # An SD card under load
+
+    logger = logging.getLogger('app')
+    start = time.perf_counter()
+    for i in range(50):
+        logger.info('Upload %d from %s', i, 'Sam')
+    elapsed = time.perf_counter() - start
+    assert elapsed < 0.2, f"Logging 50 records took {elapsed:.3f}s on the calling thread"
+
+    stop_logging()  # Drains the queue
+    lines = open(log_file, encoding='utf-8').read().splitlines()
+    assert len(lines) == 50
+    assert lines[-1].endswith('app - INFO - Upload 49 from Sam')
+    print(f"✅ Enqueue-only test passed ({elapsed * 1000 / 50:.3f} ms per record on the caller)")
+
+
+def test_json_lines_and_levels(log_dir, monkeypatch):
+    """JSON lines carry extra fields and tracebacks; per-module levels filter noisy loggers"""
+    log_file = os.path.join(log_dir, 'party.jsonl')
+    monkeypatch.setenv('PARTY_LOG_JSON', '1')
+    monkeypatch.setenv('PARTY_LOG_LEVELS', 'test_party.chatty=WARNING, test_party.debug=DEBUG, bogus')
+    setup_logging(log_file=log_file, console=False)
+
+    logging.getLogger('test_party.chatty').info('Dropped')
+    logging.getLogger('test_party.chatty').warning('Kept')
+    logging.getLogger('test_party.debug').debug('Debug detail')
+    logging.getLogger('test_party.other').debug('Dropped at the root level')
+    logging.getLogger('app').info('Upload saved', extra={'upload_id': 7, 'guest': 'Valérie'})
+    try:
+        raise ValueError('bad file')
+    except ValueError:
+        logging.getLogger('app').exception('Upload failed')
+    stop_logging()
+
+    entries = [json.loads(line) for line in open(log_file, encoding='utf-8')]
+    assert [entry['message'] for entry in entries] == ['Kept', 'Debug detail', 'Upload saved', 'Upload failed']
+    saved = entries[2]
+    assert saved['level'] == 'INFO' and saved['logger'] == 'app'
+    assert saved['upload_id'] == 7 and saved['guest'] == 'Valérie'
+    assert 'ValueError: bad file' in entries[3]['exception']
+    assert parse_levels('a=info,b=nonsense') == {'a': logging.INFO}
+    print("✅ JSON lines and levels test passed")
+
+
+def test_size_rotation(log_dir, monkeypatch):
+    """The log file rolls over at the size limit, keeping the configured number of backups"""
+    log_file = os.path.join(log_dir, 'party.log')
+    monkeypatch.setenv('PARTY_LOG_MAX_MB', '0.002')  # About 2 KB
+    monkeypatch.setenv('PARTY_LOG_BACKUPS', '2')
+    setup_logging(log_file=log_file, console=False)
+
+    for i in range(200):
+        logging.getLogger('app').info('Search for song number %d', i)
+    stop_logging()
+
+    files = sorted(glob.glob(log_file + '*'))
+    assert files == [log_file, log_file + '.1', log_file + '.2']
+    assert all(os.path.getsize(path) <= 2200 for path in files)
+    assert 'song number 199' in open(log_file, encoding='utf-8').read()
+    assert party_logging._listener is None
+    print("✅ Size rotation test passed")
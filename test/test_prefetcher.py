@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Test Queue Prefetcher
+Tests library caching, LRU eviction, read-through resolving and YouTube re-downloads
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import threading
+import pytest
+from database import cached_media_name
+from flask import Flask
+from prefetcher import QueuePrefetcher
+from media_server import MediaServer
+
+
+@pytest.fixture
+def library(db, tmp_path):
+    """Fake NAS library with five indexed 1 KB songs"""
+    library_dir = tmp_path / "nas"
+    library_dir.mkdir()
+    paths = []
+    for i in range(5):
+        path = library_dir / f"song{i}.mp3"
+        path.write_bytes(bytes([i]) * 1024)
+        db.add_to_music_library(file_path=str(path), title=f"Song {i}")
+        paths.append(str(path))
+    return paths
+
+
+def queue_song(db, file_path):
+    """Queue a song the way /api/music/add-to-queue does"""
+    upload_id = db.add_upload(device_id='test-device', guest_name='Guest', file_path=file_path, file_type='music')
+    return db.add_to_music_queue(upload_id=upload_id, song_title=os.path.basename(file_path))
+
+
+class RecordingDownloads:
+    """Collects re-download requests"""
+
+    def __init__(self):
+        self.video_ids = []
+
+    def prefetch(self, video_id):
+        self.video_ids.append(video_id)
+        return True
+
+
+def test_copies_next_songs_only(db, library, tmp_path):
+    """Only the next `lookahead` library songs are copied into the cache"""
+    for path in library:
+        queue_song(db, path)
+    cache_dir = tmp_path / "cache"
+    prefetcher = QueuePrefetcher(db, cache_dir=str(cache_dir), lookahead=2)
+
+    counts = prefetcher.prefetch_upcoming()
+    assert counts['copied'] == 2
+    assert sorted(os.listdir(cache_dir)) == sorted(cached_media_name(p) for p in library[:2])
+    assert (cache_dir / cached_media_name(library[0])).read_bytes() == bytes([0]) * 1024
+
+    assert prefetcher.prefetch_upcoming() == {'copied': 0, 'hits': 2, 'redownloads': 0}
+    print("✅ Prefetch copy test passed")
+
+
+def test_queue_urls_point_at_cache(db, library):
+    """Library songs in the queue are served through the cache route"""
+    queue_song(db, library[0])
+    queue_song(db, 'media/music/upload.mp3')
+    urls = [song['url'] for song in db.get_music_queue()['songs']]
+    assert urls == [f"/media/cache/music/{cached_media_name(library[0])}", "/media/music/upload.mp3"]
+    print("✅ Queue URL test passed")
+
+
+def test_lru_eviction_keeps_upcoming(db, library, tmp_path):
+    """Old cache files are evicted first and upcoming songs never are"""
+    cache_dir = tmp_path / "cache"
+    prefetcher = QueuePrefetcher(db, cache_dir=str(cache_dir), lookahead=2, max_cache_bytes=2048)
+
+    ids = [queue_song(db, path) for path in library]
+    prefetcher.prefetch_upcoming()
+    past = time.time() - 60
+    for name in os.listdir(cache_dir):
+        os.utime(cache_dir / name, (past, past))
+
+    # Playhead moves two songs ahead: the next two are copied, the played ones evicted
+    db.mark_music_played(ids[0])
+    db.mark_music_played(ids[1])
+    prefetcher.prefetch_upcoming()
+
+    assert sorted(os.listdir(cache_dir)) == sorted(cached_media_name(p) for p in library[2:4])
+    assert prefetcher.stats['evicted'] == 2
+    print("✅ LRU eviction test passed")
+
+
+def test_resolve_reads_through_on_miss(db, library, tmp_path):
+    """Unprefetched queued songs are read from the library; unknown names are refused"""
+    queue_song(db, library[3])
+    prefetcher = QueuePrefetcher(db, cache_dir=str(tmp_path / "cache"), lookahead=1)
+
+    assert prefetcher.resolve(cached_media_name(library[3])) == library[3]
+    assert prefetcher.resolve(cached_media_name(library[4])) is None
+    assert prefetcher.resolve('../../etc/passwd') is None
+
+    prefetcher.prefetch_upcoming()
+    assert prefetcher.resolve(cached_media_name(library[3])).startswith(str(tmp_path / "cache"))
+    print("✅ Resolve test passed")
+
+
+def test_only_library_files_are_served(db, library, tmp_path):
+    """Queued paths outside the library are never copied or read through"""
+    secret = tmp_path / "secret.txt"
+    secret.write_text("password")
+    unindexed = tmp_path / "nas" / "new.mp3"
+    unindexed.write_bytes(b'mp3')
+    escape = tmp_path / "nas" / "escape.mp3"
+    escape.symlink_to(secret)
+    for path in (secret, unindexed, escape):
+        queue_song(db, str(path))  # Rows stored before add-to-queue checked paths
+    cache_dir = tmp_path / "cache"
+    prefetcher = QueuePrefetcher(db, cache_dir=str(cache_dir), lookahead=3)
+
+    assert prefetcher.prefetch_upcoming()['copied'] == 0
+    assert not cache_dir.exists() or os.listdir(cache_dir) == []
+    for path in (secret, unindexed, escape):
+        assert prefetcher.resolve(cached_media_name(str(path))) is None
+    assert not prefetcher.is_library_path(str(secret))
+    assert prefetcher.is_library_path(library[0])
+
+    # Under a configured music root, unindexed files are allowed, symlinks out of it are not
+    rooted = QueuePrefetcher(db, cache_dir=str(cache_dir), music_root=str(tmp_path / "nas"))
+    assert rooted.resolve(cached_media_name(str(unindexed))) == str(unindexed)
+    assert rooted.resolve(cached_media_name(str(escape))) is None
+    assert not rooted.is_library_path(str(tmp_path / "nas" / ".." / "secret.txt"))
+    print("✅ Library-only serving test passed")
+
+
+def test_playing_song_still_seeks_after_marked_played(db, library, tmp_path):
+    """Range requests for the song that is playing keep working once it is marked played"""
+    first_id = queue_song(db, library[0])
+    queue_song(db, library[1])
+    prefetcher = QueuePrefetcher(db, cache_dir=str(tmp_path / "cache"), lookahead=2)
+    server = MediaServer({}, mode='python')
+    app = Flask(__name__)
+
+    @app.route('/media/cache/music/<name>')
+    def cached_music(name):
+        path = prefetcher.resolve(name)
+        return server.send(path) if path else ('Media not found', 404)
+
+    # The display reports the song played as soon as it starts; no prefetch pass has run here
+    db.mark_music_played(first_id)
+    client = app.test_client()
+    response = client.get(f'/media/cache/music/{cached_media_name(library[0])}', headers={'Range': 'bytes=512-'})
+    assert response.status_code == 206
+    assert response.data == bytes([0]) * 512
+
+    # Once the next song starts, the earlier one is no longer served from the library
+    second = db.get_upcoming_queue(1)[0]
+    db.mark_music_played(second['id'])
+    assert prefetcher.resolve(cached_media_name(library[0])) is None
+    assert prefetcher.resolve(cached_media_name(library[1])) == library[1]
+    print("✅ Playing song seek test passed")
+
+
+def test_concurrent_wakes_start_one_worker(db, tmp_path):
+    """Queue changes racing to wake the prefetcher start a single worker thread"""
+    prefetcher = QueuePrefetcher(db, cache_dir=str(tmp_path / "cache"), poll_interval=60)
+    wakers = [threading.Thread(target=prefetcher.wake) for _ in range(16)]
+    for waker in wakers:
+        waker.start()
+    for waker in wakers:
+        waker.join()
+    assert sum(thread.name == 'queue-prefetcher' for thread in threading.enumerate()) == 1
+    prefetcher.stop(wait=True)  # Before the database is removed
+    assert prefetcher._thread is not None and not prefetcher._thread.is_alive()
+    print("✅ Concurrent wake test passed")
+
+
+def test_missing_download_is_fetched_again(db, tmp_path):
+    """A queued YouTube song whose file is gone is re-downloaded by video id"""
+    queue_song(db, 'media/music/dQw4w9WgXcQ.mp3')
+    queue_song(db, 'media/music/20240101_upload.mp3')  # Guest upload: nothing to re-fetch
+    downloads = RecordingDownloads()
+    prefetcher = QueuePrefetcher(db, cache_dir=str(tmp_path / "cache"), download_jobs=downloads)
+
+    counts = prefetcher.prefetch_upcoming()
+    assert counts['redownloads'] == 1
+    assert downloads.video_ids == ['dQw4w9WgXcQ']
+    print("✅ Re-download test passed")
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Test Query Log
+Tests statement timing, row counts, slow query plans and top-N totals, and that the hot
+PartyDatabase queries use indexes rather than full scans at 100k rows
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from database import PartyDatabase
+from query_log import QueryLog, normalize_sql, full_scans
+
+
+@pytest.fixture
+def db(db):
+    """Temporary party database logging every statement as slow"""
+    db.query_log = QueryLog(threshold_ms=0, keep=1000)
+    return db
+
+
+@pytest.fixture(scope='module')
+def big_db(tmp_path_factory):
+    """Party database with 100k uploads, queue entries and library tracks"""
+    db = PartyDatabase(str(tmp_path_factory.mktemp('query_log') / 'party.db'),
+                       query_log=QueryLog(threshold_ms=0, keep=1000))
+    conn = db.get_connection()
+    conn.executemany('''
+    INSERT INTO uploads (device_id, guest_name, file_path, file_type, processed, timestamp)
+    VALUES (?, ?, ?, ?, ?, datetime('2026-06-01', ? || ' seconds'))
+    ''', ((f'device-{i % 300}', f'Guest {i % 500}', f'media/photos/{i}.jpg',
+           ('photo', 'video', 'music')[i % 3], i % 10 != 0, i) for i in range(100000)))
+    conn.executemany('INSERT INTO music_queue (song_path, played, queue_position) VALUES (?, ?, ?)',
+                     ((f'media/music/{i}.mp3', i < 99950, i) for i in range(100000)))
+    conn.executemany('INSERT INTO devices (device_id) VALUES (?)', ((f'device-{i}',) for i in range(300)))
+    conn.executemany('INSERT INTO music_library (file_path, artist, album, title) VALUES (?, ?, ?, ?)',
+                     ((f'/music/{i}.mp3', f'Artist {i % 2000}', f'Album {i % 5000}', f'Song {i}')
+                      for i in range(100000)))
+    conn.execute("INSERT INTO music_search (music_search) VALUES ('rebuild')")
+    conn.commit()
+    conn.close()
+    db.query_log.reset()
+    return db
+
+
+def test_statements_are_timed_and_counted(db):
+    """Selects count fetched rows, writes count changed rows, and totals group by statement"""
+    for name in ('Sam', 'Alex', 'Kim'):
+        db.add_upload('device-1', name, f'media/photos/{name}.jpg', 'photo')
+    db.query_log.reset()
+
+    conn = db.get_connection()
+    conn.execute('UPDATE uploads SET processed = TRUE WHERE guest_name != ?', ('Kim',))
+    rows = conn.execute('SELECT id FROM uploads WHERE id IN (?, ?, ?)', (1, 2, 3)).fetchall()
+    conn.execute('SELECT id FROM uploads WHERE id IN (?, ?)', (1, 2)).fetchall()
+    cursor = conn.execute('SELECT id FROM uploads ORDER BY id')
+    assert [row['id'] for row in cursor] == [1, 2, 3]
+    conn.commit()
+    conn.close()
+    assert len(rows) == 3
+
+    top = {s['sql']: s for s in db.query_log.top(n=50)}
+    assert top['UPDATE uploads SET processed = TRUE WHERE guest_name != ?']['rows'] == 2
+    in_list = top['SELECT id FROM uploads WHERE id IN (?, ...)']
+    assert in_list['calls'] == 2 and in_list['rows'] == 5  # IN lists of any length aggregate together
+    assert top['SELECT id FROM uploads ORDER BY id']['rows'] == 3
+    assert all(s['max_ms'] >= s['avg_ms'] >= 0 for s in top.values())
+    assert normalize_sql('SELECT *\n    FROM t\n  WHERE a IN (?,?)') == 'SELECT * FROM t WHERE a IN (?, ...)'
+    print("✅ Statement timing test passed")
+
+
+def test_slow_statements_carry_plans(db, tmp_path, monkeypatch):
+    """Statements over the threshold are kept with their plan; faster ones only add to totals"""
+    db.ping()
+    db.get_statistics()
+    slow = list(db.query_log.slow)
+    assert any(entry['sql'] == 'SELECT 1' for entry in slow)
+    grouped = next(entry for entry in slow if entry['sql'].startswith('SELECT file_type, COUNT(*)'))
+    assert any('uploads' in line for line in grouped['plan'])
+    assert full_scans(['SCAN uploads', 'SCAN u USING INDEX idx_uploads_processed']) == ['SCAN uploads']
+
+    quiet = PartyDatabase(str(tmp_path / 'quiet.db'), query_log=QueryLog(threshold_ms=60000))
+    quiet.ping()
+    assert not quiet.query_log.slow
+    assert quiet.query_log.top(n=1)[0]['calls'] >= 1
+
+    monkeypatch.delenv('PARTY_SLOW_QUERY_MS', raising=False)
+    off = PartyDatabase(str(tmp_path / 'off.db'))
+    assert off.query_log is None  # Off unless asked for
+    assert type(off.get_connection()).__name__ == 'Connection'
+    monkeypatch.setenv('PARTY_SLOW_QUERY_MS', '250')
+    assert QueryLog.from_env().threshold_ms == 250
+    print("✅ Slow statement plan test passed")
+
+
+def test_hot_queries_use_indexes(big_db):
+    """Slideshow, queue, library search and statistics queries avoid full scans and sorts at 100k rows"""
+    query_log = big_db.query_log
+    query_log.reset()
+
+    first = big_db.get_slideshow_media(limit=8)
+    assert len(first) == 8
+    assert big_db.get_slideshow_media(limit=8, after_id=first[-1]['id'])[0]['id'] != first[0]['id']
+    big_db.count_slideshow_media()
+    big_db.get_report_uploads(after_id=500, limit=100)
+    assert big_db.get_music_queue()['unplayed_count'] == 50
+    assert len(big_db.get_queue_songs(unplayed_only=True)) == 50
+    assert big_db.search_music_library('"Artist 7"', limit=10)
+    stats = big_db.get_statistics()
+    assert stats['unique_guests'] == 500 and stats['total_uploads'] == 100000
+
+    checked = [entry for entry in query_log.slow if entry['plan']]
+    assert len(checked) >= 10
+    for entry in checked:
+        assert not entry['full_scans'], f"Full scan in {entry['sql']}: {entry['plan']}"
+        assert not any('TEMP B-TREE' in line for line in entry['plan']), \
+            f"Sort or distinct without an index in {entry['sql']}: {entry['plan']}"
+
+    slideshow = next(entry for entry in checked if 'u.processed = TRUE' in entry['sql'] and 'DESC' in entry['sql'])
+    assert any('idx_uploads_processed' in line for line in slideshow['plan'])
+    print(f"✅ Hot query plan test passed ({len(checked)} statements checked)")
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test Music Queue Events
+Tests delta sequencing, replay/gap handling, unplayed-window snapshots and AI DJ plan deltas
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from music_sampler import LibrarySampler
+from dj_planner import DJPlanner
+from queue_events import QueueEventLog, DELTA_EVENT
+
+
+def queue_song(db, title):
+    """Queue a guest upload"""
+    upload_id = db.add_upload(device_id='test-device', guest_name='Guest',
+                              file_path=f"media/music/{title}.mp3", file_type='music')
+    return db.add_to_music_queue(upload_id=upload_id, song_title=title)
+
+
+def test_deltas_are_sequenced(db):
+    """Every delta is emitted once with the next sequence number"""
+    emitted = []
+    events = QueueEventLog(db, emit=lambda event, delta: emitted.append((event, delta)))
+    first = queue_song(db, 'one')
+    second = queue_song(db, 'two')
+
+    events.added([first, second])
+    events.played([first])
+    assert events.removed([]) is None  # Nothing to say, no sequence number used
+
+    assert [event for event, _ in emitted] == [DELTA_EVENT, DELTA_EVENT]
+    assert [delta['seq'] for _, delta in emitted] == [1, 2]
+    assert [song['id'] for song in emitted[0][1]['songs']] == [first, second]
+    assert emitted[0][1]['songs'][0]['url'] == '/media/music/one.mp3'
+    assert emitted[1][1] == {'epoch': events.epoch, 'seq': 2, 'op': 'played', 'ids': [first]}
+    print("✅ Delta sequencing test passed")
+
+
+def test_since_replays_or_requests_snapshot(db):
+    """Clients replay buffered deltas; older or future sequence numbers need a snapshot"""
+    events = QueueEventLog(db, history=3)
+    for queue_id in range(1, 6):
+        events.removed([queue_id])
+
+    assert events.since(5) == []
+    assert [delta['seq'] for delta in events.since(3)] == [4, 5]
+    assert [delta['seq'] for delta in events.since(2)] == [3, 4, 5]
+    assert events.since(1) is None  # Delta 2 fell out of the buffer
+    assert events.since(9) is None  # Ahead of the server: it restarted
+    print("✅ Replay test passed")
+
+
+def test_snapshot_holds_unplayed_window(db):
+    """Snapshots skip played history and carry the sequence number they reflect"""
+    events = QueueEventLog(db)
+    played = queue_song(db, 'old')
+    upcoming = queue_song(db, 'next')
+    db.mark_music_played(played)
+    events.played([played])
+
+    snapshot = events.snapshot()
+    assert snapshot['seq'] == 1
+    assert snapshot['epoch'] == events.epoch
+    assert [song['id'] for song in snapshot['songs']] == [upcoming]
+    assert snapshot['unplayed_count'] == 1
+    print("✅ Snapshot test passed")
+
+
+def test_plan_reports_queue_ids(db):
+    """AI DJ plans report the queue rows they added and removed"""
+    conn = db.get_connection()
+    for i in range(20):
+        conn.execute('''
+        INSERT INTO music_library (file_path, artist, title, duration, bpm, energy, danceability, features_at)
+        VALUES (?, ?, ?, 200, 120, ?, 0.5, CURRENT_TIMESTAMP)
+        ''', (f"/music/{i}.mp3", f"Artist {i}", f"Song {i}", i / 20))
+    conn.commit()
+    conn.close()
+
+    planner = DJPlanner(db, LibrarySampler(db), lookahead=4, locked=1)
+    planner.set_enabled(True)
+    first = planner.plan()
+    assert len(first['added_ids']) == 4
+    assert first['removed_ids'] == []
+
+    second = planner.plan()
+    assert set(second['removed_ids']) <= set(first['added_ids'])
+    upcoming = [song['id'] for song in db.get_queue_songs(unplayed_only=True)]
+    assert set(second['added_ids']) <= set(upcoming)
+    assert not set(second['removed_ids']) & set(upcoming)
+    print("✅ Plan delta test passed")
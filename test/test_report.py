@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Test Memory Book Report
+Tests keyset pagination over batches, thumbnail selection and the streamed report template
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+from datetime import datetime
+from flask import Flask, Response, request, stream_with_context
+from report import ReportPage
+
+TEMPLATES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates')
+
+
+def add_uploads(db, count, file_type='photo'):
+    """Record count processed uploads in one transaction, returning their ids oldest first"""
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.executemany('''
+    INSERT INTO uploads (device_id, guest_name, file_path, file_type, original_filename,
+                         birthday_note, processed)
+    VALUES (?, ?, ?, ?, ?, ?, TRUE)
+    ''', [('device-1', f'Guest {index}', f'/tmp/party/{file_type}{index}.jpg', file_type,
+           f'{file_type}{index}.jpg', f'Note {index}') for index in range(count)])
+    conn.commit()
+    cursor.execute('SELECT id FROM uploads ORDER BY id')
+    ids = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return ids[-count:]
+
+
+def report_client(db):
+    """Minimal app streaming the report template the way /report does"""
+    app = Flask(__name__, template_folder=TEMPLATES)
+
+    @app.route('/report')
+    def birthday_report():
+        uploads = ReportPage(db, after_id=request.args.get('after', type=int),
+                             per_page=request.args.get('per_page', 500, type=int), batch_size=50)
+        stream = app.jinja_env.get_template('report.html').stream(
+            uploads=uploads, page=request.args.get('page', 1, type=int), page_count=1,
+            per_page=uploads.per_page, total_uploads=db.count_report_uploads(), generated_at=datetime.now())
+        return Response(stream_with_context(stream), mimetype='text/html')
+
+    return app.test_client()
+
+
+def test_pages_follow_keyset_cursor(db):
+    """Pages read in batches, in party order, and end with the cursor for the next page"""
+    ids = add_uploads(db, 12)
+    first = ReportPage(db, per_page=5, batch_size=2)
+    assert [upload['id'] for upload in first] == ids[:5]
+    assert first.next_after == ids[4]
+
+    second = ReportPage(db, after_id=first.next_after, per_page=5, batch_size=2)
+    assert [upload['id'] for upload in second] == ids[5:10]
+    last = ReportPage(db, after_id=second.next_after, per_page=5, batch_size=2)
+    assert [upload['id'] for upload in last] == ids[10:]
+    assert last.next_after is None
+
+    exact = ReportPage(db, after_id=ids[1], per_page=10)
+    assert len(list(exact)) == 10
+    assert exact.next_after is None  # Nothing left after a full final page
+    print("✅ Keyset pagination test passed")
+
+
+def test_report_prefers_thumbnails(db):
+    """Thumbnails come from the thumb rendition, else the poster, else the original"""
+    photo_id, video_id, plain_id = add_uploads(db, 1)[0], add_uploads(db, 1, 'video')[0], add_uploads(db, 1)[0]
+    db.create_media_rendition(photo_id, 'thumb')
+    db.update_media_rendition(photo_id, 'thumb', status='ready', file_path='/tmp/party/thumb.webp', content_hash='t1')
+    db.create_media_rendition(video_id, 'poster')
+    db.update_media_rendition(video_id, 'poster', status='ready', file_path='/tmp/party/poster.jpg')
+
+    uploads = {upload['id']: upload for upload in db.get_report_uploads()}
+    assert uploads[photo_id]['thumbnail_url'] == f'/media/photos/{photo_id}/thumb.webp?v=t1'
+    assert uploads[video_id]['thumbnail_url'] == f'/media/videos/{video_id}/poster.jpg'
+    assert uploads[plain_id]['thumbnail_url'] is None
+    assert uploads[plain_id]['url'] == '/media/photos/photo0.jpg'
+    print("✅ Thumbnail selection test passed")
+
+
+def test_streamed_report_page(db):
+    """The template streams escaped rows and links the next page"""
+    ids = add_uploads(db, 30)
+    db.add_upload('device-1', '<script>alert(1)</script>', '/tmp/party/song.mp3', 'music',
+                  original_filename='song.mp3')
+    client = report_client(db)
+
+    response = client.get('/report?per_page=20')
+    assert response.is_streamed
+    html = response.get_data(as_text=True)
+    assert html.count('class="table-row"') == 20
+    assert f'after={ids[19]}' in html and 'page=2' in html
+    assert 'loading="lazy"' in html
+
+    conn = db.get_connection()
+    conn.execute('UPDATE uploads SET processed = TRUE')
+    conn.commit()
+    conn.close()
+    html = client.get(f'/report?after={ids[19]}&page=2&per_page=20').get_data(as_text=True)
+    assert html.count('class="table-row"') == 11
+    assert '&lt;script&gt;' in html and '<script>alert' not in html
+    assert 'href="/media/music/song.mp3"' in html
+    assert 'Next page' not in html
+    print("✅ Streamed report test passed")
+
+
+def test_large_report_stays_responsive(db):
+    """A page of a 10k-upload party renders quickly"""
+    add_uploads(db, 10000)
+    start = time.time()
+    html = report_client(db).get('/report').get_data(as_text=True)
+    elapsed = time.time() - start
+    assert html.count('class="table-row"') == 500
+    assert elapsed < 5.0, f"Report page took {elapsed:.2f}s"
+    print(f"✅ Large report test passed ({elapsed:.2f}s)")
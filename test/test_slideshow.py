@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test Slideshow Scheduler
+Tests the preload manifest: rotation order and wrap-around, byte sizes and dimensions, and the
+suggested preload window
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from slideshow import SlideshowScheduler, MAX_PRELOAD_WINDOW, PRELOAD_BUDGET_BYTES
+
+
+def add_photos(db, count, file_size=500 * 1024):
+    """Record count processed photos, returning their ids oldest first"""
+    ids = []
+    for index in range(count):
+        upload_id = db.add_upload('device-1', 'Sam', f'/tmp/party/photo{index}.jpg', 'photo',
+                                  file_size=file_size, original_filename=f'photo{index}.jpg')
+        db.mark_upload_processed(upload_id)
+        ids.append(upload_id)
+    return ids
+
+
+def test_manifest_walks_rotation(db):
+    """Manifests continue after the cursor, newest first, and wrap at the oldest"""
+    ids = add_photos(db, 5)
+    scheduler = SlideshowScheduler(db)
+
+    first = scheduler.manifest(count=3)
+    assert [item['upload_id'] for item in first['items']] == ids[::-1][:3]
+    assert first['total_count'] == 5
+
+    second = scheduler.manifest(after=first['items'][-1]['upload_id'], count=3)
+    assert [item['upload_id'] for item in second['items']] == [ids[1], ids[0], ids[4]]
+
+    # More than the rotation holds: each slide once, never repeated in one manifest
+    everything = scheduler.manifest(after=ids[2], count=20)
+    assert sorted(item['upload_id'] for item in everything['items']) == sorted(ids)
+
+    # A deleted cursor restarts from the newest
+    assert scheduler.manifest(after=9999, count=1)['items'][0]['upload_id'] == ids[-1]
+    assert SlideshowScheduler(db).manifest(count=0)['items'] == []
+    print("✅ Rotation test passed")
+
+
+def test_manifest_sizes_and_dimensions(db):
+    """Items carry the bytes the display will download and the rendition's dimensions"""
+    photo_id = add_photos(db, 1, file_size=6 * 1024 * 1024)[0]
+    db.create_media_rendition(photo_id, 'display')
+    db.update_media_rendition(photo_id, 'display', status='ready', file_path='/tmp/party/display.webp',
+                              width=1440, height=1080, file_size=300 * 1024, content_hash='abc')
+
+    item = SlideshowScheduler(db).manifest()['items'][0]
+    assert item['bytes'] == 300 * 1024
+    assert (item['width'], item['height']) == (1440, 1080)
+    assert item['url'] == f"/media/photos/{photo_id}/display.webp?v=abc"
+
+    other_id = add_photos(db, 1, file_size=4 * 1024 * 1024)[0]
+    original = SlideshowScheduler(db).manifest(count=1)['items'][0]
+    assert original['upload_id'] == other_id
+    assert original['bytes'] == 4 * 1024 * 1024  # No rendition yet: the original's size
+    print("✅ Size and dimension test passed")
+
+
+def test_preload_window_follows_budget(db):
+    """Small renditions preload three slides ahead, large originals fewer, never zero"""
+    scheduler = SlideshowScheduler(db)
+    small = [{'file_type': 'photo', 'bytes': 400 * 1024}] * 5
+    assert scheduler.preload_window(small) == MAX_PRELOAD_WINDOW
+
+    large = [{'file_type': 'photo', 'bytes': PRELOAD_BUDGET_BYTES // 2 + 1}] * 5
+    assert scheduler.preload_window(large) == 1
+
+    videos = [{'file_type': 'video', 'bytes': 200 * 1024 * 1024}] * 5
+    assert scheduler.preload_window(videos) == MAX_PRELOAD_WINDOW  # Only metadata is fetched ahead
+    assert scheduler.preload_window([]) == 1
+    print("✅ Preload window test passed")
+
+
+def test_manifest_stays_flat(db):
+    """The startup manifest is the same size for a handful or hundreds of photos"""
+    add_photos(db, 300)
+    manifest = SlideshowScheduler(db).manifest()
+    assert len(manifest['items']) == 8
+    assert manifest['total_count'] == 300
+    assert sum(item['bytes'] for item in manifest['items'][:manifest['preload_window']]) <= PRELOAD_BUDGET_BYTES
+    print("✅ Flat manifest test passed")